@@ -1,21 +1,35 @@
 import streamlit as st
-import os
 import datetime
-from final_4 import evaluate_strength_and_reasons, log_to_database
-from dotenv import load_dotenv
-import mysql.connector
+from final_4 import ENV_PATH, load_blocklist, evaluate_strength_and_reasons, log_to_database
+from mpin import db
+from mpin.date_index import get_date_index
+from mpin.profile import ProfileCache, labelled_dates
 
-load_dotenv(dotenv_path=os.path.join(os.path.dirname(__file__), ".env"))
+# Built once per server process and shared by every session and rerun.
+@st.cache_resource
+def get_blocklist():
+    # Reloaded in the background when the file changes; see mpin.blocklist.
+    return load_blocklist().start()
 
-def load_common_pins(file_name="common_pins.txt"):
-    file_path = os.path.join(os.path.dirname(__file__), file_name)
-    with open(file_path, 'r') as file:
-        return {line.strip() for line in file if len(line.strip()) == 4 and line.strip().isdigit()}
+@st.cache_resource
+def get_demographic_index():
+    return get_date_index(4)
+
+# A user trying several PINs in a row compiles their dates once.
+@st.cache_resource
+def get_profiles():
+    return ProfileCache()
+
+@st.cache_resource
+def get_log_writer():
+    return db.get_writer(ENV_PATH)
 
 st.title("4-Digit MPIN Strength Checker")
 
 mpin = st.text_input("Enter your 4-digit MPIN:")
-common_pins = load_common_pins()
+blocklist = get_blocklist()
+get_demographic_index()
+get_log_writer()
 
 today = datetime.date.today()
 min_date = datetime.date(1950, 1, 1)
@@ -32,55 +46,29 @@ if st.button("Check Strength"):
     elif not mpin.isdigit() or len(mpin) != 4:
         st.error("MPIN must be exactly 4 digits.")
     else:
-        strength, reasons = evaluate_strength_and_reasons(
-            mpin,
-            common_pins,
-            dob_self.strftime("%d-%m-%Y") if dob_self else None,
-            dob_spouse.strftime("%d-%m-%Y") if dob_spouse else None,
-            anniversary.strftime("%d-%m-%Y") if anniversary else None
-        )
+        common_pins = blocklist.snapshot()
+        # Reruns with the same inputs reuse this session's result and are not logged again.
+        inputs = (user_id, mpin, dob_self, dob_spouse, anniversary, common_pins.version)
+        if st.session_state.get("evaluated_inputs") != inputs:
+            st.session_state["evaluation"] = evaluate_strength_and_reasons(
+                mpin,
+                common_pins.index,
+                dob_self,
+                dob_spouse,
+                anniversary,
+                profile=get_profiles().get(user_id, labelled_dates(dob_self, dob_spouse, anniversary), 4)
+            )
+            st.session_state["evaluated_inputs"] = inputs
+        strength, reasons = st.session_state["evaluation"]
         st.success(f"Strength: {strength}")
         st.write("Reasons:", reasons)
-        try:
-            load_dotenv(dotenv_path=os.path.join(os.path.dirname(__file__), ".env"))
-            connection = mysql.connector.connect(
-                host=os.getenv("DB_HOST"),
-                user=os.getenv("DB_USER"),
-                password=os.getenv("DB_PASSWORD"),
-                database=os.getenv("DB_NAME")
-            )
-            cursor = connection.cursor()
-            query = """
-            INSERT INTO mpin_logs 
-            (user_id, mpin, length, strength, reason_json, dob_self, dob_spouse, anniversary, timestamp)
-            VALUES (%s, %s, %s, %s, %s, %s, %s, %s, NOW())
-            ON DUPLICATE KEY UPDATE
-                mpin = VALUES(mpin),
-                length = VALUES(length),
-                strength = VALUES(strength),
-                reason_json = VALUES(reason_json),
-                dob_self = VALUES(dob_self),
-                dob_spouse = VALUES(dob_spouse),
-                anniversary = VALUES(anniversary),
-                timestamp = NOW()
-            """
-            cursor.execute(query, (
-                user_id,
-                mpin,
-                len(mpin),
-                strength,
-                ', '.join(reasons),
-                dob_self.strftime("%Y-%m-%d") if dob_self else None,
-                dob_spouse.strftime("%Y-%m-%d") if dob_spouse else None,
-                anniversary.strftime("%Y-%m-%d") if anniversary else None
-            ))
-            connection.commit()
-            affected_rows = cursor.rowcount
-            cursor.close()
-            connection.close()
-            if affected_rows == 1:
-                st.success("New user data logged to database.")
-            elif affected_rows == 2:
-                st.success("User MPIN and details updated in the database.")
-        except Exception as e:
-            st.error(f"Database Logging Error: {e}")
\ No newline at end of file
+        if st.session_state.get("logged_inputs") == inputs:
+            st.info("This evaluation has already been logged.")
+        else:
+            try:
+                log_to_database(user_id, mpin, strength, reasons, dob_self, dob_spouse, anniversary,
+                                common_pins.version)
+                st.session_state["logged_inputs"] = inputs
+                st.success("Evaluation queued for logging to the database.")
+            except Exception as e:
+                st.error(f"Database Logging Error: {e}")
\ No newline at end of file
@@ -1,9 +1,15 @@
 import os
+import sys
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if ROOT_DIR not in sys.path:
+    sys.path.insert(0, ROOT_DIR)
+
+from mpin.pin_index import PinIndex
 
 def load_common_pins(file_name="common_pins.txt"):
     file_path = os.path.join(os.path.dirname(__file__), file_name)
-    with open(file_path, 'r') as file:
-        return {line.strip() for line in file if len(line.strip()) == 4 and line.strip().isdigit()}
+    return PinIndex.from_file(file_path, 4)
 
 def is_common_pin(mpin, common_pins_set):
 
@@ -1,46 +1,27 @@
 from datetime import datetime
 import os
-import mysql.connector
-from dotenv import load_dotenv
+import sys
 
-def load_common_pins(file_name="common_pins.txt"):
-    file_path = os.path.join(os.path.dirname(__file__), file_name)
-    with open(file_path, 'r') as file:
-        return {line.strip() for line in file if len(line.strip()) == 4 and line.strip().isdigit()}
-
-def generate_demographic_patterns(date_str):
-    try:
-        dt = datetime.strptime(date_str, "%d-%m-%Y")
-    except ValueError:
-        return set()
-
-    day = dt.strftime("%d")
-    month = dt.strftime("%m")
-    year_full = dt.strftime("%Y")
-    year_short = dt.strftime("%y")
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if ROOT_DIR not in sys.path:
+    sys.path.insert(0, ROOT_DIR)
 
-    patterns = set()
+from mpin import db, demographics, engine, frequency
+from mpin.blocklist import Blocklist
+from mpin.bundle import load_pin_file
 
-    patterns.add(day + month)
-    patterns.add(month + day)
-    patterns.add(day + year_short)
-    patterns.add(year_short + day)
-    patterns.add(month + year_short)
-    patterns.add(year_short + month)
+ENV_PATH = os.path.join(os.path.dirname(__file__), ".env")
 
-    patterns.add(year_short * 2)
-    patterns.add(day * 2)
-    patterns.add(month * 2)
-
-    patterns.add(year_short + year_short[::-1])
-
-    patterns.add((day + month)[::-1])
-    patterns.add((month + day)[::-1])
+def load_common_pins(file_name="common_pins.txt"):
+    file_path = os.path.join(os.path.dirname(__file__), file_name)
+    return load_pin_file(file_path, 4)
 
-    patterns.add(year_full[2:] + month)
-    patterns.add(month + year_full[2:])
+def load_blocklist(file_name="common_pins.txt", poll_interval=5.0):
+    file_path = os.path.join(os.path.dirname(__file__), file_name)
+    return Blocklist(file_path, 4, poll_interval)
 
-    return patterns
+def generate_demographic_patterns(date):
+    return demographics.generate_demographic_patterns(date, 4)
 
 def get_valid_date(prompt):
     while True:
@@ -51,74 +32,25 @@ def get_valid_date(prompt):
         except ValueError:
             print("Invalid date format. Please enter date as DD-MM-YYYY.")
 
-def evaluate_strength_and_reasons(mpin, common_pins_set, dob_self, dob_spouse, anniversary):
-    reasons = []
-
-    if mpin in common_pins_set:
-        reasons.append("COMMONLY_USED")
-
-    if dob_self:
-        dob_self_patterns = generate_demographic_patterns(dob_self)
-        if mpin in dob_self_patterns:
-            reasons.append("DEMOGRAPHIC_DOB_SELF")
-
-    if dob_spouse:
-        dob_spouse_patterns = generate_demographic_patterns(dob_spouse)
-        if mpin in dob_spouse_patterns:
-            reasons.append("DEMOGRAPHIC_DOB_SPOUSE")
-
-    if anniversary:
-        anniversary_patterns = generate_demographic_patterns(anniversary)
-        if mpin in anniversary_patterns:
-            reasons.append("DEMOGRAPHIC_ANNIVERSARY")
-
-    strength = "STRONG" if not reasons else "WEAK"
-    return strength, reasons
-
-def log_to_database(user_id, mpin, strength, reasons, dob_self, dob_spouse, anniversary):
-    load_dotenv(dotenv_path=os.path.join(os.path.dirname(__file__), ".env"))
-    try:
-        connection = mysql.connector.connect(
-            host=os.getenv("DB_HOST"),
-            user=os.getenv("DB_USER"),
-            password=os.getenv("DB_PASSWORD"),
-            database=os.getenv("DB_NAME")
-        )
-
-        cursor = connection.cursor()
-        query = """
-        INSERT INTO mpin_logs 
-        (user_id, mpin, length, strength, reason_json, dob_self, dob_spouse, anniversary, timestamp)
-        VALUES (%s, %s, %s, %s, %s, %s, %s, %s, NOW())
-        ON DUPLICATE KEY UPDATE
-            mpin = VALUES(mpin),
-            length = VALUES(length),
-            strength = VALUES(strength),
-            reason_json = VALUES(reason_json),
-            dob_self = VALUES(dob_self),
-            dob_spouse = VALUES(dob_spouse),
-            anniversary = VALUES(anniversary),
-            timestamp = NOW()
-        """
-
-        cursor.execute(query, (
-            user_id,
-            mpin,
-            len(mpin),
-            strength,
-            ', '.join(reasons),
-            dob_self,
-            dob_spouse,
-            anniversary
-        ))
-
-        connection.commit()
-        cursor.close()
-        connection.close()
-    except Exception as e:
-        raise e
+def evaluate_strength_and_reasons(mpin, common_pins_set, dob_self, dob_spouse, anniversary, profile=None,
+                                  other_dates=None, fuzzy=False, tolerance_days=0):
+    return engine.evaluate_strength_and_reasons(mpin, common_pins_set, dob_self, dob_spouse, anniversary, 4,
+                                                profile=profile, other_dates=other_dates, fuzzy=fuzzy,
+                                                tolerance_days=tolerance_days)
+
+def log_to_database(user_id, mpin, strength, reasons, dob_self, dob_spouse, anniversary, blocklist_version=None,
+                    other_dates=None):
+    db.log_evaluation(user_id, mpin, strength, reasons, dob_self, dob_spouse, anniversary,
+                      blocklist_version, env_path=ENV_PATH, other_dates=other_dates)
 
 if __name__ == "__main__":
+    if len(sys.argv) > 1:
+        # The bulk audit needs NumPy; the interactive check does not.
+        from mpin import audit
+
+        audit.main(sys.argv[1:], 4, os.path.join(os.path.dirname(__file__), "common_pins.txt"))
+        exit()
+
     common_pins = load_common_pins()
 
     mpin = input("Enter a 4-digit MPIN: ").strip()
@@ -133,4 +65,7 @@ if __name__ == "__main__":
     strength, reasons = evaluate_strength_and_reasons(mpin, common_pins, dob_self, dob_spouse, anniversary)
 
     print("Strength:", strength)
-    print("Reasons:", reasons)
\ No newline at end of file
+    print("Reasons:", reasons)
+    if frequency.get_frequency_table(4) is not None:
+        rank = frequency.guess_rank(mpin, reasons, 4, common_pins)
+        print("Guess rank:", rank, "Score:", frequency.score(rank, 4))
\ No newline at end of file
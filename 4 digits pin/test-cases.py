@@ -1,8 +1,35 @@
 import unittest
-from unittest.mock import patch
+from unittest.mock import MagicMock, patch
+import asyncio
 import datetime
-import mysql.connector
-from app import load_common_pins, evaluate_strength_and_reasons
+import io
+import json
+import queue
+import sqlite3
+import tempfile
+import threading
+from final_4 import load_common_pins, evaluate_strength_and_reasons, generate_demographic_patterns
+from mpin.audit import audit, read_records, write_results
+from mpin import db, engine
+from mpin.blocklist import Blocklist
+from mpin.bundle import Bundle, build_bundle, load_pin_file
+from mpin.batch import date_to_int, evaluate_batch
+from mpin.coalescer import Coalescer
+from mpin.date_index import dates_for_pin, get_date_index
+from mpin.demographics import demographic_patterns, parse_date
+from mpin.engine import evaluate_many
+from mpin.journal import Journal, JournaledSink, read_segment
+from mpin.log_writer import LogWriter
+from mpin.storage import SQLITE_SCHEMA, MemoryStore
+from mpin.structure import build_structure_table, rules_signature, structural_mask, structure_table
+from mpin.keypad import keypad_patterns
+from mpin.near import build_near_index, near_index, neighbours
+from mpin.fuzzy import date_range, fuzzy_date, matches_date_range, range_patterns
+from mpin.frequency import FrequencyTable, guess_rank, rule_guesses, score
+from mpin.pin_index import PinIndex
+from mpin.profile import ProfileCache, UserProfile, labelled_dates
+from mpin.service import BLOCKLIST_PATHS, EvaluationService, handle_connection, parse_item
+from mpin.reasons import REASON_BITS, STRENGTHS, mask_to_reasons
 from dotenv import load_dotenv
 import os
 
@@ -12,62 +39,19 @@ class Test4DigitSystem(unittest.TestCase):
         load_dotenv(dotenv_path=os.path.join(os.path.dirname(__file__), ".env"))
 
     def setUp(self):
-        self.connection = mysql.connector.connect(
-            host=os.getenv("DB_HOST"),
-            user=os.getenv("DB_USER"),
-            password=os.getenv("DB_PASSWORD"),
-            database=os.getenv("DB_NAME")
-        )
-        self.cursor = self.connection.cursor()
-        self.cursor.execute("DELETE FROM mpin_logs")
-        self.connection.commit()
+        # TEST_DB_BACKEND=mysql runs these against the DB_* database instead.
+        self.store = db.open_store(os.getenv("TEST_DB_BACKEND", "sqlite"), sqlite_path=":memory:")
+        self.store.clear()
         self.common_pins = load_common_pins()
 
     def tearDown(self):
-        self.cursor.close()
-        self.connection.close()
+        self.store.close()
 
     def insert_to_database(self, user_id, mpin, strength, reasons, dob_self, dob_spouse, anniversary):
-        connection = mysql.connector.connect(
-            host=os.getenv("DB_HOST"),
-            user=os.getenv("DB_USER"),
-            password=os.getenv("DB_PASSWORD"),
-            database=os.getenv("DB_NAME")
-        )
-        cursor = connection.cursor()
-        query = """
-        INSERT INTO mpin_logs 
-        (user_id, mpin, length, strength, reason_json, dob_self, dob_spouse, anniversary, timestamp)
-        VALUES (%s, %s, %s, %s, %s, %s, %s, %s, NOW())
-        ON DUPLICATE KEY UPDATE
-            mpin = VALUES(mpin),
-            length = VALUES(length),
-            strength = VALUES(strength),
-            reason_json = VALUES(reason_json),
-            dob_self = VALUES(dob_self),
-            dob_spouse = VALUES(dob_spouse),
-            anniversary = VALUES(anniversary),
-            timestamp = NOW()
-        """
-        cursor.execute(query, (
-            user_id,
-            str(mpin),
-            len(mpin),
-            strength,
-            ', '.join(reasons),
-            dob_self.strftime("%Y-%m-%d") if dob_self else None,
-            dob_spouse.strftime("%Y-%m-%d") if dob_spouse else None,
-            anniversary.strftime("%Y-%m-%d") if anniversary else None
-        ))
-        connection.commit()
-        affected_rows = cursor.rowcount
-        cursor.close()
-        connection.close()
-        return affected_rows
+        return self.store.upsert(db.log_params(user_id, str(mpin), strength, reasons, dob_self, dob_spouse, anniversary))
 
     def get_db_record(self, user_id):
-        self.cursor.execute("SELECT * FROM mpin_logs WHERE user_id = %s", (user_id,))
-        return self.cursor.fetchone()
+        return self.store.get(user_id)
 
     #1: Valid MPIN, New User ID
     def test_valid_mpin_new_user(self):
@@ -78,8 +62,8 @@ class Test4DigitSystem(unittest.TestCase):
         affected_rows = self.insert_to_database(user_id, mpin, strength, reasons, dob_self, None, None)
         self.assertEqual(affected_rows, 1)
         record = self.get_db_record(user_id)
-        self.assertEqual(record[1], user_id)
-        self.assertEqual(record[2], mpin)
+        self.assertEqual(record["user_id"], user_id)
+        self.assertEqual(record["mpin"], mpin)
 
     #2: Valid MPIN, Existing User ID
     def test_valid_mpin_existing_user(self):
@@ -93,7 +77,7 @@ class Test4DigitSystem(unittest.TestCase):
         affected_rows = self.insert_to_database(user_id, mpin2, strength, reasons, dob_self, None, None)
         self.assertEqual(affected_rows, 2)
         record = self.get_db_record(user_id)
-        self.assertEqual(record[2], mpin2)
+        self.assertEqual(record["mpin"], mpin2)
 
     #3: MPIN with Leading Zero
     def test_leading_zero(self):
@@ -103,7 +87,7 @@ class Test4DigitSystem(unittest.TestCase):
         strength, reasons = evaluate_strength_and_reasons(mpin, self.common_pins, "01-01-1990", None, None)
         self.insert_to_database(user_id, mpin, strength, reasons, dob_self, None, None)
         record = self.get_db_record(user_id)
-        self.assertEqual(record[2], "0123")
+        self.assertEqual(record["mpin"], "0123")
 
     #4: Common MPIN
     def test_common_mpin(self):
@@ -143,7 +127,7 @@ class Test4DigitSystem(unittest.TestCase):
 
     #9: Strong MPIN
     def test_strong_mpin(self):
-        mpin = "5678"
+        mpin = "5830"
         strength, reasons = evaluate_strength_and_reasons(mpin, self.common_pins, None, None, None)
         self.assertEqual(strength, "STRONG")
         self.assertEqual(reasons, [])
@@ -175,7 +159,7 @@ class Test4DigitSystem(unittest.TestCase):
         strength, reasons = evaluate_strength_and_reasons(mpin, self.common_pins, None, None, None)
         self.insert_to_database(user_id, mpin, strength, reasons, None, None, None)
         record = self.get_db_record(user_id)
-        self.assertIsNone(record[6])
+        self.assertIsNone(record["dob_self"])
 
     #15: Null DOB Spouse
     def test_null_dob_spouse(self):
@@ -184,7 +168,7 @@ class Test4DigitSystem(unittest.TestCase):
         strength, reasons = evaluate_strength_and_reasons(mpin, self.common_pins, None, None, None)
         self.insert_to_database(user_id, mpin, strength, reasons, None, None, None)
         record = self.get_db_record(user_id)
-        self.assertIsNone(record[7]) 
+        self.assertIsNone(record["dob_spouse"]) 
 
     #16: Null Anniversary
     def test_null_anniversary(self):
@@ -193,12 +177,12 @@ class Test4DigitSystem(unittest.TestCase):
         strength, reasons = evaluate_strength_and_reasons(mpin, self.common_pins, None, None, None)
         self.insert_to_database(user_id, mpin, strength, reasons, None, None, None)
         record = self.get_db_record(user_id)
-        self.assertIsNone(record[8])
+        self.assertIsNone(record["anniversary"])
 
     #17: Future DOB (Mock Streamlit Validation)
     def test_future_dob(self):
-        dob_self = datetime.date(2026, 1, 1)
         today = datetime.date.today()
+        dob_self = today + datetime.timedelta(days=365)
         self.assertFalse(dob_self <= today)
 
     #18: Old DOB (Before 1950)
@@ -213,6 +197,8 @@ class Test4DigitSystem(unittest.TestCase):
         user_id = "user19@example.com"
         mpin = "5678"
         strength, reasons = evaluate_strength_and_reasons(mpin, self.common_pins, None, None, None)
+        self.store.close()
+        self.store = db.open_store("mysql")
         with self.assertRaises(Exception):
             self.insert_to_database(user_id, mpin, strength, reasons, None, None, None)
 
@@ -224,7 +210,7 @@ class Test4DigitSystem(unittest.TestCase):
         strength, reasons = evaluate_strength_and_reasons(mpin, self.common_pins, "01-01-1990", None, None)
         self.insert_to_database(user_id, mpin, strength, reasons, dob_self, None, None)
         record = self.get_db_record(user_id)
-        self.assertEqual(record[1], user_id)
+        self.assertEqual(record["user_id"], user_id)
 
     #21: Long User ID
     def test_long_user_id(self):
@@ -234,16 +220,1002 @@ class Test4DigitSystem(unittest.TestCase):
         strength, reasons = evaluate_strength_and_reasons(mpin, self.common_pins, "01-01-1990", None, None)
         self.insert_to_database(user_id, mpin, strength, reasons, dob_self, None, None)
         record = self.get_db_record(user_id)
-        self.assertEqual(record[1], user_id)
+        self.assertEqual(record["user_id"], user_id)
 
     #22: Empty Reasons
     def test_empty_reasons(self):
         user_id = "user22@example.com"
-        mpin = "5678"
+        mpin = "5830"
         strength, reasons = evaluate_strength_and_reasons(mpin, self.common_pins, None, None, None)
         self.insert_to_database(user_id, mpin, strength, reasons, None, None, None)
         record = self.get_db_record(user_id)
-        self.assertEqual(record[5], "")
+        self.assertEqual(record["reason_json"], "")
+
+class TestCommonPinIndex(unittest.TestCase):
+    def setUp(self):
+        self.common_pins = load_common_pins()
+        file_path = os.path.join(os.path.dirname(__file__), "common_pins.txt")
+        with open(file_path, 'r') as file:
+            self.pin_set = {line.strip() for line in file if len(line.strip()) == 4 and line.strip().isdigit()}
+
+    #1: Index matches the plain set of strings
+    def test_matches_string_set(self):
+        self.assertEqual(set(self.common_pins), self.pin_set)
+        self.assertEqual(len(self.common_pins), len(self.pin_set))
+
+    #2: Leading zeros are kept
+    def test_leading_zero_lookup(self):
+        self.assertIn("0852", self.common_pins)
+        self.assertIn(852, self.common_pins)
+        self.assertIn("0000", self.common_pins)
+        self.assertNotIn("852", self.common_pins)
+
+    #3: Invalid PINs are never members
+    def test_invalid_pins(self):
+        self.assertNotIn("123", self.common_pins)
+        self.assertNotIn("12340", self.common_pins)
+        self.assertNotIn("١١١١", self.common_pins)
+        self.assertNotIn(-1, self.common_pins)
+        self.assertNotIn(None, self.common_pins)
+
+    #4: Bitmap size is fixed by the keyspace
+    def test_bitmap_size(self):
+        self.assertEqual(self.common_pins.nbytes, 10 ** 4 // 8)
+
+    #5: Vectorized lookups agree with scalar lookups
+    def test_contains_many(self):
+        pins = list(range(0, 10 ** 4, 7)) + [1234, 852, -5, 10 ** 4]
+        expected = [pin in self.common_pins for pin in pins]
+        self.assertEqual(list(self.common_pins.contains_many(pins)), expected)
+
+class TestDemographicTemplates(unittest.TestCase):
+    #1: Compiled templates produce every distinct pattern exactly once
+    def test_patterns_for_date(self):
+        expected = {"0201", "0102", "0290", "9002", "0190", "9001", "9090", "0202", "0101", "9009", "1020", "2010"}
+        self.assertEqual(generate_demographic_patterns("02-01-1990"), expected)
+
+    #2: Dates can be passed directly instead of DD-MM-YYYY strings
+    def test_date_objects(self):
+        self.assertEqual(generate_demographic_patterns(datetime.date(1990, 1, 2)),
+                         generate_demographic_patterns("02-01-1990"))
+        strength, reasons = evaluate_strength_and_reasons("0201", set(), datetime.date(1990, 1, 2), None, None)
+        self.assertEqual(reasons, ["DEMOGRAPHIC_DOB_SELF"])
+
+    #3: Invalid dates produce no patterns
+    def test_invalid_date(self):
+        self.assertEqual(generate_demographic_patterns("31-02-1990"), set())
+        self.assertEqual(generate_demographic_patterns("1990-01-02"), set())
+
+class TestDemographicDateIndex(unittest.TestCase):
+    def setUp(self):
+        self.index = get_date_index(4)
+
+    #1: Index rows match the pattern generator
+    def test_rows_match_generator(self):
+        for date_str in ["01-01-1950", "29-02-1992", "01-01-1990", "31-12-2015"]:
+            expected = {int(p) for p in generate_demographic_patterns(date_str) if len(p) == 4}
+            self.assertEqual(self.index.patterns_for_date(parse_date(date_str)), expected)
+
+    #2: Reverse lookup of dates that make a PIN weak
+    def test_dates_for_pin(self):
+        dates = dates_for_pin("0190", 4)
+        self.assertIn(datetime.date(1990, 1, 1), dates)
+        self.assertEqual(dates, sorted(dates))
+        for date in dates:
+            self.assertIn("0190", generate_demographic_patterns(date.strftime("%d-%m-%Y")))
+
+    #3: Dates outside the index fall back to the generator
+    def test_out_of_range_date(self):
+        self.assertIsNone(self.index.has_pattern(datetime.date(1949, 12, 1), 1249))
+        strength, reasons = evaluate_strength_and_reasons("1249", set(), "01-12-1949", None, None)
+        self.assertEqual(reasons, ["DEMOGRAPHIC_DOB_SELF"])
+
+class TestBatchEvaluator(unittest.TestCase):
+    def setUp(self):
+        self.common_pins = load_common_pins()
+
+    #1: Batch results match the scalar function row by row
+    def test_matches_scalar(self):
+        rows = [
+            ("1234", None, None, None),
+            ("0190", datetime.date(1990, 1, 1), None, None),
+            ("0290", None, datetime.date(1990, 2, 2), None),
+            ("0315", None, None, datetime.date(2015, 3, 3)),
+            ("5678", datetime.date(1990, 1, 1), datetime.date(1990, 2, 2), datetime.date(2015, 3, 3)),
+            ("0190", datetime.date(1990, 1, 1), datetime.date(1990, 1, 1), datetime.date(1990, 1, 1)),
+        ]
+        strength, mask = evaluate_batch(
+            [int(row[0]) for row in rows], self.common_pins, 4,
+            [date_to_int(row[1]) for row in rows],
+            [date_to_int(row[2]) for row in rows],
+            [date_to_int(row[3]) for row in rows],
+        )
+        for i, row in enumerate(rows):
+            expected = evaluate_strength_and_reasons(row[0], self.common_pins, *row[1:])
+            self.assertEqual((STRENGTHS[strength[i]], mask_to_reasons(int(mask[i]))), expected)
+
+    #2: Missing and impossible dates never match
+    def test_invalid_dates(self):
+        strength, mask = evaluate_batch([190, 190], self.common_pins, 4, [0, 19900131 + 100])
+        self.assertEqual(list(mask), [0, 0])
+        self.assertEqual(list(strength), [0, 0])
+
+    #3: PINs outside the keyspace are rejected rather than wrapped around
+    def test_out_of_range_pins(self):
+        for pins in ([-1], [10 ** 4], [1, 10 ** 4 + 5]):
+            with self.assertRaises(ValueError):
+                evaluate_batch(pins, self.common_pins, 4)
+
+class TestBulkAudit(unittest.TestCase):
+    def setUp(self):
+        self.blocklist_path = os.path.join(os.path.dirname(__file__), "common_pins.txt")
+
+    #1: CSV records stream through in order, invalid MPINs are reported
+    def test_csv_audit(self):
+        source = io.StringIO(
+            "user_id,mpin,dob_self,dob_spouse,anniversary\n"
+            "1,1234,,,\n"
+            "2,0190,01-01-1990,,\n"
+            "3,0190,1990-01-01,,\n"
+            "4,12ab,,,\n"
+        )
+        results = list(audit(read_records(source, "csv"), 4, self.blocklist_path, workers=0, chunk_size=2))
+        self.assertEqual([r["user_id"] for r in results], ["1", "2", "3", "4"])
+        self.assertEqual(results[0]["reasons"], ["COMMONLY_USED", "SEQUENTIAL"])
+        self.assertEqual(results[1]["reasons"], ["DEMOGRAPHIC_DOB_SELF"])
+        self.assertEqual(results[2]["reasons"], ["DEMOGRAPHIC_DOB_SELF"])
+        self.assertIn("error", results[3])
+
+    #2: JSONL in, JSONL out
+    def test_jsonl_round_trip(self):
+        source = io.StringIO(json.dumps({"user_id": "7", "mpin": "0190", "dob_self": "01-01-1990"}) + "\n")
+        target = io.StringIO()
+        write_results(audit(read_records(source, "jsonl"), 4, self.blocklist_path, workers=0), target, "jsonl")
+        result = json.loads(target.getvalue())
+        self.assertEqual(result["strength"], "WEAK")
+        self.assertEqual(result["mpin"], "0190")
+
+    #3: Malformed JSONL lines become error rows with their line number
+    def test_malformed_lines(self):
+        source = io.StringIO('{"user_id": "8", "mpin": "1234"}\n{"mpin": \n\n[1, 2]\n"1234"\n{"user_id": "9", "mpin": "1234"}\n')
+        results = list(audit(read_records(source, "jsonl"), 4, self.blocklist_path, workers=0, chunk_size=2))
+        self.assertEqual([r["user_id"] for r in results], ["8", None, None, None, "9"])
+        self.assertEqual([r["error"].split(":")[0] for r in results[1:4]], ["line 2", "line 4", "line 5"])
+        self.assertEqual(results[4]["strength"], "WEAK")
+
+class TestConnectionPool(unittest.TestCase):
+    #1: One connection and one prepared cursor serve repeated upserts
+    @patch('mysql.connector.connect')
+    def test_prepared_cursor_reused(self, mock_connect):
+        mock_connect.return_value.cursor.return_value.rowcount = 1
+        pool = db.ConnectionPool(size=2, host="localhost")
+        for _ in range(3):
+            self.assertEqual(pool.upsert(db.log_params("2004", "5678", "STRONG", [], None, None, None)), 1)
+        mock_connect.assert_called_once_with(host="localhost")
+        mock_connect.return_value.cursor.assert_called_once_with(prepared=True)
+        cursor = mock_connect.return_value.cursor.return_value
+        self.assertEqual(cursor.execute.call_count, 3)
+        self.assertEqual(cursor.execute.call_args[0][0], db.UPSERT_QUERY)
+
+    #2: A dropped connection is replaced and the upsert retried once
+    @patch('mysql.connector.connect')
+    def test_dropped_connection_retried(self, mock_connect):
+        import mysql.connector
+
+        broken, healthy = MagicMock(), MagicMock()
+        broken.cursor.return_value.execute.side_effect = mysql.connector.errors.OperationalError("gone away")
+        healthy.cursor.return_value.rowcount = 2
+        mock_connect.side_effect = [broken, healthy]
+        pool = db.ConnectionPool(size=1)
+        self.assertEqual(pool.upsert(db.log_params("2004", "5678", "STRONG", [], None, None, None)), 2)
+        broken.close.assert_called_once()
+
+    #3: Other database errors are raised to the caller
+    @patch('mysql.connector.connect', side_effect=Exception("Mocked DB Error"))
+    def test_connect_error_raised(self, mock_connect):
+        pool = db.ConnectionPool(size=1)
+        with self.assertRaises(Exception):
+            pool.upsert(db.log_params("2004", "5678", "STRONG", [], None, None, None))
+
+    #4: A dropped slot wakes a caller waiting for one, and waits time out
+    @patch('mysql.connector.connect')
+    def test_discard_wakes_waiter(self, mock_connect):
+        healthy = MagicMock()
+        healthy.cursor.return_value.rowcount = 1
+        mock_connect.side_effect = [MagicMock(), healthy]
+        pool = db.ConnectionPool(size=1, acquire_timeout=5)
+        first = pool._acquire()
+        results = []
+        waiter = threading.Thread(target=lambda: results.append(
+            pool.upsert(db.log_params("2004", "5678", "STRONG", [], None, None, None))))
+        waiter.start()
+        pool._discard(first)
+        waiter.join(5)
+        self.assertEqual(results, [1])
+        held = pool._acquire()
+        pool.acquire_timeout = 0.01
+        with self.assertRaises(TimeoutError):
+            pool._acquire()
+        pool._release(held)
+
+class TestStorageBackends(unittest.TestCase):
+    def stores(self):
+        yield db.open_store("memory")
+        yield db.open_store("sqlite", sqlite_path=":memory:")
+
+    #1: Every backend reports 1 for an insert and 2 for an update
+    def test_upsert_rowcounts(self):
+        for store in self.stores():
+            with self.subTest(store=type(store).__name__):
+                self.assertEqual(store.upsert(db.log_params("3001", "0123", "WEAK", ["COMMONLY_USED"], datetime.date(1990, 1, 2), None, None, 7)), 1)
+                self.assertEqual(store.upsert(db.log_params("3001", "0456", "STRONG", [], None, None, None, 8)), 2)
+                record = store.get("3001")
+                self.assertEqual((record["mpin"], record["strength"], record["reason_json"], record["dob_self"], record["blocklist_version"]),
+                                 ("0456", "STRONG", "", None, 8))
+                self.assertIsInstance(record["timestamp"], datetime.datetime)
+                store.close()
+
+    #2: Batches, reads back as dates, and clear
+    def test_upsert_many(self):
+        for store in self.stores():
+            with self.subTest(store=type(store).__name__):
+                store.upsert_many([db.log_params(f"30{i:02d}", "0123", "WEAK", ["COMMONLY_USED"], datetime.date(1990, 1, i + 1), None, None) for i in range(10)])
+                self.assertEqual(store.get("3009")["dob_self"], datetime.date(1990, 1, 10))
+                self.assertEqual(store.get("3009")["reason_json"], "COMMONLY_USED")
+                store.clear()
+                self.assertIsNone(store.get("3009"))
+                store.close()
+
+    #3: The backend is chosen by DB_BACKEND
+    def test_backend_selection(self):
+        with patch.dict(os.environ, {"DB_BACKEND": "memory"}):
+            self.assertIsInstance(db.open_store(), MemoryStore)
+        with tempfile.TemporaryDirectory() as tmp, patch.dict(os.environ, {"DB_BACKEND": "sqlite", "DB_SQLITE_PATH": os.path.join(tmp, "logs.db")}):
+            store = db.open_store()
+            store.upsert(db.log_params("3100", "0123", "STRONG", [], None, None, None))
+            store.close()
+            store = db.open_store()
+            self.assertEqual(store.get("3100")["mpin"], "0123")
+            store.close()
+        with self.assertRaises(ValueError):
+            db.open_store("postgres")
+
+    #4: Rows are stored compactly and read back as text through the mpin_logs view
+    def test_compact_schema(self):
+        store = db.open_store("sqlite", sqlite_path=":memory:")
+        store.upsert(db.log_params("3200", "0012", "WEAK", ["COMMONLY_USED", "DEMOGRAPHIC_ANNIVERSARY"], None, None, None))
+        store.upsert(db.log_params("3201", "0099", "STRONG", [], None, None, None))
+        connection = store._connection
+        self.assertEqual(connection.execute("SELECT mpin, strength, reasons FROM mpin_evaluations WHERE user_id = '3200'").fetchone(),
+                         ("0012", 1, 0b1001))
+        self.assertEqual(connection.execute("SELECT mpin, strength, reason_json FROM mpin_logs ORDER BY user_id").fetchall(),
+                         [("0012", "WEAK", "COMMONLY_USED, DEMOGRAPHIC_ANNIVERSARY"), ("0099", "STRONG", "")])
+        self.assertEqual(store.get("3200")["reason_json"], "COMMONLY_USED, DEMOGRAPHIC_ANNIVERSARY")
+        store.close()
+
+    #5: The 4-digit list version a 6-digit PIN was searched for is stored alongside blocklist_version
+    def test_fragment_blocklist_version(self):
+        for store in self.stores():
+            with self.subTest(store=type(store).__name__):
+                store.upsert(db.log_params("3300", "0123", "STRONG", [], None, None, None, 7, fragment_blocklist_version=9))
+                record = store.get("3300")
+                self.assertEqual((record["blocklist_version"], record["fragment_blocklist_version"]), (7, 9))
+                store.close()
+
+class TestWriteBehindLogger(unittest.TestCase):
+    #1: Records are written in batches no larger than batch_size
+    def test_batches(self):
+        batches = []
+        writer = LogWriter(batches.append, batch_size=100, flush_interval=0.05)
+        for i in range(250):
+            writer.submit(("user{}".format(i), "5678"))
+        writer.flush()
+        writer.close()
+        self.assertEqual(sum(len(batch) for batch in batches), 250)
+        self.assertTrue(all(len(batch) <= 100 for batch in batches))
+        self.assertEqual(writer.written, 250)
+
+    #2: A full queue pushes back on producers
+    def test_backpressure(self):
+        release = threading.Event()
+        writer = LogWriter(lambda batch: release.wait(), batch_size=1, max_queue=2)
+        writer.submit(1)
+        writer.submit(2, timeout=1)
+        writer.submit(3, timeout=1)
+        with self.assertRaises(queue.Full):
+            writer.submit(4, timeout=0.05)
+        release.set()
+        writer.close()
+        self.assertEqual(writer.written, 3)
+
+    #3: Failed batches are counted, later batches still go through
+    def test_failed_batch(self):
+        calls = []
+
+        def write_batch(batch):
+            calls.append(batch)
+            if len(calls) == 1:
+                raise Exception("Mocked DB Error")
+
+        writer = LogWriter(write_batch, batch_size=1)
+        with self.assertLogs("mpin.log_writer", level="ERROR"):
+            writer.submit(1)
+            writer.flush()
+        writer.submit(2)
+        writer.close()
+        self.assertEqual((writer.failed, writer.written), (1, 1))
+
+    #4: Batches reach MySQL as one executemany and one commit
+    @patch('mysql.connector.connect')
+    def test_upsert_many(self, mock_connect):
+        pool = db.ConnectionPool(size=1)
+        rows = [db.log_params("2004", "5678", "STRONG", [], None, None, None)] * 3
+        pool.upsert_many(rows)
+        plain_cursor = mock_connect.return_value.cursor.return_value
+        plain_cursor.executemany.assert_called_once_with(db.UPSERT_QUERY, rows)
+        mock_connect.return_value.commit.assert_called_once()
+
+class TestLogJournal(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.journal = Journal(self.tmp.name, segment_bytes=64)
+        self.row = db.log_params("2004", "5678", "STRONG", [], datetime.date(1990, 1, 1), None, None)
+
+    def tearDown(self):
+        self.journal.close()
+        self.tmp.cleanup()
+
+    #1: Journaled records replay in order and the segments are removed
+    def test_replay(self):
+        self.journal.append([self.row, ("a",)])
+        self.journal.append([("b",)])
+        written = []
+        self.assertEqual(self.journal.replay(written.extend), 3)
+        self.assertEqual(written, [self.row, ("a",), ("b",)])
+        self.assertEqual(self.journal.segments(), [])
+        self.assertFalse(self.journal.has_pending())
+
+    #2: A torn record at the end of a segment is skipped
+    def test_torn_tail(self):
+        self.journal.append([("a",), ("b",)])
+        path = self.journal.seal()[0]
+        with open(path, "r+b") as file:
+            file.truncate(os.path.getsize(path) - 2)
+        with self.assertLogs("mpin.journal", level="WARNING"):
+            self.assertEqual(list(read_segment(path)), [("a",)])
+
+    #3: Pending segments are picked up by a new process
+    def test_reopen(self):
+        self.journal.append([("a",)])
+        self.journal.close()
+        reopened = Journal(self.tmp.name)
+        self.assertTrue(reopened.has_pending())
+        reopened.append([("b",)])
+        written = []
+        reopened.replay(written.extend)
+        reopened.close()
+        self.assertEqual(written, [("a",), ("b",)])
+
+    #4: Batches are journaled while the database is down, then replayed first
+    def test_sink_outage(self):
+        written = []
+        database_up = [False]
+
+        def write_batch(batch):
+            if not database_up[0]:
+                raise Exception("Mocked DB Error")
+            written.extend(batch)
+
+        sink = JournaledSink(write_batch, self.journal, retry_interval=0)
+        with self.assertLogs("mpin.journal", level="WARNING"):
+            sink([("a",)])
+            sink([("b",)])
+        self.assertTrue(self.journal.has_pending())
+        database_up[0] = True
+        sink([("c",)])
+        self.assertEqual(written, [("a",), ("b",), ("c",)])
+        self.assertFalse(self.journal.has_pending())
+
+    #5: Journals sharing a directory never replay a segment another one still writes to
+    def test_shared_directory(self):
+        other = Journal(self.tmp.name)
+        self.journal.append([("a",)])
+        other.append([("b",)])
+        written = []
+        self.assertEqual(other.replay(written.extend), 1)
+        self.assertEqual(written, [("b",)])
+        self.journal.append([("c",)])
+        other.append([("d",)])
+        other.close()
+        self.assertEqual(self.journal.replay(written.extend), 3)
+        self.assertEqual(sorted(written[1:]), [("a",), ("c",), ("d",)])
+        self.assertEqual(self.journal.segments(), [])
+
+class TestStreamlitSessionCache(unittest.TestCase):
+    #1: Rerunning with unchanged inputs neither re-evaluates nor re-logs
+    @patch('final_4.log_to_database')
+    @patch('final_4.evaluate_strength_and_reasons', wraps=evaluate_strength_and_reasons)
+    def test_unchanged_inputs(self, mock_evaluate, mock_log):
+        # Imported here so that collecting the suite does not load Streamlit.
+        from streamlit.testing.v1 import AppTest
+
+        at = AppTest.from_file("app.py", default_timeout=60).run()
+        at.text_input[0].input("1234")
+        at.text_input[1].input("2004")
+        at.button[0].click().run()
+        at.button[0].click().run()
+        self.assertEqual(mock_evaluate.call_count, 1)
+        self.assertEqual(mock_log.call_count, 1)
+        self.assertEqual(at.success[0].value, "Strength: WEAK")
+
+        at.text_input[0].input("4821")
+        at.button[0].click().run()
+        self.assertEqual(mock_evaluate.call_count, 2)
+        self.assertEqual(mock_log.call_count, 2)
+
+class TestBlocklistReload(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.tmp.name, "pins.txt")
+        self.write(["1234", "4821"])
+        self.blocklist = Blocklist(self.path, 4, poll_interval=0.01)
+
+    def tearDown(self):
+        self.blocklist.stop()
+        self.tmp.cleanup()
+
+    def write(self, pins):
+        with open(self.path, 'w') as file:
+            file.write("\n".join(pins) + "\n")
+        # Make sure the change is visible even on filesystems with coarse mtimes.
+        stat = os.stat(self.path)
+        os.utime(self.path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1_000_000_000))
+
+    #1: A changed file is swapped in as a new version; old snapshots stay intact
+    def test_reload(self):
+        old = self.blocklist.snapshot()
+        self.assertFalse(self.blocklist.check())
+        self.write(["1234"] * 2 + ["4821", "0000"])
+        self.assertTrue(self.blocklist.check())
+        new = self.blocklist.snapshot()
+        self.assertNotEqual(new.version, old.version)
+        self.assertIn("0000", new.index)
+        self.assertNotIn("0000", old.index)
+        self.assertEqual(new.version, load_common_pins(self.path).fingerprint)
+
+    #2: Empty or truncated lists are rejected
+    def test_rejects_bad_list(self):
+        version = self.blocklist.version
+        with self.assertLogs("mpin.blocklist", level="ERROR"):
+            self.write([])
+            self.assertFalse(self.blocklist.check())
+        self.assertEqual(self.blocklist.version, version)
+        self.assertIn("1234", self.blocklist)
+
+    #3: The background watcher picks up changes
+    def test_watcher(self):
+        self.blocklist.start()
+        version = self.blocklist.version
+        self.write(["1234", "4821", "9999"])
+        for _ in range(200):
+            if self.blocklist.version != version:
+                break
+            threading.Event().wait(0.01)
+        self.assertIn("9999", self.blocklist)
+
+class TestEvaluationService(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.service = EvaluationService({length: Blocklist(path, length) for length, path in BLOCKLIST_PATHS.items()})
+
+    def request(self, method, path, payload=None):
+        async def exchange():
+            server = await asyncio.start_server(lambda r, w: handle_connection(self.service, r, w), "127.0.0.1", 0)
+            async with server:
+                reader, writer = await asyncio.open_connection(*server.sockets[0].getsockname()[:2])
+                body = json.dumps(payload).encode() if payload is not None else b""
+                writer.write(f"{method} {path} HTTP/1.1\r\nContent-Length: {len(body)}\r\nConnection: close\r\n\r\n".encode() + body)
+                response = await reader.read()
+                writer.close()
+            head, _, body = response.partition(b"\r\n\r\n")
+            return int(head.split()[1]), json.loads(body)
+        return asyncio.run(exchange())
+
+    #1: /evaluate matches evaluate_strength_and_reasons
+    def test_evaluate(self):
+        common_pins = load_common_pins()
+        for mpin, dob in (("1234", ""), ("0201", "02-01-1998"), ("5678", "1998-01-02")):
+            status, result = self.request("POST", "/evaluate", {"mpin": mpin, "dob_self": dob, "length": 4})
+            self.assertEqual(status, 200)
+            expected = evaluate_strength_and_reasons(mpin, common_pins, parse_date("02-01-1998") if dob else None, None, None)
+            self.assertEqual((result["strength"], result["reasons"]), expected)
+            self.assertEqual(result["blocklist_version"], common_pins.fingerprint)
+            self.assertNotIn("fragment_blocklist_version", result)
+
+    #2: /evaluate/batch reports per-item errors without failing the batch
+    def test_batch(self):
+        status, result = self.request("POST", "/evaluate/batch", {"items": [{"mpin": "1234"}, {"mpin": "12a4"}, {"mpin": "123456"}]})
+        self.assertEqual(status, 200)
+        self.assertEqual(result["results"][0]["reasons"], ["COMMONLY_USED", "SEQUENTIAL"])
+        self.assertIn("error", result["results"][1])
+        self.assertIn(result["results"][2]["strength"], STRENGTHS)
+
+    #3: Bad requests get 4xx responses
+    def test_errors(self):
+        self.assertEqual(self.request("POST", "/evaluate", {"mpin": "123"})[0], 400)
+        self.assertEqual(self.request("POST", "/evaluate", {"mpin": "12345", "length": 4})[0], 400)
+        self.assertEqual(self.request("POST", "/evaluate", {"mpin": "1234", "length": [4]})[0], 400)
+        self.assertEqual(self.request("POST", "/evaluate", {"mpin": "1234", "user_id": ["x"]})[0], 400)
+        status, result = self.request("POST", "/evaluate/batch", {"items": [
+            {"mpin": "1234", "length": [4]}, {"mpin": "1234", "user_id": {"id": 1}}, {"mpin": "1234"}]})
+        self.assertEqual(status, 200)
+        self.assertEqual(["error" in item for item in result["results"]], [True, True, False])
+        self.assertEqual(self.request("GET", "/evaluate")[0], 405)
+        self.assertEqual(self.request("GET", "/nope")[0], 404)
+        self.assertEqual(self.request("GET", "/health")[1]["status"], "ok")
+
+    #4: Logging never blocks a response; a full queue drops the record
+    def test_logging_off_request_path(self):
+        with patch("mpin.db.get_writer"), patch("mpin.db.log_evaluation", side_effect=queue.Full) as log_evaluation, \
+                self.assertLogs("mpin.service", level="WARNING"):
+            service = EvaluationService(self.service.blocklists, env_path="unused.env")
+            result = asyncio.run(service.evaluate_one({"mpin": "1234", "user_id": "user_svc"}))
+        self.assertEqual(result["user_id"], "user_svc")
+        self.assertEqual(log_evaluation.call_args.kwargs["timeout"], 0)
+        self.assertEqual(service.dropped_logs, 1)
+
+class TestRequestCoalescer(unittest.TestCase):
+    def gather(self, coalescer, items):
+        async def run():
+            try:
+                return await asyncio.gather(*(coalescer.submit(item) for item in items), return_exceptions=True)
+            finally:
+                await coalescer.close()
+        return asyncio.run(run())
+
+    #1: Concurrent submits share batches capped at max_batch_size and resolve in order
+    def test_batches(self):
+        sizes = []
+        def run_batch(items):
+            sizes.append(len(items))
+            return [item * 2 for item in items]
+        coalescer = Coalescer(run_batch, max_batch_size=8, max_wait=0.05)
+        self.assertEqual(self.gather(coalescer, range(20)), [item * 2 for item in range(20)])
+        self.assertEqual(sizes, [8, 8, 4])
+        metrics = coalescer.metrics.snapshot()
+        self.assertEqual((metrics["batches"], metrics["items"]), (3, 20))
+        self.assertEqual(metrics["batch_size_buckets"], {"<=4": 1, "<=8": 2})
+        self.assertGreaterEqual(metrics["queue_delay_ms"]["p99"], metrics["queue_delay_ms"]["p50"])
+
+    #2: Errors reach only the callers they belong to, unless the whole batch fails
+    def test_errors(self):
+        coalescer = Coalescer(lambda items: [ValueError(i) if i == 1 else i for i in items])
+        results = self.gather(coalescer, [0, 1, 2])
+        self.assertEqual(results[0::2], [0, 2])
+        self.assertIsInstance(results[1], ValueError)
+        def fail(items):
+            raise RuntimeError("engine down")
+        with self.assertLogs("mpin.coalescer", level="ERROR"):
+            results = self.gather(Coalescer(fail), [0, 1])
+        self.assertTrue(all(isinstance(result, RuntimeError) for result in results))
+
+    #3: The batched engine call agrees with evaluate_strength_and_reasons on both paths
+    def test_evaluate_many(self):
+        common_pins = load_common_pins()
+        dob = parse_date("02-01-1998")
+        mpins = ["1234", "0201", "0298", "5678", "9802", "0000"]
+        dates = [dob, None, dob, dob, dob, None]
+        expected = [evaluate_strength_and_reasons(mpin, common_pins, date, None, date) for mpin, date in zip(mpins, dates)]
+        for min_rows in (0, len(mpins) + 1):
+            with patch("mpin.engine.VECTORIZE_MIN_ROWS", min_rows):
+                self.assertEqual(evaluate_many(mpins, common_pins, dates, [None] * len(mpins), dates, 4), expected)
+        # Invalid MPINs are rejected the same way on both paths.
+        for min_rows in (0, len(mpins) + 1):
+            with patch("mpin.engine.VECTORIZE_MIN_ROWS", min_rows):
+                with self.assertRaises(ValueError):
+                    evaluate_many(["1234", "12a4"], common_pins, [None] * 2, [None] * 2, [None] * 2, 4)
+
+    #4: A service item that fails fails only its own caller
+    def test_service_item_errors(self):
+        service = EvaluationService({4: Blocklist(BLOCKLIST_PATHS[4], 4)})
+        def get_profile(user_id, dates, length):
+            if user_id == "mallory":
+                raise TypeError("bad profile")
+            return UserProfile(dates, length)
+        evaluate_many = engine.evaluate_many
+        def evaluate_rows(mpins, *args):
+            if "5830" in mpins:
+                raise RuntimeError("bad row")
+            return evaluate_many(mpins, *args)
+        items = [parse_item({"mpin": "1234", "user_id": "alice"}), parse_item({"mpin": "1234", "user_id": "mallory"}),
+                 parse_item({"mpin": "5830"})]
+        with patch.object(service.profiles, "get", side_effect=get_profile), \
+                patch("mpin.engine.evaluate_many", side_effect=evaluate_rows), \
+                self.assertLogs("mpin.service", level="ERROR"):
+            results = self.gather(service.coalescer, items)
+            batch = service.evaluate_batch({"items": [{"mpin": "1234"}, {"mpin": "5830"}]})["results"]
+        self.assertEqual(results[0]["strength"], "WEAK")
+        self.assertIsInstance(results[1], TypeError)
+        self.assertIsInstance(results[2], RuntimeError)
+        self.assertEqual(batch[0]["strength"], "WEAK")
+        self.assertEqual(batch[1], {"error": "evaluation failed"})
+
+    #5: Batches run off the event loop, one at a time
+    def test_off_event_loop(self):
+        threads = []
+        def run_batch(items):
+            threads.append(threading.current_thread())
+            return items
+        self.assertEqual(self.gather(Coalescer(run_batch), [0, 1, 2]), [0, 1, 2])
+        self.assertTrue(threads)
+        self.assertNotIn(threading.main_thread(), threads)
+
+class TestStructuralRules(unittest.TestCase):
+    def setUp(self):
+        self.common_pins = load_common_pins()
+
+    #1: Each rule is reported as its own reason (checked with an empty blocklist)
+    def test_rules(self):
+        no_common_pins = PinIndex(4)
+        cases = {
+            "1111": ["REPEATED_DIGITS"],
+            "5678": ["SEQUENTIAL"],
+            "8901": ["SEQUENTIAL"],
+            "1357": ["ARITHMETIC_PROGRESSION"],
+            "1221": ["PALINDROME"],
+            "3443": ["PALINDROME"],
+            "4545": ["REPEATED_PATTERN"],
+            "1122": ["REPEATED_PATTERN"],
+        }
+        for mpin, expected in cases.items():
+            with self.subTest(mpin=mpin):
+                self.assertEqual(evaluate_strength_and_reasons(mpin, no_common_pins, None, None, None), ("WEAK", expected))
+
+    #2: Structural reasons follow the blocklist and demographic reasons
+    def test_reason_order(self):
+        strength, reasons = evaluate_strength_and_reasons("1234", self.common_pins, "12-12-1934", None, None)
+        self.assertEqual(reasons, ["COMMONLY_USED", "DEMOGRAPHIC_DOB_SELF", "SEQUENTIAL"])
+
+    #3: The table covers the keyspace and agrees with the batch evaluator
+    def test_table(self):
+        table = structure_table(4)
+        self.assertEqual(len(table), 10 ** 4)
+        flagged = [pin for pin in range(10 ** 4) if table[pin]]
+        strength, mask = evaluate_batch(flagged, PinIndex(4), 4)
+        self.assertTrue((strength == STRENGTHS.index("WEAK")).all())
+        self.assertEqual([int(m) for m in mask], [table[pin] for pin in flagged])
+        self.assertEqual(structural_mask("5830", 4), 0)
+        self.assertEqual(structural_mask("12a4", 4), 0)
+
+class TestKeypadPatterns(unittest.TestCase):
+    #1: Lines, corners, knight moves and crosses on the phone keypad are WEAK
+    def test_shapes(self):
+        no_common_pins = PinIndex(4)
+        for mpin in ("2580", "0852", "1478", "1397", "2684", "1834", "1937", "2846"):
+            with self.subTest(mpin=mpin):
+                self.assertEqual(evaluate_strength_and_reasons(mpin, no_common_pins, None, None, None), ("WEAK", ["KEYPAD_PATTERN"]))
+
+    #2: Shapes come from the adjacency tables, not from the digits' values
+    def test_not_flagged(self):
+        for mpin in ("5830", "2581", "1398", "1835"):
+            self.assertFalse(structural_mask(mpin, 4) & REASON_BITS["KEYPAD_PATTERN"], mpin)
+
+    #3: Every flagged PIN traces a keypad shape step by step
+    def test_table_matches_walks(self):
+        flagged = {"".join(map(str, digits)) for digits in keypad_patterns(4)}
+        table = structure_table(4)
+        self.assertEqual(flagged, {str(pin).zfill(4) for pin in range(10 ** 4) if table[pin] & REASON_BITS["KEYPAD_PATTERN"]})
+
+class TestNearMiss(unittest.TestCase):
+    def setUp(self):
+        self.common_pins = PinIndex.from_pins(["5830"], 4)
+
+    #1: One digit changed or two neighbouring digits swapped is NEAR_COMMON, but not the common PIN itself.
+    # NEAR_COMMON is advisory: on its own it leaves the PIN STRONG.
+    def test_near_common(self):
+        for common_pins in (self.common_pins, {"5830"}):
+            for mpin in ('5831', '8530', '5380'):
+                with self.subTest(mpin=mpin):
+                    self.assertEqual(evaluate_strength_and_reasons(mpin, common_pins, None, None, None), ("STRONG", ["NEAR_COMMON"]))
+            self.assertEqual(evaluate_strength_and_reasons("5830", common_pins, None, None, None), ("WEAK", ["COMMONLY_USED"]))
+            self.assertEqual(evaluate_strength_and_reasons("5841", common_pins, None, None, None), ("STRONG", []))
+
+    #2: A near miss on a date pattern is NEAR_DEMOGRAPHIC, unless a date matches exactly
+    def test_near_demographic(self):
+        for mpin, anniversary in (("1706", None), ("7105", None), ("1795", None), ("1706", "20-11-2001")):
+            with self.subTest(mpin=mpin):
+                self.assertEqual(evaluate_strength_and_reasons(mpin, self.common_pins, "17-05-1987", None, anniversary), ("WEAK", ["NEAR_DEMOGRAPHIC"]))
+        strength, reasons = evaluate_strength_and_reasons("1705", self.common_pins, "17-05-1987", "17-06-1987", None)
+        self.assertEqual(reasons, ["DEMOGRAPHIC_DOB_SELF"])
+
+    #3: The precomputed neighbourhood and the batch evaluator agree with the scalar path
+    def test_batch(self):
+        common_pins = load_common_pins()
+        near = build_near_index(common_pins)
+        self.assertEqual(set(near), {str(n).zfill(4) for pin in common_pins for n in neighbours(int(pin), 4)} - set(common_pins))
+        dob = datetime.date(1987, 5, 17)
+        mpins = sorted(set(near))[:200] + [str(n).zfill(4) for pattern in get_date_index(4).patterns_for_date(dob) for n in neighbours(pattern, 4)]
+        strength, mask = evaluate_batch([int(mpin) for mpin in mpins], common_pins, 4, [date_to_int(dob)] * len(mpins))
+        for mpin, s, m in zip(mpins, strength, mask):
+            self.assertEqual(evaluate_strength_and_reasons(mpin, common_pins, dob, None, None), (STRENGTHS[s], mask_to_reasons(int(m))), mpin)
+
+    #4: Over the whole keyspace, NEAR_COMMON alone never makes a PIN WEAK
+    def test_near_common_keyspace(self):
+        strength, mask = evaluate_batch(range(10 ** 4), load_common_pins(), 4)
+        near_only = mask == REASON_BITS["NEAR_COMMON"]
+        self.assertTrue(near_only.any())
+        self.assertFalse(strength[near_only].any())
+        self.assertEqual(list(strength), [int(m & ~REASON_BITS["NEAR_COMMON"] != 0) for m in mask.tolist()])
+        self.assertLess(strength.mean(), 0.1)
+
+class TestEmbeddedFragments(unittest.TestCase):
+    #1: Only 6-digit PINs are searched for 4-digit fragments
+    def test_not_applied(self):
+        common_pins = load_common_pins()
+        strength, reasons = evaluate_strength_and_reasons("1234", common_pins, "12-03-1990", None, None)
+        self.assertNotIn("CONTAINS_COMMON", reasons)
+        self.assertNotIn("CONTAINS_DEMOGRAPHIC", reasons)
+        strength, mask = evaluate_batch([5830, 1203], common_pins, 4, [19900312, 19900312])
+        self.assertFalse((mask & (REASON_BITS["CONTAINS_COMMON"] | REASON_BITS["CONTAINS_DEMOGRAPHIC"])).any())
+
+class TestFrequencyTable(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.counts_path = os.path.join(self.tmp.name, "counts.txt")
+        with open(self.counts_path, "w") as file:
+            file.write("# pin count\n1234 500\n9999,300\n5830 3\n5830 2\n12a4 9\n")
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    #1: Counts compile into ranks (ties share one, unseen PINs come last) and map back from disk
+    def test_compile_and_map(self):
+        path = os.path.join(self.tmp.name, "frequency-4.bin")
+        FrequencyTable.from_file(self.counts_path, 4).save(path)
+        table = FrequencyTable.load(path)
+        try:
+            self.assertEqual(table.total, 805)
+            self.assertEqual((table.count("1234"), table.count("5830"), table.count(0)), (500, 5, 0))
+            self.assertEqual((table.rank("1234"), table.rank("9999"), table.rank("5830"), table.rank(0)), (1, 2, 3, 4))
+            self.assertEqual(len(table.ranks), 10 ** 4)
+        finally:
+            table.close()
+        with open(path, "r+b") as file:
+            file.write(b"XXXX")
+        with self.assertRaises(ValueError):
+            FrequencyTable.load(path)
+
+    #2: The guess rank is the earlier of the frequency rank and a flagged rule's candidates
+    def test_guess_rank(self):
+        table = FrequencyTable.from_file(self.counts_path, 4)
+        common_pins = load_common_pins()
+        self.assertEqual(guess_rank("5830", [], 4, common_pins, table), 3)
+        self.assertEqual(guess_rank("9999", ["REPEATED_DIGITS"], 4, common_pins, table), 2)
+        self.assertEqual(rule_guesses("REPEATED_DIGITS", 4), 10)
+        self.assertEqual(rule_guesses("COMMONLY_USED", 4, common_pins), len(common_pins))
+        self.assertEqual((score(1, 4), score(10 ** 4, 4)), (0, 100))
+
+    #3: The service reports guess_rank and score once a table is compiled
+    def test_service(self):
+        service = EvaluationService({4: Blocklist(BLOCKLIST_PATHS[4], 4)})
+        self.assertNotIn("guess_rank", service.evaluate_items([(4, "5830", (None, None, None), None, ())])[0])
+        service.frequency_tables[4] = FrequencyTable.from_file(self.counts_path, 4)
+        result = service.evaluate_items([(4, "5830", (None, None, None), None, ())])[0]
+        self.assertEqual((result["guess_rank"], result["score"]), (3, score(3, 4)))
+
+class TestBundle(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.tmp = tempfile.TemporaryDirectory()
+        cls.path = os.path.join(cls.tmp.name, "bundle.bin")
+        build_bundle(cls.path, BLOCKLIST_PATHS, (4,))
+        cls.bundle = Bundle(cls.path)
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.tmp.cleanup()
+
+    #1: The mapped tables match the ones a worker would build itself
+    def test_tables(self):
+        index = self.bundle.blocklist(BLOCKLIST_PATHS[4], 4)
+        self.assertEqual(bytes(index.bits), bytes(PinIndex.from_file(BLOCKLIST_PATHS[4], 4).bits))
+        self.assertIs(self.bundle.blocklist(BLOCKLIST_PATHS[4], 4), index)
+        self.assertEqual(bytes(near_index(index).bits), bytes(build_near_index(index).bits))
+        self.assertEqual(list(self.bundle.structure_table(4)), list(build_structure_table(4)))
+        dates = self.bundle.date_index(4)
+        date = datetime.date(1990, 5, 19)
+        self.assertEqual(dates.patterns_for_date(date), get_date_index(4).patterns_for_date(date))
+        self.assertIn(date, dates.dates_for_pattern(min(dates.patterns_for_date(date))))
+
+    #2: A blocklist edited since the build is parsed from the file instead
+    def test_stale_blocklist(self):
+        path = os.path.join(self.tmp.name, "common.txt")
+        with open(BLOCKLIST_PATHS[4], "r") as source, open(path, "w") as file:
+            file.write(source.read().rstrip("\n") + "\n5830\n")
+        self.assertIsNone(self.bundle.blocklist(path, 4))
+        with patch("mpin.bundle.get_bundle", return_value=self.bundle):
+            self.assertIn("5830", load_pin_file(path, 4))
+            self.assertIs(load_pin_file(BLOCKLIST_PATHS[4], 4), self.bundle.blocklist(BLOCKLIST_PATHS[4], 4))
+
+    #3: A file that is not a bundle is rejected
+    def test_bad_magic(self):
+        path = os.path.join(self.tmp.name, "bad.bin")
+        with open(self.path, "rb") as source, open(path, "wb") as file:
+            file.write(b"XXXX" + source.read()[4:])
+        with self.assertRaises(ValueError):
+            Bundle(path)
+
+    #4: A bundle whose structure tables came from other rule code is rejected
+    def test_stale_rules(self):
+        with patch("mpin.bundle.rules_signature", return_value=rules_signature() ^ 1):
+            with self.assertRaises(ValueError):
+                Bundle(self.path)
+
+class TestUserProfile(unittest.TestCase):
+    #1: A compiled profile gives the same result as evaluating from scratch
+    def test_matches_engine(self):
+        common_pins = load_common_pins()
+        for dates in (("19-05-1990", "02-01-1998", "20-11-2001"), ("19-05-1990", None, "bad"), (None, None, None)):
+            profile = UserProfile(labelled_dates(*dates), 4)
+            pins = {str(n).zfill(4) for n in range(0, 10 ** 4, 10)}
+            for date in dates:
+                for pattern in generate_demographic_patterns(date):
+                    pins.update(str(n).zfill(4) for n in [int(pattern)] + list(neighbours(int(pattern), 4)))
+            for mpin in sorted(pins) + ["12a4", ""]:
+                self.assertEqual(profile.evaluate(mpin, common_pins),
+                                 evaluate_strength_and_reasons(mpin, common_pins, *dates), (mpin, dates))
+                self.assertEqual(evaluate_strength_and_reasons(mpin, common_pins, *dates, profile=profile),
+                                 profile.evaluate(mpin, common_pins))
+
+    #2: Profiles are reused per user until the dates change, they expire or they are evicted
+    def test_cache(self):
+        now = [0.0]
+        cache = ProfileCache(maxsize=2, ttl=60, clock=lambda: now[0])
+        profile = cache.get("2004", labelled_dates("19-05-1990", None, None), 4)
+        self.assertIs(cache.get("2004", labelled_dates(datetime.date(1990, 5, 19), None, None), 4), profile)
+        self.assertIsNot(cache.get("2004", labelled_dates("19-05-1991", None, None), 4), profile)
+        profile = cache.get("2004", labelled_dates("19-05-1991", None, None), 4)
+        now[0] = 61
+        self.assertIsNot(cache.get("2004", labelled_dates("19-05-1991", None, None), 4), profile)
+        cache.get("2005", labelled_dates(None, None, None), 4)
+        cache.get("2006", labelled_dates(None, None, None), 4)
+        self.assertEqual(len(cache), 2)
+
+    #3: The service compiles the dates of a user once for several PINs
+    def test_service(self):
+        service = EvaluationService({4: Blocklist(BLOCKLIST_PATHS[4], 4)})
+        dates = (datetime.date(1990, 5, 19), None, None)
+        first = service.evaluate_items([(4, "1905", dates, "2004", ())])[0]
+        profile = service.profiles.get("2004", labelled_dates(*dates), 4)
+        second = service.evaluate_items([(4, "5830", dates, "2004", ())])[0]
+        self.assertIs(service.profiles.get("2004", labelled_dates(*dates), 4), profile)
+        self.assertEqual((first["strength"], second["strength"]), ("WEAK", "STRONG"))
+
+class TestOtherDates(unittest.TestCase):
+    OTHER = {"child": "04-03-2015", "mother": "19-05-1962", "twin": "04-03-2015"}
+
+    #1: A PIN from any further date is DEMOGRAPHIC_OTHER, found through one merged index
+    def test_engine(self):
+        common_pins = load_common_pins()
+        self.assertNotIn("DEMOGRAPHIC_OTHER", evaluate_strength_and_reasons("0403", common_pins, None, None, None)[1])
+        strength, reasons = evaluate_strength_and_reasons("0403", common_pins, None, None, None, other_dates=self.OTHER)
+        self.assertEqual(strength, "WEAK")
+        self.assertIn("DEMOGRAPHIC_OTHER", reasons)
+        profile = UserProfile(labelled_dates("04-03-2015", None, None, self.OTHER), 4)
+        self.assertEqual(profile.matched_labels("0403"), ("dob_self", "child", "twin"))
+        self.assertLessEqual({"DEMOGRAPHIC_DOB_SELF", "DEMOGRAPHIC_OTHER"}, set(profile.evaluate("0403", common_pins)[1]))
+        # Forty dates cost no more lookups than one.
+        many = {f"date{i}": datetime.date(1960 + i, 1 + i % 12, 1 + i % 28) for i in range(40)}
+        profile = UserProfile(labelled_dates(other_dates=many), 4)
+        patterns = set().union(*(generate_demographic_patterns(date.strftime("%d-%m-%Y")) for date in many.values()))
+        for mpin in sorted(patterns)[:50] + ["5830"]:
+            self.assertEqual("DEMOGRAPHIC_OTHER" in profile.evaluate(mpin, common_pins)[1], mpin in patterns, mpin)
+
+    #2: The service takes other_dates and reports which labels matched
+    def test_service(self):
+        service = EvaluationService({4: Blocklist(BLOCKLIST_PATHS[4], 4)})
+        results = service.evaluate_batch({"items": [
+            {"mpin": "0403", "other_dates": self.OTHER},
+            {"mpin": "0403", "other_dates": {"dob_self": "04-03-2015"}},
+            {"mpin": "0403", "other_dates": ["04-03-2015"]},
+        ]})["results"]
+        self.assertIn("DEMOGRAPHIC_OTHER", results[0]["reasons"])
+        self.assertEqual(results[0]["matched_dates"], ["child", "twin"])
+        self.assertIn("error", results[1])
+        self.assertIn("error", results[2])
+
+    #3: other_dates is stored as JSON and read back as dates
+    def test_storage(self):
+        for store in (db.open_store("memory"), db.open_store("sqlite", sqlite_path=":memory:")):
+            with self.subTest(store=type(store).__name__):
+                store.upsert(db.log_params("3300", "0403", "WEAK", ["DEMOGRAPHIC_OTHER"], None, None, None, 7,
+                                           {"child": datetime.date(2015, 3, 4)}))
+                store.upsert(db.log_params("3301", "0403", "STRONG", [], None, None, None))
+                self.assertEqual(store.get("3300")["other_dates"], {"child": datetime.date(2015, 3, 4)})
+                self.assertEqual(store.get("3300")["reason_json"], "DEMOGRAPHIC_OTHER")
+                self.assertEqual(store.get("3301")["other_dates"], {})
+                store.close()
+
+    #4: SQLite files created before other_dates existed gain the column
+    def test_sqlite_upgrade(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, "logs.db")
+            connection = sqlite3.connect(path)
+            connection.executescript(SQLITE_SCHEMA.replace(",\n    other_dates TEXT", ""))
+            connection.close()
+            store = db.open_store("sqlite", sqlite_path=path)
+            store.upsert(db.log_params("3400", "0403", "STRONG", [], None, None, None, None, {"child": "2015-03-04"}))
+            self.assertEqual(store._connection.execute("SELECT other_dates FROM mpin_logs").fetchone(), ('{"child": "2015-03-04"}',))
+            store.close()
+
+class TestFuzzyDates(unittest.TestCase):
+    #1: Partial dates and tolerances become the range of dates they could be
+    def test_date_range(self):
+        self.assertEqual(date_range("1990"), (datetime.date(1990, 1, 1), datetime.date(1990, 12, 31)))
+        self.assertEqual(date_range("02-2000"), (datetime.date(2000, 2, 1), datetime.date(2000, 2, 29)))
+        self.assertEqual(date_range("19-05-1990", 3), (datetime.date(1990, 5, 16), datetime.date(1990, 5, 22)))
+        self.assertEqual(fuzzy_date("19-05-1990"), datetime.date(1990, 5, 19))
+        for value in ("13-1990", "0000", "90", "May 1990", None):
+            self.assertIsNone(date_range(value), value)
+        # Ranges are cut to 1950 .. today; an exact date is kept as it is.
+        self.assertEqual(date_range("12-1949", 10), (datetime.date(1950, 1, 1), datetime.date(1950, 1, 10)))
+        self.assertEqual(date_range("19-05-1940"), (datetime.date(1940, 5, 19), datetime.date(1940, 5, 19)))
+        for value in ("0001", "1949", str(datetime.date.today().year + 1), "9999"):
+            self.assertIsNone(date_range(value), value)
+
+    #2: A range query on the date index equals the union of its days
+    def test_range_query(self):
+        index = get_date_index(4)
+        first, last = datetime.date(1990, 1, 1), datetime.date(1990, 12, 31)
+        days = [first + datetime.timedelta(days=i) for i in range((last - first).days + 1)]
+        self.assertEqual(index.patterns_for_range(first, last), set().union(*map(index.patterns_for_date, days)))
+        # Dates before the index are generated one by one.
+        first = datetime.date(1948, 12, 1)
+        days = [first + datetime.timedelta(days=i) for i in range(90)]
+        self.assertEqual(range_patterns(first, days[-1], 4),
+                         set().union(*(demographic_patterns(day, 4) for day in days)))
+
+    #3: In fuzzy mode a PIN from any date in the range is demographic
+    def test_engine(self):
+        common_pins = load_common_pins()
+        self.assertNotIn("DEMOGRAPHIC_DOB_SELF", evaluate_strength_and_reasons("1905", common_pins, "19-04-1990", None, None)[1])
+        for dob, tolerance in (("05-1990", 0), ("1990", 0), ("19-04-1990", 30)):
+            reasons = evaluate_strength_and_reasons("1905", common_pins, dob, None, None, fuzzy=True, tolerance_days=tolerance)[1]
+            self.assertIn("DEMOGRAPHIC_DOB_SELF", reasons, dob)
+        reasons = evaluate_strength_and_reasons("1905", common_pins, "19-04-1990", None, None, tolerance_days=10)[1]
+        self.assertNotIn("DEMOGRAPHIC_DOB_SELF", reasons)
+        self.assertTrue(matches_date_range("1905", "05-1990", 4))
+        self.assertEqual(evaluate_strength_and_reasons("5830", common_pins, "1990", None, None, fuzzy=True), ("STRONG", []))
+
+    #4: The service takes fuzzy and tolerance_days and checks them
+    def test_service(self):
+        service = EvaluationService({4: Blocklist(BLOCKLIST_PATHS[4], 4)})
+        results = service.evaluate_batch({"length": 4, "items": [
+            {"mpin": "1905", "dob_self": "05-1990", "fuzzy": True},
+            {"mpin": "1905", "dob_self": "1990-04-19", "tolerance_days": 30},
+            {"mpin": "1905", "other_dates": {"child": "1990"}, "fuzzy": True},
+            {"mpin": "1905", "dob_self": "05-1990"},
+            {"mpin": "1905", "dob_self": "1990", "tolerance_days": 400},
+            {"mpin": "1905", "dob_self": "1990", "fuzzy": "yes"},
+            {"mpin": "1905", "other_dates": {"child": "0500"}, "fuzzy": True},
+        ]})["results"]
+        self.assertIn("DEMOGRAPHIC_DOB_SELF", results[0]["reasons"])
+        self.assertEqual(results[0]["matched_dates"], ["dob_self"])
+        self.assertIn("DEMOGRAPHIC_DOB_SELF", results[1]["reasons"])
+        self.assertIn("DEMOGRAPHIC_OTHER", results[2]["reasons"])
+        for result in results[3:]:
+            self.assertIn("error", result)
+
+    #5: A range is logged as an interval in other_dates and read back as one
+    def test_storage(self):
+        dates = (datetime.date(1990, 5, 1), datetime.date(1990, 5, 31))
+        store = db.open_store("sqlite", sqlite_path=":memory:")
+        store.upsert(db.log_params("3500", "1905", "WEAK", ["DEMOGRAPHIC_DOB_SELF"], dates, None, None, None,
+                                   {"child": datetime.date(2015, 3, 4)}))
+        record = store.get("3500")
+        self.assertIsNone(record["dob_self"])
+        self.assertEqual(record["other_dates"], {"child": datetime.date(2015, 3, 4), "dob_self": dates})
+        store.close()
 
 if __name__ == "__main__":
     unittest.main()
@@ -1,57 +1,32 @@
 from datetime import datetime
 import os
+import sys
 
-def load_common_pins(file_name="common_pins.txt"):
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if ROOT_DIR not in sys.path:
+    sys.path.insert(0, ROOT_DIR)
+
+from mpin import db, demographics, engine, frequency
+from mpin.blocklist import Blocklist
+from mpin.bundle import load_pin_file
+from mpin.embedded import FRAGMENT_BLOCKLIST_PATH, FRAGMENT_LENGTH
+
+ENV_PATH = os.path.join(os.path.dirname(__file__), ".env")
+
+def load_common_pins(file_name="common-pins.txt"):
     file_path = os.path.join(os.path.dirname(__file__), file_name)
-    with open(file_path, 'r') as file:
-        return {line.strip() for line in file if len(line.strip()) == 6 and line.strip().isdigit()}
-
-def generate_demographic_patterns(date_str):
-    try:
-        dt = datetime.strptime(date_str, "%d-%m-%Y")
-    except ValueError:
-        return set()
-
-    day = dt.strftime("%d")
-    month = dt.strftime("%m")
-    year_full = dt.strftime("%Y")
-    year_short = dt.strftime("%y")
-
-    patterns = set()
-
-    patterns.add(day + month + year_short)
-    patterns.add(day + year_short + month)
-    patterns.add(month + day + year_short)
-    patterns.add(month + year_short + day)
-    patterns.add(year_short + day + month)
-    patterns.add(year_short + month + day)
-
-    patterns.add(day * 3)
-    patterns.add(month * 3)
-    patterns.add(year_short * 3)
-
-    patterns.add((day + month + year_short)[::-1])
-    patterns.add((day + year_short + month)[::-1])
-    patterns.add((month + day + year_short)[::-1])
-    patterns.add((month + year_short + day)[::-1])
-    patterns.add((year_short + day + month)[::-1])
-    patterns.add((year_short + month + day)[::-1])
-
-    patterns.add(year_full[2:] + month + day)
-    patterns.add(year_full[2:] + day + month)
-    patterns.add(month + year_full[2:] + day)
-    patterns.add(day + year_full[2:] + month)
-
-    patterns.add(month + day + year_full)
-    patterns.add(day + month + year_full)
-    patterns.add(month + day + year_short)
-    patterns.add(day + month + year_short)
-
-    patterns.add(day + month + year_short)
-    patterns.add(day + month + year_short[:2])
-    patterns.add(day + month + year_short[2:])
-
-    return patterns
+    return load_pin_file(file_path, 6)
+
+def load_blocklist(file_name="common-pins.txt", poll_interval=5.0):
+    file_path = os.path.join(os.path.dirname(__file__), file_name)
+    return Blocklist(file_path, 6, poll_interval)
+
+def load_fragment_blocklist(poll_interval=5.0):
+    # The 4-digit list searched for inside 6-digit PINs (CONTAINS_COMMON).
+    return Blocklist(FRAGMENT_BLOCKLIST_PATH, FRAGMENT_LENGTH, poll_interval)
+
+def generate_demographic_patterns(date):
+    return demographics.generate_demographic_patterns(date, 6)
 
 def get_valid_date(prompt):
     while True:
@@ -62,31 +37,25 @@ def get_valid_date(prompt):
         except ValueError:
             print("Invalid date format. Please enter date as DD-MM-YYYY.")
 
-def evaluate_strength_and_reasons(mpin, common_pins_set, dob_self, dob_spouse, anniversary):
-    reasons = []
-
-    if mpin in common_pins_set:
-        reasons.append("COMMONLY_USED")
-
-    if dob_self:
-        dob_self_patterns = generate_demographic_patterns(dob_self)
-        if mpin in dob_self_patterns:
-            reasons.append("DEMOGRAPHIC_DOB_SELF")
+def evaluate_strength_and_reasons(mpin, common_pins_set, dob_self, dob_spouse, anniversary, fragments=None,
+                                  profile=None, other_dates=None, fuzzy=False, tolerance_days=0):
+    return engine.evaluate_strength_and_reasons(mpin, common_pins_set, dob_self, dob_spouse, anniversary, 6, fragments,
+                                                profile, other_dates, fuzzy, tolerance_days)
 
-    if dob_spouse:
-        dob_spouse_patterns = generate_demographic_patterns(dob_spouse)
-        if mpin in dob_spouse_patterns:
-            reasons.append("DEMOGRAPHIC_DOB_SPOUSE")
+def log_to_database(user_id, mpin, strength, reasons, dob_self, dob_spouse, anniversary, blocklist_version=None,
+                    other_dates=None, fragment_blocklist_version=None):
+    db.log_evaluation(user_id, mpin, strength, reasons, dob_self, dob_spouse, anniversary,
+                      blocklist_version, env_path=ENV_PATH, other_dates=other_dates,
+                      fragment_blocklist_version=fragment_blocklist_version)
 
-    if anniversary:
-        anniversary_patterns = generate_demographic_patterns(anniversary)
-        if mpin in anniversary_patterns:
-            reasons.append("DEMOGRAPHIC_ANNIVERSARY")
+if __name__ == "__main__":
+    if len(sys.argv) > 1:
+        # The bulk audit needs NumPy; the interactive check does not.
+        from mpin import audit
 
-    strength = "STRONG" if not reasons else "WEAK"
-    return strength, reasons
+        audit.main(sys.argv[1:], 6, os.path.join(os.path.dirname(__file__), "common-pins.txt"))
+        exit()
 
-if __name__ == "__main__":
     common_pins = load_common_pins()
 
     mpin = input("Enter a 6-digit MPIN: ").strip()
@@ -102,3 +71,6 @@ if __name__ == "__main__":
 
     print("Strength:", strength)
     print("Reasons:", reasons)
+    if frequency.get_frequency_table(6) is not None:
+        rank = frequency.guess_rank(mpin, reasons, 6, common_pins)
+        print("Guess rank:", rank, "Score:", frequency.score(rank, 6))
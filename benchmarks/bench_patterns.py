@@ -0,0 +1,59 @@
+import datetime
+import os
+import sys
+import timeit
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if ROOT_DIR not in sys.path:
+    sys.path.insert(0, ROOT_DIR)
+
+from mpin.demographics import demographic_patterns
+
+
+def legacy_patterns(date_str, length):
+    # The string-based generators that shipped in final_4.py/final_6.py.
+    dt = datetime.datetime.strptime(date_str, "%d-%m-%Y")
+    day = dt.strftime("%d")
+    month = dt.strftime("%m")
+    year_full = dt.strftime("%Y")
+    year_short = dt.strftime("%y")
+
+    if length == 4:
+        return {
+            day + month, month + day, day + year_short, year_short + day,
+            month + year_short, year_short + month,
+            year_short * 2, day * 2, month * 2,
+            year_short + year_short[::-1],
+            (day + month)[::-1], (month + day)[::-1],
+            year_full[2:] + month, month + year_full[2:],
+        }
+    return {
+        day + month + year_short, day + year_short + month, month + day + year_short,
+        month + year_short + day, year_short + day + month, year_short + month + day,
+        day * 3, month * 3, year_short * 3,
+        (day + month + year_short)[::-1], (day + year_short + month)[::-1],
+        (month + day + year_short)[::-1], (month + year_short + day)[::-1],
+        (year_short + day + month)[::-1], (year_short + month + day)[::-1],
+        year_full[2:] + month + day, year_full[2:] + day + month,
+        month + year_full[2:] + day, day + year_full[2:] + month,
+        month + day + year_full, day + month + year_full,
+        month + day + year_short, day + month + year_short,
+        day + month + year_short, day + month + year_short[:2], day + month + year_short[2:],
+    }
+
+
+def per_date_us(func, args, number):
+    best = min(timeit.repeat(lambda: [func(*a) for a in args], number=number, repeat=5))
+    return best / (number * len(args)) * 1e6
+
+
+if __name__ == "__main__":
+    start = datetime.date(1950, 1, 1)
+    dates = [start + datetime.timedelta(days=offset) for offset in range(0, 27000, 27)]
+    date_strs = [date.strftime("%d-%m-%Y") for date in dates]
+
+    print(f"{'length':>6} {'legacy us/date':>15} {'compiled us/date':>17} {'speedup':>8}")
+    for length in (4, 6):
+        legacy = per_date_us(legacy_patterns, [(d, length) for d in date_strs], 20)
+        compiled = per_date_us(demographic_patterns, [(d, length) for d in dates], 20)
+        print(f"{length:>6} {legacy:>15.2f} {compiled:>17.2f} {legacy / compiled:>7.1f}x")
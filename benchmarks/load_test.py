@@ -0,0 +1,90 @@
+import argparse
+import asyncio
+import json
+import random
+import time
+
+
+def make_payloads(count, batch_size, seed=0):
+    rng = random.Random(seed)
+    payloads = []
+    for _ in range(count):
+        items = []
+        for _ in range(batch_size):
+            length = rng.choice((4, 6))
+            item = {"mpin": str(rng.randrange(10 ** length)).zfill(length),
+                    "dob_self": f"{rng.randint(1, 28):02d}-{rng.randint(1, 12):02d}-{rng.randint(1950, 2005)}"}
+            if rng.random() < 0.5:
+                item["anniversary"] = f"{rng.randint(1, 28):02d}-{rng.randint(1, 12):02d}-{rng.randint(1975, 2024)}"
+            items.append(item)
+        payloads.append(json.dumps(items[0] if batch_size == 1 else {"items": items}).encode("utf-8"))
+    return payloads
+
+
+async def _request(reader, writer, host, path, body):
+    writer.write(f"POST {path} HTTP/1.1\r\nHost: {host}\r\nContent-Type: application/json\r\n"
+                 f"Content-Length: {len(body)}\r\n\r\n".encode("latin-1") + body)
+    await writer.drain()
+    head = await reader.readuntil(b"\r\n\r\n")
+    status = int(head.split(b" ", 2)[1])
+    length = 0
+    for line in head.split(b"\r\n"):
+        if line.lower().startswith(b"content-length:"):
+            length = int(line.split(b":", 1)[1])
+    await reader.readexactly(length)
+    return status
+
+
+async def _client(host, port, path, payloads, deadline, latencies, errors):
+    reader, writer = await asyncio.open_connection(host, port)
+    try:
+        while payloads and time.perf_counter() < deadline:
+            body = payloads.pop()
+            start = time.perf_counter()
+            status = await _request(reader, writer, host, path, body)
+            latencies.append(time.perf_counter() - start)
+            if status != 200:
+                errors.append(status)
+    finally:
+        writer.close()
+
+
+def percentile(values, fraction):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))]
+
+
+async def run(host, port, concurrency, requests, duration, batch_size):
+    payloads = make_payloads(requests, batch_size)
+    path = "/evaluate" if batch_size == 1 else "/evaluate/batch"
+    latencies, errors = [], []
+    start = time.perf_counter()
+    deadline = start + duration if duration else float("inf")
+    await asyncio.gather(*(_client(host, port, path, payloads, deadline, latencies, errors)
+                           for _ in range(concurrency)))
+    elapsed = time.perf_counter() - start
+    return {
+        "requests": len(latencies),
+        "errors": len(errors),
+        "seconds": elapsed,
+        "rps": len(latencies) / elapsed,
+        "evaluations_per_second": len(latencies) * batch_size / elapsed,
+        "p50_ms": percentile(latencies, 0.50) * 1000,
+        "p99_ms": percentile(latencies, 0.99) * 1000,
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Load-test a running `python -m mpin.service`.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8080)
+    parser.add_argument("-c", "--concurrency", type=int, default=50, help="keep-alive connections")
+    parser.add_argument("-n", "--requests", type=int, default=20000)
+    parser.add_argument("-d", "--duration", type=float, default=0, help="stop after this many seconds (0: run all requests)")
+    parser.add_argument("-b", "--batch-size", type=int, default=1, help="items per request; >1 uses /evaluate/batch")
+    args = parser.parse_args()
+
+    result = asyncio.run(run(args.host, args.port, args.concurrency, args.requests, args.duration, args.batch_size))
+    print(f"requests {result['requests']}  errors {result['errors']}  in {result['seconds']:.2f}s")
+    print(f"RPS {result['rps']:.0f}  evaluations/s {result['evaluations_per_second']:.0f}")
+    print(f"latency p50 {result['p50_ms']:.2f} ms  p99 {result['p99_ms']:.2f} ms")
@@ -0,0 +1,229 @@
+import argparse
+import datetime
+import json
+import os
+import platform
+import random
+import subprocess
+import sys
+import tempfile
+import timeit
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+for path in (ROOT_DIR, os.path.join(ROOT_DIR, "4 digits pin"), os.path.join(ROOT_DIR, "6 digits pin")):
+    if path not in sys.path:
+        sys.path.insert(0, path)
+
+import final_4
+import final_6
+from mpin import db
+from mpin.batch import date_to_int, evaluate_batch
+from mpin.log_writer import LogWriter
+
+BASELINE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "baseline.json")
+FINAL = {4: final_4, 6: final_6}
+
+# Run in a fresh interpreter to time a cold start: imports, loading the
+# blocklist and the first evaluation (which loads the date index).
+COLD_PROBE = """
+import sys, time, json
+start = time.perf_counter()
+sys.path[:0] = [{root!r}, {directory!r}]
+import {module} as final
+common_pins = final.load_common_pins()
+final.evaluate_strength_and_reasons({mpin!r}, common_pins, "02-01-1998", "15-08-1970", "20-11-2001")
+print(json.dumps(time.perf_counter() - start))
+"""
+
+# Time importing a module in a fresh interpreter: the CLI's cold start
+# before any work, or test collection for test-cases.
+IMPORT_PROBE = """
+import importlib, sys, time, json
+sys.path[:0] = [{root!r}, {directory!r}]
+start = time.perf_counter()
+importlib.import_module({module!r})
+print(json.dumps(time.perf_counter() - start))
+"""
+
+
+def best_per_call(func, calls, repeat=7):
+    """Best-of-``repeat`` seconds per call of ``func`` run ``calls`` times."""
+    return min(timeit.repeat(func, number=calls, repeat=repeat)) / calls
+
+
+def random_inputs(length, count, seed=0):
+    rng = random.Random(seed)
+    start = datetime.date(1950, 1, 1)
+    dates = [start + datetime.timedelta(days=rng.randrange(27000)) for _ in range(count)]
+    mpins = [str(rng.randrange(10 ** length)).zfill(length) for _ in range(count)]
+    return mpins, dates
+
+
+def bench_load_common_pins(length):
+    return best_per_call(FINAL[length].load_common_pins, 20)
+
+
+def bench_generate_patterns(length):
+    _, dates = random_inputs(length, 500)
+    generate = FINAL[length].generate_demographic_patterns
+    return best_per_call(lambda: [generate(date) for date in dates], 5) / len(dates)
+
+
+def bench_evaluate_warm(length):
+    final = FINAL[length]
+    common_pins = final.load_common_pins()
+    mpins, dates = random_inputs(length, 2000)
+    final.evaluate_strength_and_reasons(mpins[0], common_pins, dates[0], None, None)
+    rows = list(zip(mpins, dates, reversed(dates)))
+    evaluate = final.evaluate_strength_and_reasons
+    return best_per_call(lambda: [evaluate(m, common_pins, d, None, a) for m, d, a in rows], 5) / len(rows)
+
+
+def _best_fresh_run(script, repeat=3):
+    timings = []
+    for _ in range(repeat):
+        output = subprocess.run([sys.executable, "-c", script], capture_output=True, text=True, check=True).stdout
+        timings.append(json.loads(output))
+    return min(timings)
+
+
+def bench_evaluate_cold(length):
+    final = FINAL[length]
+    return _best_fresh_run(COLD_PROBE.format(root=ROOT_DIR, directory=os.path.dirname(final.__file__),
+                                             module=final.__name__, mpin="0" * length))
+
+
+def bench_import(length, module):
+    return _best_fresh_run(IMPORT_PROBE.format(root=ROOT_DIR, directory=os.path.dirname(FINAL[length].__file__),
+                                               module=module))
+
+
+def bench_evaluate_batch(length):
+    common_pins = FINAL[length].load_common_pins()
+    mpins, dates = random_inputs(length, 100000)
+    pins = [int(mpin) for mpin in mpins]
+    dob = [date_to_int(date) for date in dates]
+    return best_per_call(lambda: evaluate_batch(pins, common_pins, length, dob, None, dob[::-1]), 3) / len(pins)
+
+
+def _log_rows(count):
+    mpins, dates = random_inputs(4, count)
+    return [db.log_params(f"{i % 5000:04d}", mpin, "WEAK", ["COMMONLY_USED"], date, None, None, 12345)
+            for i, (mpin, date) in enumerate(zip(mpins, dates))]
+
+
+def bench_upsert_single(backend):
+    """One upsert and commit per evaluation, as the pre-pool logger did."""
+    rows = _log_rows(2000)
+    with tempfile.TemporaryDirectory() as tmp:
+        store = db.open_store(backend, sqlite_path=os.path.join(tmp, "logs.db"))
+
+        def run():
+            for params in rows:
+                store.upsert(params)
+        seconds = best_per_call(run, 1, repeat=3) / len(rows)
+        store.close()
+    return seconds
+
+
+def bench_upsert_write_behind(backend):
+    """Submit through LogWriter into batched upserts, until flushed."""
+    rows = _log_rows(20000)
+    with tempfile.TemporaryDirectory() as tmp:
+        store = db.open_store(backend, sqlite_path=os.path.join(tmp, "logs.db"))
+
+        def run():
+            writer = LogWriter(store.upsert_many)
+            for params in rows:
+                writer.submit(params)
+            writer.flush()
+            writer.close()
+        seconds = best_per_call(run, 1, repeat=3) / len(rows)
+        store.close()
+    return seconds
+
+
+def benchmarks():
+    """Yield ``(name, unit, func)``; every result is a time, lower is better."""
+    for length in (4, 6):
+        yield f"load_common_pins_{length}", "ms", lambda length=length: bench_load_common_pins(length)
+        yield f"generate_demographic_patterns_{length}", "us", lambda length=length: bench_generate_patterns(length)
+        yield f"evaluate_{length}_warm", "us", lambda length=length: bench_evaluate_warm(length)
+        yield f"evaluate_{length}_cold", "ms", lambda length=length: bench_evaluate_cold(length)
+        yield f"import_final_{length}", "ms", lambda length=length: bench_import(length, f"final_{length}")
+        yield f"import_tests_{length}", "ms", lambda length=length: bench_import(length, "test-cases")
+        yield f"evaluate_batch_{length}", "us", lambda length=length: bench_evaluate_batch(length)
+    for backend in ("sqlite", "memory"):
+        yield f"upsert_single_{backend}", "us", lambda backend=backend: bench_upsert_single(backend)
+        yield f"upsert_write_behind_{backend}", "us", lambda backend=backend: bench_upsert_write_behind(backend)
+
+
+SCALE = {"s": 1, "ms": 1e3, "us": 1e6}
+
+
+def run(only=None):
+    results = {}
+    for name, unit, func in benchmarks():
+        if only and not any(pattern in name for pattern in only):
+            continue
+        value = func() * SCALE[unit]
+        results[name] = {"value": round(value, 4), "unit": unit}
+        print(f"{name:<36} {value:>12.3f} {unit}", file=sys.stderr)
+    return {
+        "meta": {
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "machine": platform.machine(),
+            "created": datetime.datetime.now().isoformat(timespec="seconds"),
+        },
+        "results": results,
+    }
+
+
+def compare(current, baseline, threshold):
+    """Print current vs baseline per benchmark; return the names that got slower by more than ``threshold``."""
+    regressions = []
+    print(f"{'benchmark':<36} {'baseline':>12} {'current':>12} {'change':>8}")
+    for name, result in current["results"].items():
+        base = baseline["results"].get(name)
+        if base is None or base["unit"] != result["unit"]:
+            print(f"{name:<36} {'-':>12} {result['value']:>12.3f} {'new':>8}")
+            continue
+        change = result["value"] / base["value"] - 1 if base["value"] else 0.0
+        flag = "  REGRESSION" if change > threshold else ""
+        if flag:
+            regressions.append(name)
+        print(f"{name:<36} {base['value']:>12.3f} {result['value']:>12.3f} {change:>+7.0%}{flag}")
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Time the MPIN engine, loaders and log write path.")
+    parser.add_argument("-o", "--output", help="write results as JSON to this file")
+    parser.add_argument("--only", nargs="+", help="run only benchmarks whose name contains one of these")
+    parser.add_argument("--compare", nargs="?", const=BASELINE_PATH, metavar="BASELINE",
+                        help=f"compare against a baseline file (default {os.path.relpath(BASELINE_PATH, ROOT_DIR)})")
+    parser.add_argument("--threshold", type=float, default=0.25,
+                        help="fractional slowdown that counts as a regression (default 0.25)")
+    parser.add_argument("--save-baseline", action="store_true", help="store these results as the new baseline")
+    args = parser.parse_args(argv)
+
+    current = run(args.only)
+    if args.output:
+        with open(args.output, "w") as file:
+            json.dump(current, file, indent=2)
+    if args.save_baseline:
+        with open(BASELINE_PATH, "w") as file:
+            json.dump(current, file, indent=2)
+            file.write("\n")
+    if args.compare:
+        with open(args.compare) as file:
+            regressions = compare(current, json.load(file), args.threshold)
+        if regressions:
+            print(f"{len(regressions)} regression(s): {', '.join(regressions)}")
+            return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
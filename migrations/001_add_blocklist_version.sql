@@ -0,0 +1,4 @@
+-- Record which common-PIN list each evaluation was checked against.
+-- The value is the CRC32 fingerprint of the loaded list (see mpin.blocklist).
+ALTER TABLE mpin_logs
+    ADD COLUMN blocklist_version INT UNSIGNED NULL;
@@ -0,0 +1,65 @@
+-- Move evaluation logs to a compact, indexable table.
+--   strength: TINYINT, 0 = STRONG, 1 = WEAK (mpin.reasons.STRENGTHS)
+--   reasons:  bitmask, bit i = mpin.reasons.REASONS[i]
+--   mpin:     CHAR(6) ASCII, stored as the digit string so leading zeros survive
+-- mpin_logs is kept as a read-only view with the old columns for existing
+-- consumers. Replay any pending journal (python -m mpin.journal) first:
+-- journaled rows still carry the old text columns.
+
+CREATE TABLE mpin_evaluations (
+    user_id VARCHAR(255) NOT NULL PRIMARY KEY,
+    mpin CHAR(6) CHARACTER SET ascii NOT NULL,
+    length TINYINT UNSIGNED NOT NULL,
+    strength TINYINT UNSIGNED NOT NULL,
+    reasons INT UNSIGNED NOT NULL DEFAULT 0,
+    dob_self DATE NULL,
+    dob_spouse DATE NULL,
+    anniversary DATE NULL,
+    blocklist_version INT UNSIGNED NULL,
+    timestamp TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
+    KEY idx_strength (strength),
+    KEY idx_reasons (reasons),
+    KEY idx_timestamp (timestamp)
+);
+
+INSERT INTO mpin_evaluations
+(user_id, mpin, length, strength, reasons, dob_self, dob_spouse, anniversary, blocklist_version, timestamp)
+SELECT
+    user_id,
+    mpin,
+    length,
+    IF(strength = 'WEAK', 1, 0),
+    (FIND_IN_SET('COMMONLY_USED', REPLACE(reason_json, ', ', ',')) > 0)
+        | (FIND_IN_SET('DEMOGRAPHIC_DOB_SELF', REPLACE(reason_json, ', ', ',')) > 0) << 1
+        | (FIND_IN_SET('DEMOGRAPHIC_DOB_SPOUSE', REPLACE(reason_json, ', ', ',')) > 0) << 2
+        | (FIND_IN_SET('DEMOGRAPHIC_ANNIVERSARY', REPLACE(reason_json, ', ', ',')) > 0) << 3,
+    dob_self,
+    dob_spouse,
+    anniversary,
+    blocklist_version,
+    timestamp
+FROM mpin_logs;
+
+RENAME TABLE mpin_logs TO mpin_logs_legacy;
+
+-- Same expression as mpin.storage.compat_view_sql("mysql").
+CREATE VIEW mpin_logs AS
+SELECT
+    user_id,
+    mpin,
+    length,
+    CASE strength WHEN 0 THEN 'STRONG' WHEN 1 THEN 'WEAK' END AS strength,
+    SUBSTR(CONCAT(
+        CASE WHEN reasons & 1 THEN ', COMMONLY_USED' ELSE '' END,
+        CASE WHEN reasons & 2 THEN ', DEMOGRAPHIC_DOB_SELF' ELSE '' END,
+        CASE WHEN reasons & 4 THEN ', DEMOGRAPHIC_DOB_SPOUSE' ELSE '' END,
+        CASE WHEN reasons & 8 THEN ', DEMOGRAPHIC_ANNIVERSARY' ELSE '' END
+    ), 3) AS reason_json,
+    dob_self,
+    dob_spouse,
+    anniversary,
+    timestamp,
+    blocklist_version
+FROM mpin_evaluations;
+
+-- Once nothing reads it any more: DROP TABLE mpin_logs_legacy;
@@ -0,0 +1,28 @@
+-- Reason bits 4-8 are the structural rules in mpin.structure
+-- (REPEATED_DIGITS, SEQUENTIAL, ARITHMETIC_PROGRESSION, PALINDROME,
+-- REPEATED_PATTERN). Rebuild the mpin_logs view so reason_json shows them.
+-- Generated by mpin.storage.compat_view_sql("mysql").
+
+CREATE OR REPLACE VIEW mpin_logs AS
+SELECT
+    user_id,
+    mpin,
+    length,
+    CASE strength WHEN 0 THEN 'STRONG' WHEN 1 THEN 'WEAK' END AS strength,
+    SUBSTR(CONCAT(
+        CASE WHEN reasons & 1 THEN ', COMMONLY_USED' ELSE '' END,
+        CASE WHEN reasons & 2 THEN ', DEMOGRAPHIC_DOB_SELF' ELSE '' END,
+        CASE WHEN reasons & 4 THEN ', DEMOGRAPHIC_DOB_SPOUSE' ELSE '' END,
+        CASE WHEN reasons & 8 THEN ', DEMOGRAPHIC_ANNIVERSARY' ELSE '' END,
+        CASE WHEN reasons & 16 THEN ', REPEATED_DIGITS' ELSE '' END,
+        CASE WHEN reasons & 32 THEN ', SEQUENTIAL' ELSE '' END,
+        CASE WHEN reasons & 64 THEN ', ARITHMETIC_PROGRESSION' ELSE '' END,
+        CASE WHEN reasons & 128 THEN ', PALINDROME' ELSE '' END,
+        CASE WHEN reasons & 256 THEN ', REPEATED_PATTERN' ELSE '' END
+    ), 3) AS reason_json,
+    dob_self,
+    dob_spouse,
+    anniversary,
+    timestamp,
+    blocklist_version
+FROM mpin_evaluations;
@@ -0,0 +1,30 @@
+-- Reason bits 10 and 11 are NEAR_COMMON and NEAR_DEMOGRAPHIC (mpin.near).
+-- Rebuild the mpin_logs view so reason_json shows them.
+-- Generated by mpin.storage.compat_view_sql("mysql").
+
+CREATE OR REPLACE VIEW mpin_logs AS
+SELECT
+    user_id,
+    mpin,
+    length,
+    CASE strength WHEN 0 THEN 'STRONG' WHEN 1 THEN 'WEAK' END AS strength,
+    SUBSTR(CONCAT(
+        CASE WHEN reasons & 1 THEN ', COMMONLY_USED' ELSE '' END,
+        CASE WHEN reasons & 2 THEN ', DEMOGRAPHIC_DOB_SELF' ELSE '' END,
+        CASE WHEN reasons & 4 THEN ', DEMOGRAPHIC_DOB_SPOUSE' ELSE '' END,
+        CASE WHEN reasons & 8 THEN ', DEMOGRAPHIC_ANNIVERSARY' ELSE '' END,
+        CASE WHEN reasons & 16 THEN ', REPEATED_DIGITS' ELSE '' END,
+        CASE WHEN reasons & 32 THEN ', SEQUENTIAL' ELSE '' END,
+        CASE WHEN reasons & 64 THEN ', ARITHMETIC_PROGRESSION' ELSE '' END,
+        CASE WHEN reasons & 128 THEN ', PALINDROME' ELSE '' END,
+        CASE WHEN reasons & 256 THEN ', REPEATED_PATTERN' ELSE '' END,
+        CASE WHEN reasons & 512 THEN ', KEYPAD_PATTERN' ELSE '' END,
+        CASE WHEN reasons & 1024 THEN ', NEAR_COMMON' ELSE '' END,
+        CASE WHEN reasons & 2048 THEN ', NEAR_DEMOGRAPHIC' ELSE '' END
+    ), 3) AS reason_json,
+    dob_self,
+    dob_spouse,
+    anniversary,
+    timestamp,
+    blocklist_version
+FROM mpin_evaluations;
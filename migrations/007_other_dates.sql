@@ -0,0 +1,39 @@
+-- Users can give any number of further labelled dates (children's and
+-- parents' birthdays...). They are stored as a JSON object of label to
+-- YYYY-MM-DD date in other_dates, and reason bit 14, DEMOGRAPHIC_OTHER,
+-- flags a PIN made from one of them. Replay any pending journal
+-- (python -m mpin.journal) first: journaled rows lack the new column.
+
+ALTER TABLE mpin_evaluations ADD COLUMN other_dates JSON NULL;
+
+-- Generated by mpin.storage.compat_view_sql("mysql").
+CREATE OR REPLACE VIEW mpin_logs AS
+SELECT
+    user_id,
+    mpin,
+    length,
+    CASE strength WHEN 0 THEN 'STRONG' WHEN 1 THEN 'WEAK' END AS strength,
+    SUBSTR(CONCAT(
+        CASE WHEN reasons & 1 THEN ', COMMONLY_USED' ELSE '' END,
+        CASE WHEN reasons & 2 THEN ', DEMOGRAPHIC_DOB_SELF' ELSE '' END,
+        CASE WHEN reasons & 4 THEN ', DEMOGRAPHIC_DOB_SPOUSE' ELSE '' END,
+        CASE WHEN reasons & 8 THEN ', DEMOGRAPHIC_ANNIVERSARY' ELSE '' END,
+        CASE WHEN reasons & 16 THEN ', REPEATED_DIGITS' ELSE '' END,
+        CASE WHEN reasons & 32 THEN ', SEQUENTIAL' ELSE '' END,
+        CASE WHEN reasons & 64 THEN ', ARITHMETIC_PROGRESSION' ELSE '' END,
+        CASE WHEN reasons & 128 THEN ', PALINDROME' ELSE '' END,
+        CASE WHEN reasons & 256 THEN ', REPEATED_PATTERN' ELSE '' END,
+        CASE WHEN reasons & 512 THEN ', KEYPAD_PATTERN' ELSE '' END,
+        CASE WHEN reasons & 1024 THEN ', NEAR_COMMON' ELSE '' END,
+        CASE WHEN reasons & 2048 THEN ', NEAR_DEMOGRAPHIC' ELSE '' END,
+        CASE WHEN reasons & 4096 THEN ', CONTAINS_COMMON' ELSE '' END,
+        CASE WHEN reasons & 8192 THEN ', CONTAINS_DEMOGRAPHIC' ELSE '' END,
+        CASE WHEN reasons & 16384 THEN ', DEMOGRAPHIC_OTHER' ELSE '' END
+    ), 3) AS reason_json,
+    dob_self,
+    dob_spouse,
+    anniversary,
+    timestamp,
+    blocklist_version,
+    other_dates
+FROM mpin_evaluations;
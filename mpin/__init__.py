@@ -0,0 +1 @@
+"""Shared MPIN evaluation engine used by the 4- and 6-digit checkers."""
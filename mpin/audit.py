@@ -0,0 +1,186 @@
+import argparse
+import csv
+import datetime
+import json
+import os
+import sys
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+
+from mpin import embedded, reasons
+from mpin.batch import date_to_int, evaluate_batch
+from mpin.bundle import load_pin_file
+from mpin.demographics import parse_date
+
+DATE_FIELDS = ("dob_self", "dob_spouse", "anniversary")
+OUTPUT_FIELDS = ("user_id", "mpin", "strength", "reasons", "blocklist_version", "fragment_blocklist_version", "error")
+
+_worker_state = {}
+
+
+class InvalidRecord(dict):
+    """An input line that could not be read as a record; it holds the error row to output for it."""
+
+
+def read_records(stream, fmt):
+    """Yield one dict per input record from a CSV (with header) or JSONL stream.
+
+    A JSONL line that is not valid JSON, or not a JSON object, is yielded
+    as an ``InvalidRecord`` naming its line number, so one bad line does
+    not abort the audit.
+    """
+    if fmt == "csv":
+        yield from csv.DictReader(stream)
+    else:
+        for number, line in enumerate(stream, 1):
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                record = json.loads(line)
+            except ValueError as e:
+                yield InvalidRecord(user_id=None, mpin=None, error=f"line {number}: invalid JSON ({e})")
+                continue
+            if isinstance(record, dict):
+                yield record
+            else:
+                yield InvalidRecord(user_id=None, mpin=None, error=f"line {number}: not a JSON object")
+
+
+def chunked(records, size):
+    chunk = []
+    for record in records:
+        chunk.append(record)
+        if len(chunk) == size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+def _date_value(value):
+    """Accept DD-MM-YYYY (the CLI format) or YYYY-MM-DD (the mpin_logs format)."""
+    if not value:
+        return 0
+    date = parse_date(value)
+    if date is None:
+        try:
+            date = datetime.date.fromisoformat(value)
+        except (TypeError, ValueError):
+            return 0
+    return date_to_int(date)
+
+
+def _init_worker(length, blocklist_path):
+    _worker_state["length"] = length
+    _worker_state["common_pins"] = load_pin_file(blocklist_path, length)
+    _worker_state["fragments"] = embedded.default_fragments() if length in embedded.LENGTHS else None
+
+
+def evaluate_chunk(chunk):
+    """Evaluate a list of input records in one vectorized call; runs inside a pool worker."""
+    length = _worker_state["length"]
+    results = [None] * len(chunk)
+    rows = []
+    for i, record in enumerate(chunk):
+        if isinstance(record, InvalidRecord):
+            results[i] = dict(record)
+            continue
+        mpin = str(record.get("mpin") or "").strip()
+        if len(mpin) == length and mpin.isascii() and mpin.isdigit():
+            rows.append(i)
+        else:
+            results[i] = {"user_id": record.get("user_id"), "mpin": mpin,
+                          "error": f"MPIN must be exactly {length} digits."}
+
+    if rows:
+        pins = [int(str(chunk[i]["mpin"]).strip()) for i in rows]
+        dates = [[_date_value(chunk[i].get(field)) for i in rows] for field in DATE_FIELDS]
+        fragments = _worker_state["fragments"]
+        strength, mask = evaluate_batch(pins, _worker_state["common_pins"], length, *dates, fragments=fragments)
+        for j, i in enumerate(rows):
+            results[i] = {
+                "user_id": chunk[i].get("user_id"),
+                "mpin": str(pins[j]).zfill(length),
+                "strength": reasons.STRENGTHS[strength[j]],
+                "reasons": reasons.mask_to_reasons(int(mask[j])),
+                "blocklist_version": _worker_state["common_pins"].fingerprint,
+            }
+            if fragments is not None:
+                results[i]["fragment_blocklist_version"] = fragments.fingerprint
+    return results
+
+
+def audit(records, length, blocklist_path, workers=None, chunk_size=10000):
+    """Yield evaluation results for ``records`` in input order.
+
+    Records are evaluated in chunks of ``chunk_size`` across ``workers``
+    processes, with at most two chunks per worker in flight, so memory
+    stays bounded however long the input is. ``workers=0`` evaluates in
+    the calling process.
+    """
+    chunks = chunked(records, chunk_size)
+    if workers == 0:
+        _init_worker(length, blocklist_path)
+        for chunk in chunks:
+            yield from evaluate_chunk(chunk)
+        return
+
+    workers = workers or os.cpu_count() or 1
+    with ProcessPoolExecutor(workers, initializer=_init_worker, initargs=(length, blocklist_path)) as pool:
+        pending = deque()
+        for chunk in chunks:
+            pending.append(pool.submit(evaluate_chunk, chunk))
+            if len(pending) >= workers * 2:
+                yield from pending.popleft().result()
+        while pending:
+            yield from pending.popleft().result()
+
+
+def write_results(results, stream, fmt):
+    if fmt == "csv":
+        writer = csv.DictWriter(stream, fieldnames=OUTPUT_FIELDS)
+        writer.writeheader()
+        for result in results:
+            row = dict(result)
+            if "reasons" in row:
+                row["reasons"] = ', '.join(row["reasons"])
+            writer.writerow(row)
+    else:
+        for result in results:
+            stream.write(json.dumps(result) + "\n")
+
+
+def _guess_format(path, default="jsonl"):
+    if path and path != "-":
+        extension = os.path.splitext(path)[1].lower()
+        if extension == ".csv":
+            return "csv"
+        if extension in (".jsonl", ".json", ".ndjson"):
+            return "jsonl"
+    return default
+
+
+def main(argv, length, blocklist_path):
+    parser = argparse.ArgumentParser(description=f"Bulk-audit {length}-digit MPINs from a CSV or JSONL file.")
+    parser.add_argument("input", help="CSV/JSONL file with user_id, mpin, dob_self, dob_spouse, anniversary ('-' for stdin)")
+    parser.add_argument("-o", "--output", default="-", help="output file ('-' for stdout)")
+    parser.add_argument("--input-format", choices=("csv", "jsonl"))
+    parser.add_argument("--output-format", choices=("csv", "jsonl"))
+    parser.add_argument("--workers", type=int, default=None, help="worker processes (default: CPU count, 0: no pool)")
+    parser.add_argument("--chunk-size", type=int, default=10000)
+    args = parser.parse_args(argv)
+
+    input_format = args.input_format or _guess_format(args.input)
+    output_format = args.output_format or _guess_format(args.output)
+
+    source = sys.stdin if args.input == "-" else open(args.input, 'r', newline='')
+    target = sys.stdout if args.output == "-" else open(args.output, 'w', newline='')
+    try:
+        records = read_records(source, input_format)
+        write_results(audit(records, length, blocklist_path, args.workers, args.chunk_size), target, output_format)
+    finally:
+        if source is not sys.stdin:
+            source.close()
+        if target is not sys.stdout:
+            target.close()
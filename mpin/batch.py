@@ -0,0 +1,135 @@
+import numpy as np
+
+from mpin import reasons
+from mpin.demographics import compiled_templates
+from mpin.embedded import FRAGMENT_LENGTH, LENGTHS, default_fragments, embedded_index
+from mpin.near import near_index
+from mpin.pin_index import PinIndex
+from mpin.structure import structure_table
+
+_DAYS_IN_MONTH = np.array([0, 31, 28, 31, 30, 31, 30, 31, 31, 30, 31, 30, 31], dtype=np.int64)
+
+
+def date_to_int(date):
+    """Encode a date as the YYYYMMDD integer used by the batch API (0 for no date)."""
+    if date is None:
+        return 0
+    return date.year * 10000 + date.month * 100 + date.day
+
+
+def _split_dates(dates):
+    dates = np.asarray(dates, dtype=np.int64)
+    year = dates // 10000
+    month = dates // 100 % 100
+    day = dates % 100
+    leap = (year % 4 == 0) & ((year % 100 != 0) | (year % 400 == 0))
+    month_days = _DAYS_IN_MONTH[np.clip(month, 0, 12)] + ((month == 2) & leap)
+    valid = (year >= 1) & (year <= 9999) & (month >= 1) & (month <= 12) & (day >= 1) & (day <= month_days)
+    return day, month, year, valid
+
+
+def _digits(values, length):
+    return [(values // 10 ** (length - 1 - i) % 10).astype(np.uint8) for i in range(length)]
+
+
+def _date_fields(dates):
+    """Split YYYYMMDD integers into uint8 digit columns per template field, plus a validity mask."""
+    day, month, year, valid = _split_dates(dates)
+    yyyy = _digits(year % 10000, 4)
+    fields = {"DD": _digits(day, 2), "MM": _digits(month, 2), "YY": yyyy[2:], "YYYY": yyyy}
+    return fields, valid
+
+
+def _template_digits(fields, length):
+    """Yield each compiled template's pattern per date as ``length`` uint8 digit columns."""
+    for parts in compiled_templates(length):
+        digits = []
+        for field, reverse in parts:
+            digits.extend(fields[field][::-1] if reverse else fields[field])
+        yield digits
+
+
+def _demographic_hits(a, fields, length):
+    """Return bool arrays ``(exact, near)`` for PIN digit columns ``a`` against their dates' patterns.
+
+    ``exact`` is whether the PIN is a pattern of its date; ``near`` whether
+    it is one edit away from one: exactly one digit differs, or exactly two
+    neighbouring digits differ and are each other's swap.
+    """
+    exact = np.zeros(a[0].shape, dtype=bool)
+    near = np.zeros(a[0].shape, dtype=bool)
+    for b in _template_digits(fields, length):
+        differ = [x != y for x, y in zip(a, b)]
+        count = sum(d.view(np.uint8) for d in differ)
+        swapped = np.zeros(a[0].shape, dtype=bool)
+        for i in range(length - 1):
+            swapped |= differ[i] & (a[i] == b[i + 1]) & (a[i + 1] == b[i])
+        exact |= count == 0
+        near |= (count == 1) | ((count == 2) & swapped)
+    return exact, near
+
+
+def _fragment_hits(windows, fields):
+    """Return whether any of the 4-digit ``windows`` (uint16 columns) is a 4-digit pattern of its date."""
+    hits = np.zeros(windows[0].shape, dtype=bool)
+    for b in _template_digits(fields, FRAGMENT_LENGTH):
+        value = ((b[0] * np.uint16(10) + b[1]) * np.uint16(10) + b[2]) * np.uint16(10) + b[3]
+        for window in windows:
+            hits |= window == value
+    return hits
+
+
+def evaluate_batch(pins, common_pins, length, dob_self=None, dob_spouse=None, anniversary=None, fragments=None):
+    """Vectorized evaluate_strength_and_reasons over columnar inputs.
+
+    ``pins`` is an integer array of PIN values and each date column is an
+    integer array of YYYYMMDD values with 0 for a missing date (or ``None``
+    to skip the column). ``fragments`` is the 4-digit blocklist searched
+    for in 6-digit PINs, as in evaluate_strength_and_reasons. Returns ``(strength, mask)``: a uint8 array of
+    ``reasons.STRONG``/``reasons.WEAK`` (ADVISORY reasons alone leave a PIN
+    STRONG) and a uint32 array of reason bits.
+    Raises ``ValueError`` if a PIN is outside ``0 .. 10**length - 1``.
+    """
+    pins = np.asarray(pins, dtype=np.int64)
+    out_of_range = (pins < 0) | (pins >= 10 ** length)
+    if out_of_range.any():
+        raise ValueError(f"PIN {int(pins[out_of_range][0])} is not a {length}-digit PIN")
+    if not isinstance(common_pins, PinIndex):
+        common_pins = PinIndex.from_pins(common_pins, length)
+
+    mask = np.where(common_pins.contains_many(pins), reasons.COMMONLY_USED, 0).astype(np.uint32)
+    mask |= np.frombuffer(structure_table(length), dtype=np.uint32)[pins]
+    mask[near_index(common_pins).contains_many(pins)] |= reasons.NEAR_COMMON
+
+    digits = _digits(pins, length)
+    if length in LENGTHS:
+        windows = [((digits[i] * np.uint16(10) + digits[i + 1]) * np.uint16(10) + digits[i + 2]) * np.uint16(10)
+                   + digits[i + 3] for i in range(length - FRAGMENT_LENGTH + 1)]
+    near = np.zeros(pins.shape, dtype=bool)
+    contained = np.zeros(pins.shape, dtype=bool)
+    for dates, bit in ((dob_self, reasons.DEMOGRAPHIC_DOB_SELF),
+                       (dob_spouse, reasons.DEMOGRAPHIC_DOB_SPOUSE),
+                       (anniversary, reasons.DEMOGRAPHIC_ANNIVERSARY)):
+        if dates is None:
+            continue
+        fields, valid = _date_fields(dates)
+        exact, near_date = _demographic_hits(digits, fields, length)
+        mask[exact & valid] |= bit
+        near |= near_date & valid
+        if length in LENGTHS:
+            contained |= _fragment_hits(windows, fields) & valid
+    demographic = reasons.DEMOGRAPHIC_DOB_SELF | reasons.DEMOGRAPHIC_DOB_SPOUSE | reasons.DEMOGRAPHIC_ANNIVERSARY
+    mask[near & (mask & demographic == 0)] |= reasons.NEAR_DEMOGRAPHIC
+
+    if length in LENGTHS:
+        if fragments is None:
+            fragments = default_fragments()
+        elif not isinstance(fragments, PinIndex):
+            fragments = PinIndex.from_pins(fragments, FRAGMENT_LENGTH)
+        embedded = embedded_index(fragments, length).contains_many(pins)
+        mask[embedded & (mask & reasons.COMMONLY_USED == 0)] |= reasons.CONTAINS_COMMON
+        mask[contained & (mask & demographic == 0)] |= reasons.CONTAINS_DEMOGRAPHIC
+
+    weak = mask & np.uint32(~reasons.ADVISORY & 0xFFFFFFFF) != 0
+    strength = np.where(weak, reasons.WEAK, reasons.STRONG).astype(np.uint8)
+    return strength, mask
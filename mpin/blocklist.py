@@ -0,0 +1,101 @@
+import logging
+import os
+import threading
+from collections import namedtuple
+
+from mpin.bundle import load_pin_file
+from mpin.near import near_index
+
+logger = logging.getLogger(__name__)
+
+# ``version`` is the PinIndex fingerprint, so every process that loaded
+# the same list reports the same version.
+Snapshot = namedtuple("Snapshot", "version index")
+
+
+class Blocklist:
+    """A common-PIN file whose index is reloaded in the background when the file changes.
+
+    The file is polled every ``poll_interval`` seconds (mtime, inode and
+    size). A changed file is parsed into a brand-new PinIndex off to the
+    side and validated; only then is the snapshot reference swapped, so an
+    evaluation that took a snapshot keeps a complete list for its whole
+    run. A new list is rejected if it is empty, or if it drops more than
+    ``max_shrink`` of the current list (typically a half-copied file).
+    """
+
+    def __init__(self, file_path, length, poll_interval=5.0, max_shrink=0.5):
+        self.file_path = file_path
+        self.length = length
+        self.poll_interval = poll_interval
+        self.max_shrink = max_shrink
+        self._stat = None
+        self._stop = threading.Event()
+        self._thread = None
+        index, self._stat = self._read()
+        self._snapshot = Snapshot(index.fingerprint, index)
+        self._size = len(index)
+
+    def snapshot(self):
+        """Return the current ``(version, index)``; use the same snapshot for a whole evaluation."""
+        return self._snapshot
+
+    @property
+    def version(self):
+        return self._snapshot.version
+
+    def __contains__(self, pin):
+        return pin in self._snapshot.index
+
+    def _file_stat(self):
+        stat = os.stat(self.file_path)
+        return stat.st_mtime_ns, stat.st_ino, stat.st_size
+
+    def _read(self):
+        before = self._file_stat()
+        index = load_pin_file(self.file_path, self.length)
+        if self._file_stat() != before:
+            raise ValueError("file changed while it was being read")
+        # Build the NEAR_COMMON neighbourhood here, off the request path.
+        near_index(index)
+        return index, before
+
+    def check(self):
+        """Reload the file if it changed since the last load; return whether a new version was swapped in."""
+        try:
+            if self._file_stat() == self._stat:
+                return False
+            index, stat = self._read()
+        except (OSError, ValueError) as e:
+            logger.warning("Not reloading %s yet: %s", self.file_path, e)
+            return False
+
+        size = len(index)
+        if size == 0 or size < self._size * (1 - self.max_shrink):
+            logger.error("Rejected %s: %d PINs (currently %d)", self.file_path, size, self._size)
+            self._stat = stat
+            return False
+
+        self._stat = stat
+        self._size = size
+        if index.fingerprint == self._snapshot.version:
+            return False
+        self._snapshot = Snapshot(index.fingerprint, index)
+        logger.info("Loaded %s version %d with %d PINs", self.file_path, index.fingerprint, size)
+        return True
+
+    def _run(self):
+        while not self._stop.wait(self.poll_interval):
+            self.check()
+
+    def start(self):
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name="mpin-blocklist-watcher", daemon=True)
+            self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
@@ -0,0 +1,198 @@
+import datetime
+import json
+import logging
+import mmap
+import os
+import struct
+import sys
+import zlib
+
+from mpin import reasons
+from mpin.date_index import CACHE_DIR, DateIndex, get_date_index
+from mpin.demographics import template_signature
+from mpin.embedded import FRAGMENT_LENGTH, LENGTHS, _embedded_indexes, build_embedded_index
+from mpin.near import _near_indexes, build_near_index
+from mpin.pin_index import PinIndex
+from mpin.structure import rules_signature, structure_table
+
+logger = logging.getLogger(__name__)
+
+BUNDLE_PATH = os.environ.get("MPIN_BUNDLE", os.path.join(CACHE_DIR, "bundle.bin"))
+
+FORMAT_VERSION = 1
+_MAGIC = b"MPAB"
+_HEADER = struct.Struct("<4sHHI")
+_ALIGN = 8
+
+
+def _file_crc(file_path):
+    with open(file_path, "rb") as file:
+        return zlib.crc32(file.read())
+
+
+def build_bundle(file_path, blocklist_paths, lengths=(4, 6)):
+    """Compile everything a worker would otherwise build at startup into one file.
+
+    Per length: the blocklist bitmap and its NEAR_COMMON neighbourhood, the
+    structural rule table and the demographic date index; plus the
+    CONTAINS_COMMON table of the 6-digit keyspace. A JSON header names the
+    sections and records what they were built from (including a signature
+    of the structural and keypad rule code), so a stale bundle is detected
+    on load.
+    """
+    sections = {}
+    meta = {
+        "created": datetime.datetime.now().isoformat(timespec="seconds"),
+        "reasons": list(reasons.REASONS),
+        "rules": rules_signature(),
+        "templates": {},
+        "blocklists": {},
+        "dates": {},
+    }
+    indexes = {}
+    for length in lengths:
+        index = indexes[length] = PinIndex.from_file(blocklist_paths[length], length)
+        meta["blocklists"][length] = _file_crc(blocklist_paths[length])
+        sections[f"common-{length}"] = index.bits
+        sections[f"near-{length}"] = build_near_index(index).bits
+        sections[f"structure-{length}"] = structure_table(length)
+        dates = get_date_index(length)
+        meta["templates"][length] = template_signature(length)
+        meta["dates"][length] = [dates.start.toordinal(), dates.end.toordinal(), dates.width]
+        sections[f"dates-{length}-patterns"] = dates.date_patterns
+        sections[f"dates-{length}-offsets"] = dates.pattern_offsets
+        sections[f"dates-{length}-dates"] = dates.pattern_dates
+    if FRAGMENT_LENGTH in indexes:
+        for length in LENGTHS:
+            if length in indexes:
+                sections[f"embedded-{length}"] = build_embedded_index(indexes[FRAGMENT_LENGTH], length).bits
+
+    # Lay the sections out after the header, each aligned for uint32 reads.
+    blobs = {name: bytes(data) for name, data in sections.items()}
+    meta["sections"] = {}
+    header_size = _HEADER.size + 4096
+    while True:
+        offset = header_size
+        for name, blob in blobs.items():
+            meta["sections"][name] = [offset, len(blob)]
+            offset += -(-len(blob) // _ALIGN) * _ALIGN
+        encoded = json.dumps(meta).encode()
+        if _HEADER.size + len(encoded) <= header_size:
+            break
+        header_size = -(-(_HEADER.size + len(encoded)) // _ALIGN) * _ALIGN
+
+    os.makedirs(os.path.dirname(os.path.abspath(file_path)), exist_ok=True)
+    tmp_path = file_path + ".tmp"
+    with open(tmp_path, "wb") as file:
+        file.write(_HEADER.pack(_MAGIC, FORMAT_VERSION, 0, len(encoded)))
+        file.write(encoded)
+        for name, blob in blobs.items():
+            file.seek(meta["sections"][name][0])
+            file.write(blob)
+        file.truncate(offset)
+    os.replace(tmp_path, file_path)
+    return meta
+
+
+class Bundle:
+    """A compiled bundle mapped read-only.
+
+    The tables are memoryviews straight into the mapping, so no process
+    copies them: every worker that maps the same file shares its pages
+    through the OS page cache. Raises ``ValueError`` if the file is not a
+    bundle or was built by code with different reasons, templates or
+    structural rules.
+    """
+
+    def __init__(self, file_path):
+        self.file_path = file_path
+        with open(file_path, "rb") as file:
+            self._mapping = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+        try:
+            magic, version, _, meta_size = _HEADER.unpack_from(self._mapping)
+            if magic != _MAGIC or version != FORMAT_VERSION:
+                raise ValueError(f"Not an MPIN bundle: {file_path}")
+            self.meta = json.loads(self._mapping[_HEADER.size:_HEADER.size + meta_size])
+            if self.meta["reasons"] != list(reasons.REASONS) or self.meta.get("rules") != rules_signature() or any(
+                    signature != template_signature(int(length)) for length, signature in self.meta["templates"].items()):
+                raise ValueError(f"Bundle was built by a different version of the rules: {file_path}")
+        except (struct.error, ValueError, KeyError):
+            self._mapping.close()
+            raise
+        self._view = memoryview(self._mapping)
+        self._indexes = {}
+
+    def section(self, name, fmt="B"):
+        offset, size = self.meta["sections"][name]
+        return self._view[offset:offset + size].cast(fmt)
+
+    def has(self, name):
+        return name in self.meta["sections"]
+
+    def blocklist(self, file_path, length):
+        """Return the bundled PinIndex for ``length`` if ``file_path`` still has the content it was built from.
+
+        The index's NEAR_COMMON and CONTAINS_COMMON tables are registered
+        with it, so they are not rebuilt either.
+        """
+        crc = self.meta["blocklists"].get(str(length))
+        if crc is None or _file_crc(file_path) != crc:
+            return None
+        index = self._indexes.get(length)
+        if index is None:
+            index = self._indexes[length] = PinIndex(length, self.section(f"common-{length}"))
+            _near_indexes[index] = PinIndex(length, self.section(f"near-{length}"))
+            if length == FRAGMENT_LENGTH:
+                _embedded_indexes[index] = {n: PinIndex(n, self.section(f"embedded-{n}"))
+                                            for n in LENGTHS if self.has(f"embedded-{n}")}
+        return index
+
+    def structure_table(self, length):
+        name = f"structure-{length}"
+        return self.section(name, "I") if self.has(name) else None
+
+    def date_index(self, length):
+        if str(length) not in self.meta["dates"]:
+            return None
+        start, end, width = self.meta["dates"][str(length)]
+        return DateIndex(length, datetime.date.fromordinal(start), datetime.date.fromordinal(end), width,
+                         self.section(f"dates-{length}-patterns", "I"),
+                         self.section(f"dates-{length}-offsets", "I"),
+                         self.section(f"dates-{length}-dates", "I"))
+
+
+_bundle = None
+_loaded = False
+
+
+def get_bundle():
+    """Map the bundle at BUNDLE_PATH on first use; ``None`` if there is none (or it is stale)."""
+    global _bundle, _loaded
+    if not _loaded:
+        _loaded = True
+        try:
+            _bundle = Bundle(BUNDLE_PATH)
+        except FileNotFoundError:
+            pass
+        except (OSError, ValueError) as e:
+            logger.warning("Ignoring bundle %s: %s", BUNDLE_PATH, e)
+    return _bundle
+
+
+def load_pin_file(file_path, length):
+    """PinIndex.from_file, served from the bundle when it was built from this very file content."""
+    bundle = get_bundle()
+    index = bundle.blocklist(file_path, length) if bundle is not None else None
+    return index if index is not None else PinIndex.from_file(file_path, length)
+
+
+if __name__ == "__main__":
+    if len(sys.argv) in (2, 3) and sys.argv[1] == "build":
+        from mpin.service import BLOCKLIST_PATHS
+
+        output = sys.argv[2] if len(sys.argv) == 3 else BUNDLE_PATH
+        meta = build_bundle(output, BLOCKLIST_PATHS)
+        size = max(offset + length for offset, length in meta["sections"].values())
+        print(f"{len(meta['sections'])} sections, {size / 1e6:.1f} MB -> {output}")
+    else:
+        print("Usage: python -m mpin.bundle build [output]")
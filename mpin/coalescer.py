@@ -0,0 +1,122 @@
+import asyncio
+import collections
+import logging
+import time
+
+logger = logging.getLogger(__name__)
+
+
+class BatchMetrics:
+    """Batch-size distribution and queueing-delay statistics for a Coalescer.
+
+    Batch sizes are counted in power-of-two buckets (1, 2, 3-4, 5-8, ...).
+    Queueing delay -- the time from ``submit`` until the item's batch
+    starts running -- is kept for the last ``window`` items, from which
+    ``snapshot`` reports percentiles.
+    """
+
+    def __init__(self, window=10000):
+        self.batches = 0
+        self.items = 0
+        self.size_buckets = collections.Counter()
+        self.delays = collections.deque(maxlen=window)
+
+    def record(self, size, delays):
+        self.batches += 1
+        self.items += size
+        self.size_buckets[1 << (size - 1).bit_length()] += 1
+        self.delays.extend(delays)
+
+    def snapshot(self):
+        delays = sorted(self.delays)
+
+        def percentile(fraction):
+            return delays[min(len(delays) - 1, int(fraction * len(delays)))] * 1000 if delays else 0.0
+
+        return {
+            "batches": self.batches,
+            "items": self.items,
+            "mean_batch_size": self.items / self.batches if self.batches else 0.0,
+            "batch_size_buckets": {f"<={size}": count for size, count in sorted(self.size_buckets.items())},
+            "queue_delay_ms": {"p50": percentile(0.50), "p90": percentile(0.90),
+                               "p99": percentile(0.99), "max": delays[-1] * 1000 if delays else 0.0},
+        }
+
+
+class Coalescer:
+    """Gathers concurrent ``submit`` calls into batches for ``run_batch``.
+
+    The first pending item opens a batch; it is closed after ``max_wait``
+    seconds or as soon as it holds ``max_batch_size`` items, then
+    ``run_batch(items)`` is called once and must return one result per
+    item, in order. Each caller's ``submit`` resolves to its own result; a
+    result that is an exception instance is raised to that caller alone,
+    while an exception from ``run_batch`` itself fails the whole batch.
+    ``run_batch`` runs in the loop's default executor, one batch at a
+    time, so a slow batch does not stall the event loop; items submitted
+    meanwhile gather into the next batch.
+    """
+
+    def __init__(self, run_batch, max_batch_size=256, max_wait=0.002, metrics=None):
+        self.run_batch = run_batch
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait
+        self.metrics = metrics or BatchMetrics()
+        self._queue = None
+        self._task = None
+
+    async def submit(self, item):
+        if self._task is None or self._task.done():
+            self._queue = asyncio.Queue()
+            self._task = asyncio.get_running_loop().create_task(self._run())
+        future = asyncio.get_running_loop().create_future()
+        self._queue.put_nowait((item, future, time.perf_counter()))
+        return await future
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = [await self._queue.get()]
+            deadline = loop.time() + self.max_wait
+            while len(batch) < self.max_batch_size:
+                if self._queue.empty():
+                    remaining = deadline - loop.time()
+                    if remaining <= 0:
+                        break
+                    try:
+                        batch.append(await asyncio.wait_for(self._queue.get(), remaining))
+                    except asyncio.TimeoutError:
+                        break
+                else:
+                    batch.append(self._queue.get_nowait())
+            await self._dispatch(batch)
+
+    async def _dispatch(self, batch):
+        start = time.perf_counter()
+        self.metrics.record(len(batch), [start - queued for _, _, queued in batch])
+        try:
+            results = await asyncio.get_running_loop().run_in_executor(
+                None, self.run_batch, [item for item, _, _ in batch])
+        except asyncio.CancelledError:
+            for _, future, _ in batch:
+                future.cancel()
+            raise
+        except Exception as e:
+            logger.exception("Batch of %d evaluations failed", len(batch))
+            results = [e] * len(batch)
+        for (_, future, _), result in zip(batch, results):
+            if future.done():
+                continue
+            if isinstance(result, BaseException):
+                future.set_exception(result)
+            else:
+                future.set_result(result)
+
+    async def close(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
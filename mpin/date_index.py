@@ -0,0 +1,201 @@
+import datetime
+import os
+import struct
+import sys
+from array import array
+
+from mpin.demographics import demographic_patterns, parse_date, template_signature
+
+# Same bounds as the date pickers in app.py.
+MIN_DATE = datetime.date(1950, 1, 1)
+
+CACHE_DIR = os.environ.get("MPIN_CACHE_DIR", os.path.join(os.path.dirname(__file__), "_cache"))
+
+FORMAT_VERSION = 2
+NO_PATTERN = 0xFFFFFFFF
+_MAGIC = b"MPDI"
+_HEADER = struct.Struct("<4sHHIIII")
+
+
+class DateIndex:
+    """Precomputed demographic patterns for every date in ``[start, end]``.
+
+    ``date_patterns`` is a ``days x width`` table of pattern values per date
+    (padded with ``NO_PATTERN``). ``pattern_offsets``/``pattern_dates`` are
+    the reverse index in CSR form: the dates (as day offsets from ``start``)
+    that generate pattern ``n`` are
+    ``pattern_dates[pattern_offsets[n]:pattern_offsets[n + 1]]``, ascending.
+    """
+
+    def __init__(self, length, start, end, width, date_patterns, pattern_offsets, pattern_dates):
+        self.length = length
+        self.start = start
+        self.end = end
+        self.width = width
+        self.date_patterns = date_patterns
+        self.pattern_offsets = pattern_offsets
+        self.pattern_dates = pattern_dates
+
+    def _row(self, date):
+        if not self.start <= date <= self.end:
+            return None
+        i = (date - self.start).days * self.width
+        return self.date_patterns[i:i + self.width]
+
+    def patterns_for_date(self, date):
+        """Return the set of pattern values for ``date``, or ``None`` if it is outside the index."""
+        row = self._row(date)
+        if row is None:
+            return None
+        return {pattern for pattern in row if pattern != NO_PATTERN}
+
+    def patterns_for_range(self, first, last):
+        """Return the set of pattern values of every indexed date in ``[first, last]``.
+
+        The rows of consecutive dates are contiguous, so this is one slice
+        of ``date_patterns`` however long the range.
+        """
+        first, last = max(first, self.start), min(last, self.end)
+        if first > last:
+            return set()
+        patterns = set(self.date_patterns[(first - self.start).days * self.width:
+                                          ((last - self.start).days + 1) * self.width])
+        patterns.discard(NO_PATTERN)
+        return patterns
+
+    def has_pattern(self, date, pin):
+        """Return whether ``date`` generates ``pin``, or ``None`` if the date is outside the index."""
+        row = self._row(date)
+        if row is None:
+            return None
+        return pin in row
+
+    def dates_for_pattern(self, pin):
+        """Return every indexed date that generates ``pin``, oldest first."""
+        if not 0 <= pin < len(self.pattern_offsets) - 1:
+            return []
+        lo, hi = self.pattern_offsets[pin], self.pattern_offsets[pin + 1]
+        return [self.start + datetime.timedelta(days=offset) for offset in self.pattern_dates[lo:hi]]
+
+    def save(self, file_path):
+        os.makedirs(os.path.dirname(file_path), exist_ok=True)
+        tmp_path = file_path + ".tmp"
+        with open(tmp_path, "wb") as file:
+            file.write(_HEADER.pack(_MAGIC, FORMAT_VERSION, self.length, template_signature(self.length),
+                                    self.start.toordinal(), self.end.toordinal(), self.width))
+            self.date_patterns.tofile(file)
+            self.pattern_offsets.tofile(file)
+            self.pattern_dates.tofile(file)
+        os.replace(tmp_path, file_path)
+
+    @classmethod
+    def load(cls, file_path):
+        with open(file_path, "rb") as file:
+            magic, version, length, signature, start, end, width = _HEADER.unpack(file.read(_HEADER.size))
+            if magic != _MAGIC or version != FORMAT_VERSION:
+                raise ValueError(f"Unsupported date index file: {file_path}")
+            if signature != template_signature(length):
+                raise ValueError(f"Date index was built from different templates: {file_path}")
+            days = end - start + 1
+            date_patterns = array("I")
+            date_patterns.fromfile(file, days * width)
+            pattern_offsets = array("I")
+            pattern_offsets.fromfile(file, 10 ** length + 1)
+            pattern_dates = array("I")
+            pattern_dates.fromfile(file, pattern_offsets[-1])
+        return cls(length, datetime.date.fromordinal(start), datetime.date.fromordinal(end),
+                   width, date_patterns, pattern_offsets, pattern_dates)
+
+
+def build_date_index(length, start=MIN_DATE, end=None):
+    """Walk every date in ``[start, end]`` once and index its ``length``-digit patterns."""
+    end = end or datetime.date.today()
+    days = (end - start).days + 1
+
+    rows = []
+    for offset in range(days):
+        rows.append(sorted(demographic_patterns(start + datetime.timedelta(days=offset), length)))
+    width = max(len(row) for row in rows)
+
+    date_patterns = array("I", [NO_PATTERN]) * (days * width)
+    counts = array("I", [0]) * (10 ** length + 1)
+    for offset, row in enumerate(rows):
+        date_patterns[offset * width:offset * width + len(row)] = array("I", row)
+        for pattern in row:
+            counts[pattern + 1] += 1
+
+    pattern_offsets = counts
+    for n in range(1, len(pattern_offsets)):
+        pattern_offsets[n] += pattern_offsets[n - 1]
+
+    fill = pattern_offsets[:-1]
+    pattern_dates = array("I", [0]) * pattern_offsets[-1]
+    for offset, row in enumerate(rows):
+        for pattern in row:
+            pattern_dates[fill[pattern]] = offset
+            fill[pattern] += 1
+
+    return DateIndex(length, start, end, width, date_patterns, pattern_offsets, pattern_dates)
+
+
+def index_path(length):
+    return os.path.join(CACHE_DIR, f"dates-{length}.bin")
+
+
+_indexes = {}
+
+
+def get_date_index(length):
+    """Load the date index for ``length`` on first use (from the bundle if there is one), building and saving it if missing."""
+    index = _indexes.get(length)
+    if index is None:
+        from mpin.bundle import get_bundle
+
+        bundle = get_bundle()
+        index = bundle.date_index(length) if bundle is not None else None
+        if index is None:
+            file_path = index_path(length)
+            try:
+                index = DateIndex.load(file_path)
+            except (OSError, ValueError, EOFError):
+                index = build_date_index(length)
+                try:
+                    index.save(file_path)
+                except OSError:
+                    pass
+        _indexes[length] = index
+    return index
+
+
+def matches_date(mpin, date, length):
+    """Return whether ``mpin`` is one of the demographic patterns of a date or DD-MM-YYYY string."""
+    date = parse_date(date)
+    if date is None or not (len(mpin) == length and mpin.isascii() and mpin.isdigit()):
+        return False
+    pin = int(mpin)
+    matched = get_date_index(length).has_pattern(date, pin)
+    if matched is None:
+        return pin in demographic_patterns(date, length)
+    return matched
+
+
+def dates_for_pin(mpin, length):
+    """Return every supported date that makes ``mpin`` a demographic PIN."""
+    if not (len(mpin) == length and mpin.isascii() and mpin.isdigit()):
+        return []
+    return get_date_index(length).dates_for_pattern(int(mpin))
+
+
+if __name__ == "__main__":
+    if len(sys.argv) >= 2 and sys.argv[1] == "build":
+        for length in [int(arg) for arg in sys.argv[2:]] or [4, 6]:
+            index = build_date_index(length)
+            index.save(index_path(length))
+            print(f"{length}-digit index: {index.start} to {index.end} -> {index_path(length)}")
+    elif len(sys.argv) == 3 and sys.argv[1] == "dates":
+        mpin = sys.argv[2].strip()
+        for date in dates_for_pin(mpin, len(mpin)):
+            print(date.strftime("%d-%m-%Y"))
+    else:
+        print("Usage: python -m mpin.date_index build [4] [6]")
+        print("       python -m mpin.date_index dates <MPIN>")
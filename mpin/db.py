@@ -0,0 +1,291 @@
+import json
+import os
+import queue
+import threading
+
+from mpin import storage
+from mpin.journal import Journal, JournaledSink
+from mpin.log_writer import LogWriter
+from mpin.reasons import STRENGTHS, reasons_to_mask
+
+# mysql.connector and dotenv are imported where they are used, so importing
+# this module (as every checker does) costs nothing until a log is written.
+
+# timestamp is left to its CURRENT_TIMESTAMP default on insert so the
+# VALUES row is plain placeholders, which executemany can batch.
+UPSERT_QUERY = """
+INSERT INTO mpin_evaluations
+(user_id, mpin, length, strength, reasons, dob_self, dob_spouse, anniversary, blocklist_version, other_dates,
+ fragment_blocklist_version)
+VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s)
+ON DUPLICATE KEY UPDATE
+    mpin = VALUES(mpin),
+    length = VALUES(length),
+    strength = VALUES(strength),
+    reasons = VALUES(reasons),
+    dob_self = VALUES(dob_self),
+    dob_spouse = VALUES(dob_spouse),
+    anniversary = VALUES(anniversary),
+    blocklist_version = VALUES(blocklist_version),
+    other_dates = VALUES(other_dates),
+    fragment_blocklist_version = VALUES(fragment_blocklist_version),
+    timestamp = NOW()
+"""
+
+
+def _log_date(value):
+    if isinstance(value, tuple):
+        # A (first, last) range from fuzzy mode, as an ISO 8601 interval.
+        return "/".join(date.strftime("%Y-%m-%d") for date in value)
+    return value.strftime("%Y-%m-%d") if hasattr(value, "strftime") else value
+
+
+def log_params(user_id, mpin, strength, reasons, dob_self, dob_spouse, anniversary, blocklist_version=None,
+               other_dates=None, fragment_blocklist_version=None):
+    """Return the UPSERT_QUERY parameters for one evaluation, with strength and reasons encoded.
+
+    ``other_dates`` (label to date, as given to the engine) is stored as a
+    JSON object, or NULL when there are none. A standard date that is a
+    fuzzy-mode range does not fit its DATE column and is stored there too,
+    under its column name. ``fragment_blocklist_version`` is the version
+    of the 4-digit list a 6-digit PIN was searched for (CONTAINS_COMMON).
+    """
+    dates = (dob_self, dob_spouse, anniversary)
+    other_dates = dict(other_dates or ())
+    for column, date in zip(storage.DATE_COLUMNS, dates):
+        if isinstance(date, tuple):
+            other_dates[column] = date
+    return (
+        user_id,
+        mpin,
+        len(mpin),
+        STRENGTHS.index(strength),
+        reasons_to_mask(reasons),
+        *(None if isinstance(date, tuple) else _log_date(date) for date in dates),
+        blocklist_version,
+        json.dumps({label: _log_date(date) for label, date in other_dates.items()}) if other_dates else None,
+        fragment_blocklist_version,
+    )
+
+
+def _close(slot):
+    connection, cursor = slot
+    try:
+        cursor.close()
+        connection.close()
+    except Exception:
+        pass
+
+
+class ConnectionPool:
+    """The MySQL store: a fixed-size pool of connections, each with a prepared upsert cursor.
+
+    Connections are opened lazily up to ``size`` and handed out LIFO, so a
+    quiet process keeps reusing one warm connection. The prepared cursor
+    lives as long as its connection, so the upsert is parsed once per
+    connection rather than once per call. A caller waits at most
+    ``acquire_timeout`` seconds for a free slot (then ``TimeoutError``);
+    a discarded connection frees its slot, so a waiter opens a new one.
+    """
+
+    def __init__(self, size=5, acquire_timeout=30.0, **connect_args):
+        self.size = size
+        self.acquire_timeout = acquire_timeout
+        self.connect_args = connect_args
+        self._idle = queue.LifoQueue()
+        self._slots = threading.BoundedSemaphore(size)
+
+    def _open(self):
+        import mysql.connector
+
+        connection = mysql.connector.connect(**self.connect_args)
+        return connection, connection.cursor(prepared=True)
+
+    def _acquire(self):
+        if not self._slots.acquire(timeout=self.acquire_timeout):
+            raise TimeoutError(f"No free MySQL connection after {self.acquire_timeout} s")
+        try:
+            return self._idle.get_nowait()
+        except queue.Empty:
+            pass
+        try:
+            return self._open()
+        except BaseException:
+            self._slots.release()
+            raise
+
+    def _release(self, slot):
+        self._idle.put(slot)
+        self._slots.release()
+
+    def _discard(self, slot):
+        _close(slot)
+        self._slots.release()
+
+    def upsert(self, params):
+        """Run UPSERT_QUERY with ``params`` and return the affected row count (1 insert, 2 update).
+
+        A pooled connection the server has dropped is replaced and the
+        upsert retried once; any other error is raised to the caller.
+        """
+        import mysql.connector
+
+        for attempt in range(2):
+            slot = self._acquire()
+            connection, cursor = slot
+            try:
+                cursor.execute(UPSERT_QUERY, params)
+                connection.commit()
+                affected_rows = cursor.rowcount
+            except (mysql.connector.errors.OperationalError, mysql.connector.errors.InterfaceError):
+                self._discard(slot)
+                if attempt:
+                    raise
+                continue
+            except Exception:
+                self._discard(slot)
+                raise
+            self._release(slot)
+            return affected_rows
+
+    def upsert_many(self, params_list):
+        """Upsert a batch of rows with one multi-row INSERT and a single commit."""
+        slot = self._acquire()
+        connection, _ = slot
+        try:
+            cursor = connection.cursor()
+            try:
+                cursor.executemany(UPSERT_QUERY, params_list)
+            finally:
+                cursor.close()
+            connection.commit()
+        except Exception:
+            self._discard(slot)
+            raise
+        self._release(slot)
+
+    def get(self, user_id):
+        """Return the logged evaluation for ``user_id`` as a dict (see storage._record), or ``None``."""
+        slot = self._acquire()
+        connection, _ = slot
+        try:
+            cursor = connection.cursor()
+            try:
+                cursor.execute(f"SELECT {', '.join(storage.LOG_COLUMNS)}, timestamp FROM mpin_evaluations "
+                               "WHERE user_id = %s", (user_id,))
+                row = cursor.fetchone()
+            finally:
+                cursor.close()
+        except Exception:
+            self._discard(slot)
+            raise
+        self._release(slot)
+        return storage._record(row[:-1], row[-1]) if row else None
+
+    def clear(self):
+        slot = self._acquire()
+        connection, _ = slot
+        try:
+            cursor = connection.cursor()
+            try:
+                cursor.execute("DELETE FROM mpin_evaluations")
+            finally:
+                cursor.close()
+            connection.commit()
+        except Exception:
+            self._discard(slot)
+            raise
+        self._release(slot)
+
+    def close(self):
+        while True:
+            try:
+                slot = self._idle.get_nowait()
+            except queue.Empty:
+                break
+            _close(slot)
+
+
+BACKENDS = ("mysql", "sqlite", "memory")
+
+
+def open_store(backend=None, sqlite_path=None):
+    """Open the mpin_logs store for ``backend`` (by default DB_BACKEND, else ``mysql``).
+
+    Every store has the same interface: ``upsert`` (returning 1 for an
+    insert, 2 for an update), ``upsert_many``, ``get``, ``clear`` and
+    ``close``. MySQL uses the DB_* connection settings; SQLite uses
+    ``sqlite_path`` or DB_SQLITE_PATH (default ``mpin_logs.db``).
+    """
+    backend = (backend or os.getenv("DB_BACKEND") or "mysql").lower()
+    if backend == "mysql":
+        return ConnectionPool(
+            size=int(os.getenv("DB_POOL_SIZE", "5")),
+            acquire_timeout=float(os.getenv("DB_POOL_TIMEOUT", "30")),
+            host=os.getenv("DB_HOST"),
+            user=os.getenv("DB_USER"),
+            password=os.getenv("DB_PASSWORD"),
+            database=os.getenv("DB_NAME"),
+        )
+    if backend == "sqlite":
+        return storage.SQLiteStore(sqlite_path or os.getenv("DB_SQLITE_PATH", "mpin_logs.db"))
+    if backend == "memory":
+        return storage.MemoryStore()
+    raise ValueError(f"Unknown DB_BACKEND {backend!r}; expected one of {', '.join(BACKENDS)}")
+
+
+_store = None
+_writer = None
+_store_lock = threading.Lock()
+
+
+def get_store(env_path=None):
+    """Return the process-wide store, reading DB_* settings from ``env_path`` on first use."""
+    global _store
+    if _store is None:
+        with _store_lock:
+            if _store is None:
+                if env_path:
+                    from dotenv import load_dotenv
+
+                    load_dotenv(dotenv_path=env_path)
+                _store = open_store()
+    return _store
+
+
+def get_writer(env_path=None):
+    """Return the process-wide write-behind logger feeding the store.
+
+    Batches fall back to a local journal (DB_JOURNAL_DIR, by default a
+    ``journal`` directory next to the .env file) while MySQL is down or
+    slow, and are replayed into mpin_logs once it responds again.
+    """
+    global _writer
+    if _writer is None:
+        store = get_store(env_path)
+        with _store_lock:
+            if _writer is None:
+                journal_dir = os.getenv("DB_JOURNAL_DIR") or os.path.join(
+                    os.path.dirname(os.path.abspath(env_path)) if env_path else os.getcwd(), "journal")
+                sink = JournaledSink(
+                    store.upsert_many,
+                    Journal(journal_dir),
+                    retry_interval=float(os.getenv("DB_RETRY_INTERVAL", "5")),
+                    slow_threshold=float(os.getenv("DB_SLOW_THRESHOLD", "2")),
+                )
+                _writer = LogWriter(
+                    sink,
+                    batch_size=int(os.getenv("DB_LOG_BATCH_SIZE", "500")),
+                    flush_interval=float(os.getenv("DB_LOG_FLUSH_INTERVAL", "0.2")),
+                    max_queue=int(os.getenv("DB_LOG_QUEUE_SIZE", "10000")),
+                )
+    return _writer
+
+
+def log_evaluation(user_id, mpin, strength, reasons, dob_self, dob_spouse, anniversary,
+                   blocklist_version=None, env_path=None, timeout=None, other_dates=None,
+                   fragment_blocklist_version=None):
+    """Queue one evaluation for the write-behind logger; see LogWriter.submit for ``timeout``."""
+    params = log_params(user_id, mpin, strength, reasons, dob_self, dob_spouse, anniversary, blocklist_version,
+                        other_dates, fragment_blocklist_version)
+    get_writer(env_path).submit(params, timeout=timeout)
@@ -0,0 +1,122 @@
+import datetime
+import re
+import zlib
+
+# Demographic pattern templates per PIN length. Each template lists date
+# fields left to right: DD, MM, YY (two-digit year) and YYYY. A field
+# ending in "~" is written backwards, and a leading "~" reverses the whole
+# pattern. Duplicates (e.g. "~ DD MM" and "MM~ DD~") and templates that do
+# not add up to the PIN length are dropped when the table is compiled.
+TEMPLATES = {
+    4: (
+        "DD MM", "MM DD", "DD YY", "YY DD", "MM YY", "YY MM",
+        "YY YY", "DD DD", "MM MM",
+        "YY YY~",
+        "~ DD MM", "~ MM DD",
+    ),
+    6: (
+        "DD MM YY", "DD YY MM", "MM DD YY", "MM YY DD", "YY DD MM", "YY MM DD",
+        "DD DD DD", "MM MM MM", "YY YY YY",
+        "~ DD MM YY", "~ DD YY MM", "~ MM DD YY", "~ MM YY DD", "~ YY DD MM", "~ YY MM DD",
+    ),
+}
+
+_FIELD_WIDTHS = {"DD": 2, "MM": 2, "YY": 2, "YYYY": 4}
+_FIELD_VARS = {"DD": "d", "MM": "m", "YY": "y", "YYYY": "yyyy"}
+_REVERSED_VARS = {
+    "d_r": "d % 10 * 10 + d // 10",
+    "m_r": "m % 10 * 10 + m // 10",
+    "y_r": "y % 10 * 10 + y // 10",
+    "yyyy_r": "int(str(yyyy).zfill(4)[::-1])",
+}
+_DATE_RE = re.compile(r"(\d{1,2})-(\d{1,2})-(\d{4})")
+
+
+def _parse_template(template):
+    tokens = template.split()
+    reverse_all = tokens[0] == "~"
+    if reverse_all:
+        tokens = tokens[1:]
+    parts = []
+    for token in tokens:
+        reverse = token.endswith("~")
+        parts.append((token.rstrip("~"), reverse))
+    if reverse_all:
+        parts = [(field, not reverse) for field, reverse in reversed(parts)]
+    return tuple(parts)
+
+
+def compile_templates(length):
+    """Compile the templates for ``length`` into one function of (day, month, year)."""
+    templates = []
+    used = set()
+    exprs = []
+    for template in TEMPLATES[length]:
+        parts = _parse_template(template)
+        if sum(_FIELD_WIDTHS[field] for field, _ in parts) != length or parts in templates:
+            continue
+        templates.append(parts)
+        terms = []
+        shift = length
+        for field, reverse in parts:
+            shift -= _FIELD_WIDTHS[field]
+            var = _FIELD_VARS[field] + ("_r" if reverse else "")
+            used.add(var)
+            terms.append(f"{var} * {10 ** shift}" if shift else var)
+        exprs.append(" + ".join(terms))
+
+    body = "    y = yyyy % 100\n"
+    for var, expr in _REVERSED_VARS.items():
+        if var in used:
+            body += f"    {var} = {expr}\n"
+    source = f"def patterns(d, m, yyyy):\n{body}    return {{{', '.join(exprs)}}}\n"
+    namespace = {}
+    exec(compile(source, f"<mpin templates {length}>", "exec"), namespace)
+    patterns = namespace["patterns"]
+    patterns.source = source
+    patterns.templates = tuple(templates)
+    patterns.signature = zlib.crc32(source.encode())
+    return patterns
+
+
+_COMPILED = {length: compile_templates(length) for length in TEMPLATES}
+
+
+def compiled_templates(length):
+    """Return the deduplicated templates for ``length`` as tuples of ``(field, reversed)``."""
+    return _COMPILED[length].templates
+
+
+def template_signature(length):
+    return _COMPILED[length].signature
+
+
+def parse_date(value):
+    """Return a ``datetime.date`` for a date or a DD-MM-YYYY string, or ``None`` if invalid."""
+    if isinstance(value, datetime.datetime):
+        return value.date()
+    if isinstance(value, datetime.date):
+        return value
+    if not isinstance(value, str):
+        return None
+    match = _DATE_RE.fullmatch(value)
+    if not match:
+        return None
+    day, month, year = (int(group) for group in match.groups())
+    try:
+        return datetime.date(year, month, day)
+    except ValueError:
+        return None
+
+
+def demographic_patterns(date, length):
+    """Return the ``length``-digit demographic patterns of ``date`` as integers."""
+    return _COMPILED[length](date.day, date.month, date.year)
+
+
+def generate_demographic_patterns(date, length):
+    """Return the demographic patterns of a date or DD-MM-YYYY string as zero-padded strings."""
+    date = parse_date(date)
+    if date is None:
+        return set()
+    return {str(pattern).zfill(length) for pattern in demographic_patterns(date, length)}
@@ -0,0 +1,84 @@
+import os
+import weakref
+
+from mpin.date_index import get_date_index
+from mpin.demographics import demographic_patterns, parse_date
+from mpin.pin_index import PinIndex
+
+# 6-digit PINs are checked for 4-digit fragments: a common 4-digit PIN or
+# a 4-digit date pattern starting at any of the three offsets (123400,
+# 190590 for 19-05-1990).
+FRAGMENT_LENGTH = 4
+LENGTHS = (6,)
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+FRAGMENT_BLOCKLIST_PATH = os.path.join(ROOT_DIR, "4 digits pin", "common_pins.txt")
+
+
+def windows(pin, length):
+    """Return the FRAGMENT_LENGTH-digit windows of integer ``pin``, left to right."""
+    return [pin // 10 ** shift % 10 ** FRAGMENT_LENGTH for shift in range(length - FRAGMENT_LENGTH, -1, -1)]
+
+
+def build_embedded_index(fragments, length):
+    """Return a PinIndex of the ``length``-digit PINs with a window in the FRAGMENT_LENGTH-digit index ``fragments``."""
+    pins = [n for byte, value in enumerate(fragments.bits) if value
+            for n in range(byte * 8, byte * 8 + 8) if value >> (n & 7) & 1]
+    embedded = PinIndex(length)
+    free = length - FRAGMENT_LENGTH
+    for shift in range(free + 1):
+        for pin in pins:
+            for rest in range(10 ** free):
+                # The free digits are split around the fragment: ``shift``
+                # of them to its right, the others to its left.
+                n = (rest // 10 ** shift * 10 ** FRAGMENT_LENGTH + pin) * 10 ** shift + rest % 10 ** shift
+                embedded.bits[n >> 3] |= 1 << (n & 7)
+    return embedded
+
+
+_embedded_indexes = weakref.WeakKeyDictionary()
+
+
+def embedded_index(fragments, length):
+    """Return the (cached) embedded-fragment index for a 4-digit blocklist PinIndex."""
+    indexes = _embedded_indexes.setdefault(fragments, {})
+    if length not in indexes:
+        indexes[length] = build_embedded_index(fragments, length)
+    return indexes[length]
+
+
+_fragments = None
+
+
+def default_fragments():
+    """Load the 4-digit common-PIN list on first use."""
+    global _fragments
+    if _fragments is None:
+        from mpin.bundle import load_pin_file
+
+        _fragments = load_pin_file(FRAGMENT_BLOCKLIST_PATH, FRAGMENT_LENGTH)
+    return _fragments
+
+
+def contains_common(mpin, length, fragments=None):
+    """Return whether ``mpin`` embeds a PIN of ``fragments`` (default: the 4-digit common list)."""
+    if length not in LENGTHS:
+        return False
+    if fragments is None:
+        fragments = default_fragments()
+    if isinstance(fragments, PinIndex):
+        return mpin in embedded_index(fragments, length)
+    if not (len(mpin) == length and mpin.isascii() and mpin.isdigit()):
+        return False
+    return any(mpin[i:i + FRAGMENT_LENGTH] in fragments for i in range(length - FRAGMENT_LENGTH + 1))
+
+
+def contains_date(mpin, date, length):
+    """Return whether ``mpin`` embeds a 4-digit demographic pattern of a date or DD-MM-YYYY string."""
+    date = parse_date(date)
+    if length not in LENGTHS or date is None or not (len(mpin) == length and mpin.isascii() and mpin.isdigit()):
+        return False
+    patterns = get_date_index(FRAGMENT_LENGTH).patterns_for_date(date)
+    if patterns is None:
+        patterns = demographic_patterns(date, FRAGMENT_LENGTH)
+    return not patterns.isdisjoint(windows(int(mpin), length))
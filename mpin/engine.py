@@ -0,0 +1,99 @@
+from mpin.date_index import matches_date
+from mpin.embedded import contains_common, contains_date
+from mpin.near import is_near_common, is_near_date
+from mpin.profile import UserProfile, labelled_dates
+from mpin.reasons import mask_strength, mask_to_reasons, reasons_to_mask
+from mpin.structure import structural_mask
+
+# Below this many rows the per-call overhead of the numpy evaluator costs
+# more than it saves, so evaluate_many loops over the scalar path instead.
+VECTORIZE_MIN_ROWS = 512
+
+
+def evaluate_strength_and_reasons(mpin, common_pins_set, dob_self, dob_spouse, anniversary, length, fragments=None,
+                                  profile=None, other_dates=None, fuzzy=False, tolerance_days=0):
+    """Shared implementation of final_4/final_6 ``evaluate_strength_and_reasons`` for ``length``-digit PINs.
+
+    ``fragments`` is the 4-digit blocklist that 6-digit PINs are searched
+    for (default: the 4-digit ``common_pins.txt``). ``other_dates`` maps
+    labels to any further dates of the user (a PIN from one of them is
+    DEMOGRAPHIC_OTHER). With ``fuzzy``, dates may be partial (MM-YYYY,
+    YYYY) or off by up to ``tolerance_days``, and a PIN from any date they
+    could be counts (see ``profile.labelled_dates``). ``profile``, a
+    ``UserProfile`` compiled from the same dates, replaces the per-call
+    date checks.
+    """
+    if profile is None and (other_dates or fuzzy):
+        profile = UserProfile(labelled_dates(dob_self, dob_spouse, anniversary, other_dates, fuzzy, tolerance_days),
+                              length)
+    if profile is not None:
+        return profile.evaluate(mpin, common_pins_set, fragments)
+
+    reasons = []
+
+    if mpin in common_pins_set:
+        reasons.append("COMMONLY_USED")
+
+    if dob_self and matches_date(mpin, dob_self, length):
+        reasons.append("DEMOGRAPHIC_DOB_SELF")
+
+    if dob_spouse and matches_date(mpin, dob_spouse, length):
+        reasons.append("DEMOGRAPHIC_DOB_SPOUSE")
+
+    if anniversary and matches_date(mpin, anniversary, length):
+        reasons.append("DEMOGRAPHIC_ANNIVERSARY")
+
+    reasons.extend(mask_to_reasons(structural_mask(mpin, length)))
+
+    # One digit off (or two neighbours swapped) only counts when the exact
+    # check did not already flag the PIN.
+    if "COMMONLY_USED" not in reasons and is_near_common(mpin, common_pins_set, length):
+        reasons.append("NEAR_COMMON")
+
+    if not any(reason.startswith("DEMOGRAPHIC_") for reason in reasons) and any(
+            date and is_near_date(mpin, date, length) for date in (dob_self, dob_spouse, anniversary)):
+        reasons.append("NEAR_DEMOGRAPHIC")
+
+    if "COMMONLY_USED" not in reasons and contains_common(mpin, length, fragments):
+        reasons.append("CONTAINS_COMMON")
+
+    if not any(reason.startswith("DEMOGRAPHIC_") for reason in reasons) and any(
+            date and contains_date(mpin, date, length) for date in (dob_self, dob_spouse, anniversary)):
+        reasons.append("CONTAINS_DEMOGRAPHIC")
+
+    strength = mask_strength(reasons_to_mask(reasons))
+    return strength, reasons
+
+
+def evaluate_many(mpins, common_pins, dob_self, dob_spouse, anniversary, length, fragments=None, profiles=None):
+    """Evaluate a batch of ``length``-digit PINs.
+
+    Takes parallel lists (dates are date objects or None) and returns a
+    list of ``(strength, reasons)`` tuples, exactly as
+    ``evaluate_strength_and_reasons`` would for each row. Batches of at
+    least VECTORIZE_MIN_ROWS go through the numpy evaluator in one call.
+    ``profiles`` is an optional parallel list of ``UserProfile`` (or None);
+    a row with a profile is evaluated with it, which is how rows with
+    other dates than the three columns are evaluated. Raises
+    ``ValueError`` if an MPIN is not ``length`` ASCII digits, whichever
+    path the batch takes.
+    """
+    for mpin in mpins:
+        if not (isinstance(mpin, str) and len(mpin) == length and mpin.isascii() and mpin.isdigit()):
+            raise ValueError(f"MPIN {mpin!r} is not {length} digits")
+    if len(mpins) < VECTORIZE_MIN_ROWS:
+        profiles = profiles or [None] * len(mpins)
+        return [evaluate_strength_and_reasons(mpin, common_pins, *dates, length, fragments, profile)
+                for mpin, *dates, profile in zip(mpins, dob_self, dob_spouse, anniversary, profiles)]
+
+    from mpin.batch import date_to_int, evaluate_batch
+    from mpin.reasons import STRENGTHS
+
+    columns = [[date_to_int(date) for date in dates] for dates in (dob_self, dob_spouse, anniversary)]
+    strength, mask = evaluate_batch([int(mpin) for mpin in mpins], common_pins, length, *columns,
+                                    fragments=fragments)
+    evaluations = [(STRENGTHS[s], mask_to_reasons(m)) for s, m in zip(strength.tolist(), mask.tolist())]
+    for i, profile in enumerate(profiles or ()):
+        if profile is not None:
+            evaluations[i] = profile.evaluate(mpins[i], common_pins, fragments)
+    return evaluations
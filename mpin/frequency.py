@@ -0,0 +1,227 @@
+import functools
+import math
+import mmap
+import os
+import struct
+import sys
+import weakref
+from array import array
+
+from mpin import reasons
+from mpin.date_index import CACHE_DIR
+from mpin.demographics import compiled_templates
+from mpin.embedded import FRAGMENT_LENGTH, LENGTHS, default_fragments, embedded_index
+from mpin.near import near_index
+from mpin.pin_index import PinIndex
+from mpin.structure import structure_table
+
+FORMAT_VERSION = 1
+MAX_COUNT = 0xFFFFFFFF
+_MAGIC = b"MPFQ"
+_HEADER = struct.Struct("<4sHHQ")
+
+
+class FrequencyTable:
+    """How often every ``length``-digit PIN was seen, with its guess rank.
+
+    ``counts[n]`` is the number of times PIN ``n`` appears in the source
+    corpus (saturating at MAX_COUNT) and ``ranks[n]`` its position when
+    PINs are guessed most frequent first: 1 for the most common, with ties
+    sharing a rank (so every unseen PIN ranks after all seen ones). Both are
+    uint32 arrays over the keyspace; a loaded table reads them straight out
+    of a read-only mmap, so lookups are O(1) and the pages are shared by
+    every process that maps the same file.
+    """
+
+    def __init__(self, length, total, counts, ranks, mapping=None):
+        self.length = length
+        self.size = 10 ** length
+        self.total = total
+        self.counts = counts
+        self.ranks = ranks
+        self._mapping = mapping
+
+    @classmethod
+    def from_counts(cls, pairs, length):
+        """Build a table from ``(pin, count)`` pairs; counts of a repeated PIN add up."""
+        size = 10 ** length
+        counts = array("I", [0]) * size
+        index = PinIndex(length)
+        for pin, count in pairs:
+            n = index.key(pin)
+            if n is None:
+                raise ValueError(f"Not a {length}-digit PIN: {pin!r}")
+            counts[n] = min(counts[n] + count, MAX_COUNT)
+
+        ranks = array("I", [0]) * size
+        rank, previous = 0, None
+        for position, n in enumerate(sorted(range(size), key=counts.__getitem__, reverse=True), 1):
+            if counts[n] != previous:
+                rank, previous = position, counts[n]
+            ranks[n] = rank
+        return cls(length, sum(counts), counts, ranks)
+
+    @classmethod
+    def from_file(cls, file_path, length):
+        """Read a counts file: one ``PIN count`` (or ``PIN,count``) per line. Other lines are skipped."""
+        def pairs():
+            with open(file_path, "r") as file:
+                for line in file:
+                    fields = line.replace(",", " ").split()
+                    if len(fields) == 2 and len(fields[0]) == length and fields[0].isdigit() and fields[1].isdigit():
+                        yield fields[0], int(fields[1])
+        return cls.from_counts(pairs(), length)
+
+    def save(self, file_path):
+        os.makedirs(os.path.dirname(os.path.abspath(file_path)), exist_ok=True)
+        tmp_path = file_path + ".tmp"
+        with open(tmp_path, "wb") as file:
+            file.write(_HEADER.pack(_MAGIC, FORMAT_VERSION, self.length, self.total))
+            array("I", self.counts).tofile(file)
+            array("I", self.ranks).tofile(file)
+        os.replace(tmp_path, file_path)
+
+    @classmethod
+    def load(cls, file_path):
+        """Map a compiled table read-only; nothing is copied into the process."""
+        with open(file_path, "rb") as file:
+            mapping = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+        try:
+            magic, version, length, total = _HEADER.unpack_from(mapping)
+            size = 10 ** length
+            if magic != _MAGIC or version != FORMAT_VERSION or len(mapping) != _HEADER.size + 8 * size:
+                raise ValueError(f"Unsupported frequency table file: {file_path}")
+        except (struct.error, ValueError):
+            mapping.close()
+            raise ValueError(f"Unsupported frequency table file: {file_path}")
+        view = memoryview(mapping)
+        counts = view[_HEADER.size:_HEADER.size + 4 * size].cast("I")
+        ranks = view[_HEADER.size + 4 * size:].cast("I")
+        return cls(length, total, counts, ranks, mapping)
+
+    def _key(self, pin):
+        if isinstance(pin, str):
+            if len(pin) != self.length or not (pin.isascii() and pin.isdigit()):
+                raise ValueError(f"Not a {self.length}-digit PIN: {pin!r}")
+            return int(pin)
+        return pin
+
+    def count(self, pin):
+        return self.counts[self._key(pin)]
+
+    def rank(self, pin):
+        return self.ranks[self._key(pin)]
+
+    def close(self):
+        if self._mapping is not None:
+            self.counts.release()
+            self.ranks.release()
+            self._mapping.close()
+            self._mapping = None
+
+
+def table_path(length):
+    return os.path.join(CACHE_DIR, f"frequency-{length}.bin")
+
+
+_tables = {}
+
+
+def get_frequency_table(length):
+    """Map the compiled table for ``length`` on first use, or return ``None`` if none was compiled."""
+    if length not in _tables:
+        try:
+            _tables[length] = FrequencyTable.load(table_path(length))
+        except (OSError, ValueError):
+            _tables[length] = None
+    return _tables[length]
+
+
+@functools.lru_cache(maxsize=None)
+def _static_guesses(length):
+    """Candidate-set sizes of the rules that do not depend on the blocklist."""
+    guesses = {}
+    for mask in structure_table(length):
+        if mask:
+            for name in reasons.mask_to_reasons(mask):
+                guesses[name] = guesses.get(name, 0) + 1
+    templates = len(compiled_templates(length))
+    for name in ("DEMOGRAPHIC_DOB_SELF", "DEMOGRAPHIC_DOB_SPOUSE", "DEMOGRAPHIC_ANNIVERSARY", "DEMOGRAPHIC_OTHER"):
+        guesses[name] = templates
+    # Each pattern plus its 9 * length changed digits and length - 1 swaps.
+    guesses["NEAR_DEMOGRAPHIC"] = templates * 10 * length
+    if length in LENGTHS:
+        guesses["CONTAINS_DEMOGRAPHIC"] = (len(compiled_templates(FRAGMENT_LENGTH))
+                                           * (length - FRAGMENT_LENGTH + 1) * 10 ** (length - FRAGMENT_LENGTH))
+        # Against the default 4-digit list, whichever fragments were searched.
+        guesses["CONTAINS_COMMON"] = len(embedded_index(default_fragments(), length))
+    return guesses
+
+
+_blocklist_guesses = weakref.WeakKeyDictionary()
+
+
+def _common_guesses(common_pins, length):
+    if isinstance(common_pins, PinIndex):
+        guesses = _blocklist_guesses.get(common_pins)
+        if guesses is None:
+            size = len(common_pins)
+            guesses = _blocklist_guesses[common_pins] = (size, size + len(near_index(common_pins)))
+        return guesses
+    size = len(common_pins)
+    return size, size * 10 * length
+
+
+def rule_guesses(reason, length, common_pins=None):
+    """Return how many guesses an attacker enumerating ``reason``'s candidates needs at most.
+
+    For the blocklist reasons that is the size of ``common_pins`` (and of
+    its neighbourhood); for a date reason, the patterns one date yields;
+    for a structural reason, the PINs in the keyspace table with that bit.
+    """
+    if reason in ("COMMONLY_USED", "NEAR_COMMON"):
+        if common_pins is None:
+            return 10 ** length
+        size, near = _common_guesses(common_pins, length)
+        return size if reason == "COMMONLY_USED" else near
+    return _static_guesses(length).get(reason, 10 ** length)
+
+
+def guess_rank(mpin, reason_list, length, common_pins=None, table=None):
+    """Return the guess rank of ``mpin``: 1 means an attacker's first guess.
+
+    An attacker either guesses by frequency (``table``, default the
+    compiled table for ``length``) or enumerates the candidates of a rule
+    the PIN was flagged for; the rank is the earliest of these. Without a
+    frequency table only the rules count, and an unflagged PIN ranks last.
+    """
+    if table is None:
+        table = get_frequency_table(length)
+    rank = table.rank(mpin) if table is not None else 10 ** length
+    for reason in reason_list:
+        rank = min(rank, rule_guesses(reason, length, common_pins))
+    return rank
+
+
+def score(rank, length):
+    """Map a guess rank to 0-100: the share of the keyspace's digits of entropy left (0 = first guess)."""
+    return round(100 * math.log10(max(rank, 1)) / length)
+
+
+if __name__ == "__main__":
+    if len(sys.argv) in (4, 5) and sys.argv[1] == "compile":
+        length = int(sys.argv[3])
+        output = sys.argv[4] if len(sys.argv) == 5 else table_path(length)
+        table = FrequencyTable.from_file(sys.argv[2], length)
+        table.save(output)
+        print(f"{length}-digit frequency table: {table.total} PINs counted -> {output}")
+    elif len(sys.argv) == 3 and sys.argv[1] == "rank":
+        mpin = sys.argv[2].strip()
+        table = get_frequency_table(len(mpin))
+        if table is None:
+            print(f"No frequency table at {table_path(len(mpin))}")
+        else:
+            print(f"count {table.count(mpin)}, rank {table.rank(mpin)}")
+    else:
+        print("Usage: python -m mpin.frequency compile <counts file> <4|6> [output]")
+        print("       python -m mpin.frequency rank <MPIN>")
@@ -0,0 +1,88 @@
+import calendar
+import datetime
+import functools
+import re
+
+from mpin.date_index import MIN_DATE, get_date_index
+from mpin.demographics import demographic_patterns, parse_date
+
+# Fuzzy demographic mode: a date the user only partly gave (a year, or a
+# month and year) or that may be off by a few days stands for every date
+# consistent with it, and a PIN is demographic if any of them yields it.
+MAX_TOLERANCE_DAYS = 366
+
+_MONTH_YEAR_RE = re.compile(r"(\d{1,2})-(\d{4})")
+_YEAR_RE = re.compile(r"\d{4}")
+
+
+def date_range(value, tolerance_days=0):
+    """Return ``(first, last)``, the dates consistent with ``value`` give or take ``tolerance_days``.
+
+    ``value`` is a date, a DD-MM-YYYY string, an MM-YYYY string (the whole
+    month) or a YYYY string (the whole year). Returns ``None`` if it is
+    none of these. A range is cut to the dates the date pickers offer
+    (MIN_DATE to today), and ``None`` is returned if none of it is left;
+    an exact date is returned as it is.
+    """
+    date = parse_date(value)
+    if date is not None:
+        first = last = date
+    elif isinstance(value, str) and _MONTH_YEAR_RE.fullmatch(value):
+        month, year = (int(group) for group in _MONTH_YEAR_RE.fullmatch(value).groups())
+        if not (1 <= month <= 12 and year >= 1):
+            return None
+        first = datetime.date(year, month, 1)
+        last = datetime.date(year, month, calendar.monthrange(year, month)[1])
+    elif isinstance(value, str) and _YEAR_RE.fullmatch(value) and int(value) >= 1:
+        first, last = datetime.date(int(value), 1, 1), datetime.date(int(value), 12, 31)
+    else:
+        return None
+    tolerance = datetime.timedelta(days=min(max(tolerance_days, 0), MAX_TOLERANCE_DAYS))
+    try:
+        first -= tolerance
+    except OverflowError:
+        first = datetime.date.min
+    try:
+        last += tolerance
+    except OverflowError:
+        last = datetime.date.max
+    if first != last:
+        first, last = max(first, MIN_DATE), min(last, datetime.date.today())
+        if first > last:
+            return None
+    return first, last
+
+
+def fuzzy_date(value, tolerance_days=0):
+    """Return the date ``value`` stands for if there is only one, else its ``(first, last)`` range (see ``date_range``)."""
+    dates = date_range(value, tolerance_days)
+    if dates is None:
+        return None
+    return dates[0] if dates[0] == dates[1] else dates
+
+
+@functools.lru_cache(maxsize=1024)
+def range_patterns(first, last, length):
+    """Return the ``length``-digit demographic patterns of every date in ``[first, last]``.
+
+    Dates inside the precomputed index are answered by one range query on
+    it; only dates outside it (before 1950 or after it was built) are
+    generated one by one. Ranges from ``date_range`` lie within MIN_DATE
+    and today, so that is at most the few days since the index was built.
+    """
+    index = get_date_index(length)
+    patterns = index.patterns_for_range(first, last)
+    outside = [(first, min(last, index.start - datetime.timedelta(days=1))),
+               (max(first, index.end + datetime.timedelta(days=1)), last)]
+    for start, end in outside:
+        for offset in range((end - start).days + 1):
+            patterns.update(demographic_patterns(start + datetime.timedelta(days=offset), length))
+    return frozenset(patterns)
+
+
+def matches_date_range(mpin, value, length, tolerance_days=0):
+    """Return whether ``mpin`` is a demographic pattern of any date consistent with ``value`` (see ``date_range``)."""
+    dates = date_range(value, tolerance_days)
+    if dates is None or not (len(mpin) == length and mpin.isascii() and mpin.isdigit()):
+        return False
+    return int(mpin) in range_patterns(*dates, length)
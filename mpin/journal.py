@@ -0,0 +1,231 @@
+import argparse
+import itertools
+import json
+import logging
+import os
+import struct
+import threading
+import time
+import zlib
+
+try:
+    import fcntl
+except ImportError:  # Windows: segments are not locked, so give each process its own directory.
+    fcntl = None
+
+logger = logging.getLogger(__name__)
+
+_RECORD_HEADER = struct.Struct("<II")
+_SEGMENT_SUFFIX = ".seg"
+_journal_ids = itertools.count()
+
+
+def _try_lock(file):
+    """Take an exclusive lock on an open segment without waiting; return whether it was taken.
+
+    Locks are per open file, so they also keep apart two Journals on one
+    directory within a process.
+    """
+    if fcntl is None:
+        return True
+    try:
+        fcntl.flock(file.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+    except OSError:
+        return False
+    return True
+
+
+def _is_current(file, path):
+    """Return whether ``path`` still names the open ``file`` (a replay may have removed it meanwhile)."""
+    try:
+        return os.path.samestat(os.fstat(file.fileno()), os.stat(path))
+    except FileNotFoundError:
+        return False
+
+
+class Journal:
+    """Append-only on-disk journal of log records, split into segment files.
+
+    Each record is stored as ``<length><crc32><JSON payload>``. ``append``
+    writes a whole batch and fsyncs once, so the cost of durability is
+    paid per batch rather than per record. A segment is closed once it
+    grows past ``segment_bytes``; ``replay`` seals the open segment and
+    then drains the segments oldest first, deleting each once its records
+    have been written. A torn record at the end of a segment (from a crash
+    mid-append) fails its checksum and ends that segment.
+
+    Several processes (app workers, a manual replay) may share one
+    directory. Each Journal writes only segments it created, named by
+    creation time, process and journal, and holds an exclusive lock on
+    the one it has open; ``replay`` takes only segments it can lock, so
+    it never removes a segment another writer is still appending to.
+    """
+
+    def __init__(self, directory, segment_bytes=16 * 1024 * 1024):
+        self.directory = directory
+        self.segment_bytes = segment_bytes
+        self._lock = threading.Lock()
+        self._file = None
+        self._name = f"{os.getpid()}-{next(_journal_ids)}"
+        self._created = 0
+        self._pending = bool(self.segments())
+
+    def segments(self):
+        if not os.path.isdir(self.directory):
+            return []
+        names = sorted(name for name in os.listdir(self.directory) if name.endswith(_SEGMENT_SUFFIX))
+        return [os.path.join(self.directory, name) for name in names]
+
+    def has_pending(self):
+        return self._pending
+
+    def append(self, records):
+        data = b"".join(_encode(record) for record in records)
+        with self._lock:
+            if self._file is None or self._file.tell() >= self.segment_bytes:
+                self._open_next()
+            self._file.write(data)
+            self._file.flush()
+            os.fsync(self._file.fileno())
+            self._pending = True
+
+    def _open_next(self):
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+        os.makedirs(self.directory, exist_ok=True)
+        while self._file is None:
+            # Named by creation time so that segments replay oldest first.
+            self._created = max(time.time_ns(), self._created + 1)
+            path = os.path.join(self.directory, f"{self._created:020d}-{self._name}{_SEGMENT_SUFFIX}")
+            file = open(path, "ab")
+            # A replay can lock and remove the new file before we lock it.
+            if _try_lock(file) and _is_current(file, path):
+                self._file = file
+            else:
+                file.close()
+
+    def seal(self):
+        """Close the open segment and return every segment waiting to be replayed."""
+        with self._lock:
+            if self._file is not None:
+                self._file.close()
+                self._file = None
+            return self.segments()
+
+    def replay(self, write_batch, batch_size=500):
+        """Write every journaled record through ``write_batch`` in order; return how many were replayed.
+
+        Segments another writer still has open (or another replay is
+        draining) are left alone. Replaying is safe to repeat: if it stops
+        part-way, the segment is kept and its records are written again
+        next time, which the mpin_logs upsert turns into the same final
+        rows.
+        """
+        replayed = 0
+        held = set()
+        for path in self.seal():
+            try:
+                file = open(path, "rb")
+            except FileNotFoundError:
+                continue
+            with file:
+                if not (_try_lock(file) and _is_current(file, path)):
+                    held.add(path)
+                    continue
+                batch = []
+                for record in read_segment(path):
+                    batch.append(record)
+                    if len(batch) == batch_size:
+                        write_batch(batch)
+                        replayed += len(batch)
+                        batch = []
+                if batch:
+                    write_batch(batch)
+                    replayed += len(batch)
+                os.remove(path)
+        with self._lock:
+            self._pending = self._file is not None or bool(set(self.segments()) - held)
+        return replayed
+
+    def close(self):
+        with self._lock:
+            if self._file is not None:
+                self._file.close()
+                self._file = None
+
+
+def _encode(record):
+    payload = json.dumps(record, separators=(",", ":")).encode("utf-8")
+    return _RECORD_HEADER.pack(len(payload), zlib.crc32(payload)) + payload
+
+
+def read_segment(path):
+    """Yield the records of one segment, stopping at the first torn or corrupt record."""
+    with open(path, "rb") as file:
+        while True:
+            header = file.read(_RECORD_HEADER.size)
+            if not header:
+                return
+            if len(header) < _RECORD_HEADER.size:
+                logger.warning("Truncated record header at the end of %s", path)
+                return
+            length, checksum = _RECORD_HEADER.unpack(header)
+            payload = file.read(length)
+            if len(payload) < length or zlib.crc32(payload) != checksum:
+                logger.warning("Corrupt or torn record in %s; ignoring the rest of the segment", path)
+                return
+            record = json.loads(payload)
+            yield tuple(record) if isinstance(record, list) else record
+
+
+class JournaledSink:
+    """Batch writer that falls back to a local journal while the database is down or slow.
+
+    Batches go to ``write_batch`` (the database) unless the previous
+    attempt failed or took longer than ``slow_threshold`` seconds; for the
+    next ``retry_interval`` seconds they are appended to ``journal``
+    instead. Before writing to the database again, anything journaled is
+    replayed first so rows for the same user are applied in order.
+    """
+
+    def __init__(self, write_batch, journal, retry_interval=5.0, slow_threshold=2.0):
+        self.write_batch = write_batch
+        self.journal = journal
+        self.retry_interval = retry_interval
+        self.slow_threshold = slow_threshold
+        self._retry_at = 0.0
+
+    def __call__(self, batch):
+        if time.monotonic() >= self._retry_at:
+            try:
+                if self.journal.has_pending():
+                    replayed = self.journal.replay(self.write_batch)
+                    logger.info("Replayed %d journaled log records", replayed)
+                start = time.monotonic()
+                self.write_batch(batch)
+            except Exception:
+                logger.warning("Database write failed; journaling log records for %.0fs",
+                               self.retry_interval, exc_info=True)
+                self._retry_at = time.monotonic() + self.retry_interval
+            else:
+                if time.monotonic() - start > self.slow_threshold:
+                    self._retry_at = time.monotonic() + self.retry_interval
+                return
+        self.journal.append(batch)
+
+
+def main(argv=None):
+    from mpin import db
+
+    parser = argparse.ArgumentParser(description="Replay journaled evaluation logs into mpin_logs.")
+    parser.add_argument("journal", help="journal directory (DB_JOURNAL_DIR, by default 'journal' next to .env)")
+    parser.add_argument("--env", help="path to the .env file with the DB_* settings")
+    args = parser.parse_args(argv)
+
+    replayed = Journal(args.journal).replay(db.get_store(args.env).upsert_many)
+    print(f"Replayed {replayed} log records into mpin_logs.")
+
+
+if __name__ == "__main__":
+    main()
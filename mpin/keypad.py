@@ -0,0 +1,101 @@
+import itertools
+
+# Phone keypad layout as (row, column):
+#   1 2 3
+#   4 5 6
+#   7 8 9
+#     0
+KEY_POSITIONS = {
+    1: (0, 0), 2: (0, 1), 3: (0, 2),
+    4: (1, 0), 5: (1, 1), 6: (1, 2),
+    7: (2, 0), 8: (2, 1), 9: (2, 2),
+    0: (3, 1),
+}
+_KEYS = {position: key for key, position in KEY_POSITIONS.items()}
+_DIRECTIONS = [(dr, dc) for dr in (-1, 0, 1) for dc in (-1, 0, 1) if (dr, dc) != (0, 0)]
+_KNIGHT_MOVES = [(dr, dc) for dr in (-2, -1, 1, 2) for dc in (-2, -1, 1, 2) if abs(dr) != abs(dc)]
+
+# The outer ring of the 3x3 block, its four corners and the four keys
+# between them (a diamond), each in clockwise order.
+_RING = (1, 2, 3, 6, 9, 8, 7, 4)
+_CORNERS = (1, 3, 9, 7)
+_DIAMOND = (2, 6, 8, 4)
+
+
+def _step(key, move):
+    row, column = KEY_POSITIONS[key]
+    return _KEYS.get((row + move[0], column + move[1]))
+
+
+def _line(start, direction, count):
+    """Return ``count`` keys walking from ``start`` in ``direction``, or ``None`` if it leaves the keypad."""
+    keys = [start]
+    while len(keys) < count:
+        key = _step(keys[-1], direction)
+        if key is None:
+            return None
+        keys.append(key)
+    return tuple(keys)
+
+
+def _straight_lines(length):
+    # The PIN is one straight line (2580), or equal parallel lines of at
+    # least three keys each (147258, 123789).
+    for segment in range(3, length + 1):
+        if length % segment:
+            continue
+        for direction in _DIRECTIONS:
+            lines = [line for line in (_line(key, direction, segment) for key in KEY_POSITIONS) if line]
+            for combination in itertools.product(lines, repeat=length // segment):
+                yield sum(combination, ())
+
+
+def _cycle_walks(cycle, length):
+    for start in range(len(cycle)):
+        for direction in (1, -1):
+            yield tuple(cycle[(start + direction * i) % len(cycle)] for i in range(length))
+
+
+def _corners(length):
+    # Walks around the edge of the 3x3 block turning its corners (1478,
+    # 123698), around the four corner keys (1397, 793179) or around the
+    # diamond between them (2684).
+    for cycle in (_RING, _CORNERS, _DIAMOND):
+        yield from _cycle_walks(cycle, length)
+
+
+def _knight_moves(length):
+    # Every step is a chess knight's move (1834, 167294).
+    walks = [(key,) for key in KEY_POSITIONS]
+    for _ in range(length - 1):
+        walks = [walk + (key,) for walk in walks for key in
+                 (_step(walk[-1], move) for move in _KNIGHT_MOVES) if key is not None]
+    yield from walks
+
+
+def _crosses(length):
+    # Two three-key lines crossing at a shared centre: 159753 and 258456 as
+    # full strokes, 1937 and 2846 as their end points.
+    for center in KEY_POSITIONS:
+        arms = []
+        for direction in _DIRECTIONS:
+            before = _step(center, (-direction[0], -direction[1]))
+            after = _step(center, direction)
+            if before is not None and after is not None:
+                arms.append((before, center, after))
+        for first, second in itertools.permutations(arms, 2):
+            if set(first) == set(second):
+                continue
+            if length == 6:
+                yield first + second
+            elif length == 4:
+                yield (first[0], first[2], second[0], second[2])
+
+
+KEYPAD_RULES = (_straight_lines, _corners, _knight_moves, _crosses)
+
+
+def keypad_patterns(length):
+    """Yield the ``length``-digit PINs (as digit tuples) that trace a keypad shape."""
+    for rule in KEYPAD_RULES:
+        yield from rule(length)
@@ -0,0 +1,93 @@
+import atexit
+import logging
+import queue
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+_STOP = object()
+
+
+class LogWriter:
+    """Write-behind queue for evaluation log records.
+
+    ``submit`` only enqueues; a background thread drains the queue and
+    hands records to ``write_batch`` in lists of up to ``batch_size``,
+    waiting at most ``flush_interval`` seconds to fill a batch. When
+    ``max_queue`` records are waiting, ``submit`` blocks (or raises
+    ``queue.Full`` after ``timeout``) so producers slow down to the rate
+    the database can absorb. Pending records are flushed on ``close`` and
+    at interpreter exit.
+    """
+
+    def __init__(self, write_batch, batch_size=500, flush_interval=0.2, max_queue=10000):
+        self.write_batch = write_batch
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.written = 0
+        self.failed = 0
+        self._queue = queue.Queue(maxsize=max_queue)
+        self._thread = None
+        self._lock = threading.Lock()
+        self._closed = False
+
+    def _start(self):
+        with self._lock:
+            if self._closed:
+                raise RuntimeError("LogWriter is closed")
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="mpin-log-writer", daemon=True)
+                self._thread.start()
+                atexit.register(self.close)
+
+    def submit(self, record, timeout=None):
+        if self._thread is None or self._closed:
+            self._start()
+        self._queue.put(record, timeout=timeout)
+
+    def _run(self):
+        stopping = False
+        while not stopping:
+            item = self._queue.get()
+            if item is _STOP:
+                self._queue.task_done()
+                break
+            batch = [item]
+            deadline = time.monotonic() + self.flush_interval
+            while len(batch) < self.batch_size:
+                remaining = deadline - time.monotonic()
+                try:
+                    item = self._queue.get(timeout=remaining) if remaining > 0 else self._queue.get_nowait()
+                except queue.Empty:
+                    break
+                if item is _STOP:
+                    self._queue.task_done()
+                    stopping = True
+                    break
+                batch.append(item)
+            self._write(batch)
+            for _ in batch:
+                self._queue.task_done()
+
+    def _write(self, batch):
+        try:
+            self.write_batch(batch)
+            self.written += len(batch)
+        except Exception:
+            self.failed += len(batch)
+            logger.exception("Failed to write %d evaluation log records", len(batch))
+
+    def flush(self):
+        """Block until every record submitted so far has been written (or has failed)."""
+        self._queue.join()
+
+    def close(self):
+        with self._lock:
+            if self._closed:
+                return
+            self._closed = True
+            thread = self._thread
+        if thread is not None:
+            self._queue.put(_STOP)
+            thread.join()
@@ -0,0 +1,101 @@
+import functools
+import weakref
+
+from mpin.date_index import get_date_index
+from mpin.demographics import demographic_patterns, parse_date
+from mpin.pin_index import PinIndex
+
+
+def neighbours(pin, length):
+    """Yield the PINs one edit away from integer ``pin``: one digit changed, or two adjacent digits swapped."""
+    digits = [pin // 10 ** (length - 1 - i) % 10 for i in range(length)]
+    for i in range(length):
+        place = 10 ** (length - 1 - i)
+        for digit in range(10):
+            if digit != digits[i]:
+                yield pin + (digit - digits[i]) * place
+    for i in range(length - 1):
+        if digits[i] != digits[i + 1]:
+            high, low = 10 ** (length - 1 - i), 10 ** (length - 2 - i)
+            yield pin + (digits[i + 1] - digits[i]) * high + (digits[i] - digits[i + 1]) * low
+
+
+def build_near_index(index):
+    """Return a PinIndex of every PIN one edit away from a PIN in ``index`` but not in it."""
+    pins = [n for byte, value in enumerate(index.bits) if value
+            for n in range(byte * 8, byte * 8 + 8) if value >> (n & 7) & 1]
+    near = PinIndex(index.length)
+    for pin in pins:
+        for neighbour in neighbours(pin, index.length):
+            near.bits[neighbour >> 3] |= 1 << (neighbour & 7)
+    for pin in pins:
+        near.bits[pin >> 3] &= ~(1 << (pin & 7))
+    return near
+
+
+_near_indexes = weakref.WeakKeyDictionary()
+
+
+def near_index(index):
+    """Return the (cached) near-miss index for a blocklist PinIndex.
+
+    The cache is keyed by the PinIndex object, so each blocklist snapshot
+    builds its neighbourhood once; Blocklist does so when it loads a list.
+    """
+    near = _near_indexes.get(index)
+    if near is None:
+        near = _near_indexes[index] = build_near_index(index)
+    return near
+
+
+def is_near_common(mpin, common_pins, length):
+    """Return whether ``mpin`` is one edit away from a PIN in ``common_pins`` (and not in it)."""
+    if isinstance(common_pins, PinIndex):
+        return mpin in near_index(common_pins)
+    if not (len(mpin) == length and mpin.isascii() and mpin.isdigit()) or mpin in common_pins:
+        return False
+    return any(str(neighbour).zfill(length) in common_pins for neighbour in neighbours(int(mpin), length))
+
+
+# Per length, ``(place, tag)`` for each digit: a PIN with that digit
+# blanked out and the place tagged on top (so it cannot collide with a
+# plain PIN) is a key two PINs share exactly when they differ in at most
+# that digit. And ``(place, higher place)`` for each pair of neighbouring
+# digits, to swap them.
+_MASKS = {length: tuple((10 ** i, (i + 1) * 10 ** length) for i in range(length)) for length in (4, 6)}
+_SWAPS = {length: tuple((10 ** i, 10 ** (i + 1)) for i in range(length - 1)) for length in (4, 6)}
+
+
+@functools.lru_cache(maxsize=1024)
+def date_neighbourhood(date, length):
+    """Return ``(patterns, keys)`` for the demographic patterns of ``date``.
+
+    ``keys`` holds the blanked-digit keys of every pattern and the patterns
+    with two neighbouring digits swapped. It is built once per date (a
+    user's dates are checked against many PINs) and is much smaller than
+    the full one-edit neighbourhood, which for six digits is some 800 PINs.
+    """
+    patterns = get_date_index(length).patterns_for_date(date)
+    if patterns is None:
+        patterns = demographic_patterns(date, length)
+    keys = {pattern - pattern // place % 10 * place + tag for pattern in patterns for place, tag in _MASKS[length]}
+    keys.update([pattern + (pattern // high % 10 - pattern // place % 10) * (place - high)
+                 for pattern in patterns for place, high in _SWAPS[length]])
+    return frozenset(patterns), frozenset(keys)
+
+
+def is_near_date(mpin, date, length):
+    """Return whether ``mpin`` is one edit away from (but not equal to) a demographic pattern of ``date``."""
+    date = parse_date(date)
+    if date is None or not (len(mpin) == length and mpin.isascii() and mpin.isdigit()):
+        return False
+    patterns, keys = date_neighbourhood(date, length)
+    pin = int(mpin)
+    if pin in patterns:
+        return False
+    if pin in keys:
+        return True
+    for place, tag in _MASKS[length]:
+        if pin - pin // place % 10 * place + tag in keys:
+            return True
+    return False
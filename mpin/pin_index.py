@@ -0,0 +1,82 @@
+import zlib
+
+
+class PinIndex:
+    """Bitmap over the whole keyspace of ``length``-digit PINs.
+
+    Bit ``n`` is set when the PIN whose integer value is ``n`` is in the
+    index. The length is fixed per index, so ``"0123"`` and ``123`` are the
+    same key and leading zeros never collide. A 6-digit index is 125 KB.
+    """
+
+    def __init__(self, length, bits=None):
+        self.length = length
+        self.size = 10 ** length
+        if bits is None:
+            bits = bytearray((self.size + 7) // 8)
+        self.bits = bits
+
+    @classmethod
+    def from_pins(cls, pins, length):
+        index = cls(length)
+        for pin in pins:
+            index.add(pin)
+        return index
+
+    @classmethod
+    def from_file(cls, file_path, length):
+        index = cls(length)
+        with open(file_path, 'r') as file:
+            for line in file:
+                pin = line.strip()
+                if len(pin) == length and pin.isdigit():
+                    index.add(pin)
+        return index
+
+    def key(self, pin):
+        """Return the integer key for ``pin``, or ``None`` if it is not a valid PIN of this length."""
+        if isinstance(pin, str):
+            if len(pin) != self.length or not (pin.isascii() and pin.isdigit()):
+                return None
+            return int(pin)
+        if isinstance(pin, int) and 0 <= pin < self.size:
+            return pin
+        return None
+
+    def add(self, pin):
+        n = self.key(pin)
+        if n is None:
+            raise ValueError(f"Not a {self.length}-digit PIN: {pin!r}")
+        self.bits[n >> 3] |= 1 << (n & 7)
+
+    def __contains__(self, pin):
+        n = self.key(pin)
+        return n is not None and bool(self.bits[n >> 3] >> (n & 7) & 1)
+
+    def __iter__(self):
+        for n in range(self.size):
+            if self.bits[n >> 3] >> (n & 7) & 1:
+                yield str(n).zfill(self.length)
+
+    def __len__(self):
+        return bin(int.from_bytes(self.bits, "little")).count("1")
+
+    @property
+    def nbytes(self):
+        return len(self.bits)
+
+    @property
+    def fingerprint(self):
+        """CRC32 of the bitmap: the same for every process that loaded the same PINs."""
+        return zlib.crc32(self.bits)
+
+    def contains_many(self, pins):
+        """Vectorized membership for an integer array of PINs (requires NumPy)."""
+        import numpy as np
+
+        pins = np.asarray(pins, dtype=np.int64)
+        valid = (pins >= 0) & (pins < self.size)
+        safe = np.where(valid, pins, 0)
+        bits = np.frombuffer(self.bits, dtype=np.uint8)
+        return valid & ((bits[safe >> 3] >> (safe & 7)) & 1).astype(bool)
+
@@ -0,0 +1,158 @@
+import threading
+import time
+from collections import OrderedDict
+
+from mpin import reasons
+from mpin.date_index import get_date_index
+from mpin.demographics import demographic_patterns, parse_date
+from mpin.embedded import FRAGMENT_LENGTH, LENGTHS, contains_common, windows
+from mpin.fuzzy import fuzzy_date, range_patterns
+from mpin.near import _MASKS, date_neighbourhood, is_near_common
+from mpin.structure import structural_mask
+
+# The dates every checker asks for, each with its own reason. A date
+# under any other label (a child's or parent's birthday) is
+# DEMOGRAPHIC_OTHER.
+STANDARD_DATES = {
+    "dob_self": reasons.DEMOGRAPHIC_DOB_SELF,
+    "dob_spouse": reasons.DEMOGRAPHIC_DOB_SPOUSE,
+    "anniversary": reasons.DEMOGRAPHIC_ANNIVERSARY,
+}
+
+
+def labelled_dates(dob_self=None, dob_spouse=None, anniversary=None, other_dates=None, fuzzy=False,
+                   tolerance_days=0):
+    """Return ``((label, date), ...)`` for the three standard dates and ``other_dates``.
+
+    ``other_dates`` maps labels to dates, or is a list of ``(label, date)``
+    pairs. Dates are date objects or DD-MM-YYYY strings; empty and invalid
+    ones are left out. With ``fuzzy``, a date may also be partial (MM-YYYY
+    or YYYY) or off by up to ``tolerance_days``, and such a date becomes the
+    ``(first, last)`` range of the dates it could be (see
+    ``fuzzy.fuzzy_date``). Ranges already made are kept as they are.
+    """
+    pairs = list(zip(STANDARD_DATES, (dob_self, dob_spouse, anniversary)))
+    if other_dates:
+        pairs.extend(other_dates.items() if isinstance(other_dates, dict) else other_dates)
+    def parse(value):
+        if isinstance(value, tuple):
+            return value
+        return fuzzy_date(value, tolerance_days) if fuzzy else parse_date(value)
+    return tuple((label, date) for label, date in ((label, parse(date) if date else None)
+                                                   for label, date in pairs) if date is not None)
+
+
+def _patterns(date, length):
+    patterns = get_date_index(length).patterns_for_date(date)
+    return patterns if patterns is not None else demographic_patterns(date, length)
+
+
+class UserProfile:
+    """One user's labelled dates compiled for checking many candidate PINs.
+
+    ``dates`` is a sequence of ``(label, date)`` pairs (see
+    ``labelled_dates``), as many as the user has. They are merged into one
+    index: ``labels`` maps every pattern of any date to the labels whose
+    dates produce it and ``demographic`` to their DEMOGRAPHIC_* bits;
+    ``near_keys`` holds the blanked-digit and swapped keys of all of them
+    (see ``near.date_neighbourhood``) and ``fragments`` their 4-digit
+    patterns, for the 6-digit CONTAINS_DEMOGRAPHIC check. Each candidate is
+    then a handful of set lookups however many dates there are, with the
+    same result as ``evaluate_strength_and_reasons``.
+
+    A date range (from fuzzy mode) only counts exact patterns: the patterns
+    of a whole year already cover much of the keyspace, and their near
+    misses and fragments would cover nearly all of it.
+    """
+
+    def __init__(self, dates, length):
+        self.length = length
+        self.dates = tuple(dates)
+        self.labels = {}
+        self.demographic = {}
+        near_keys = set()
+        fragments = set()
+        for label, date in self.dates:
+            bit = STANDARD_DATES.get(label, reasons.DEMOGRAPHIC_OTHER)
+            ranged = isinstance(date, tuple)
+            for pattern in range_patterns(*date, length) if ranged else _patterns(date, length):
+                self.labels[pattern] = self.labels.get(pattern, ()) + (label,)
+                self.demographic[pattern] = self.demographic.get(pattern, 0) | bit
+            if ranged:
+                continue
+            near_keys.update(date_neighbourhood(date, length)[1])
+            if length in LENGTHS:
+                fragments.update(_patterns(date, FRAGMENT_LENGTH))
+        self.near_keys = frozenset(near_keys)
+        self.fragments = frozenset(fragments)
+
+    def matched_labels(self, mpin):
+        """Return the labels of the dates ``mpin`` is a demographic pattern of, in the order given."""
+        if not (len(mpin) == self.length and mpin.isascii() and mpin.isdigit()):
+            return ()
+        return self.labels.get(int(mpin), ())
+
+    def date_mask(self, mpin):
+        """Return the reason bits ``mpin`` gets from this user's dates."""
+        if not (len(mpin) == self.length and mpin.isascii() and mpin.isdigit()):
+            return 0
+        pin = int(mpin)
+        mask = self.demographic.get(pin, 0)
+        if mask:
+            return mask
+        if pin in self.near_keys or any(pin - pin // place % 10 * place + tag in self.near_keys
+                                        for place, tag in _MASKS[self.length]):
+            mask |= reasons.NEAR_DEMOGRAPHIC
+        if self.fragments and not self.fragments.isdisjoint(windows(pin, self.length)):
+            mask |= reasons.CONTAINS_DEMOGRAPHIC
+        return mask
+
+    def evaluate(self, mpin, common_pins, fragments=None):
+        """``evaluate_strength_and_reasons`` for ``mpin`` with this profile's dates."""
+        mask = self.date_mask(mpin) | structural_mask(mpin, self.length)
+        if mpin in common_pins:
+            mask |= reasons.COMMONLY_USED
+        else:
+            if is_near_common(mpin, common_pins, self.length):
+                mask |= reasons.NEAR_COMMON
+            if contains_common(mpin, self.length, fragments):
+                mask |= reasons.CONTAINS_COMMON
+        reason_list = reasons.mask_to_reasons(mask)
+        return reasons.mask_strength(mask), reason_list
+
+
+class ProfileCache:
+    """Compiled profiles by user, least recently used first out.
+
+    A profile is reused for ``ttl`` seconds while the user's dates stay the
+    same, so a user trying several PINs in a row compiles their dates once.
+    Safe to share between threads.
+    """
+
+    def __init__(self, maxsize=10000, ttl=900.0, clock=time.monotonic):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.clock = clock
+        self._profiles = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, user_id, dates, length):
+        """Return the profile of ``user_id`` for ``dates`` (see ``labelled_dates``), compiling it if there is no fresh one."""
+        key = (user_id, length)
+        dates = tuple(dates)
+        now = self.clock()
+        with self._lock:
+            entry = self._profiles.get(key)
+            if entry is not None and entry[0] > now and entry[1].dates == dates:
+                self._profiles.move_to_end(key)
+                return entry[1]
+        profile = UserProfile(dates, length)
+        with self._lock:
+            self._profiles[key] = (now + self.ttl, profile)
+            self._profiles.move_to_end(key)
+            while len(self._profiles) > self.maxsize:
+                self._profiles.popitem(last=False)
+        return profile
+
+    def __len__(self):
+        return len(self._profiles)
@@ -0,0 +1,61 @@
+# Reason codes in the order evaluate_strength_and_reasons reports them.
+# Bit ``i`` of a reason mask stands for ``REASONS[i]``.
+REASONS = (
+    "COMMONLY_USED",
+    "DEMOGRAPHIC_DOB_SELF",
+    "DEMOGRAPHIC_DOB_SPOUSE",
+    "DEMOGRAPHIC_ANNIVERSARY",
+    "REPEATED_DIGITS",
+    "SEQUENTIAL",
+    "ARITHMETIC_PROGRESSION",
+    "PALINDROME",
+    "REPEATED_PATTERN",
+    "KEYPAD_PATTERN",
+    "NEAR_COMMON",
+    "NEAR_DEMOGRAPHIC",
+    "CONTAINS_COMMON",
+    "CONTAINS_DEMOGRAPHIC",
+    "DEMOGRAPHIC_OTHER",
+)
+REASON_BITS = {name: 1 << bit for bit, name in enumerate(REASONS)}
+
+COMMONLY_USED = REASON_BITS["COMMONLY_USED"]
+DEMOGRAPHIC_DOB_SELF = REASON_BITS["DEMOGRAPHIC_DOB_SELF"]
+DEMOGRAPHIC_DOB_SPOUSE = REASON_BITS["DEMOGRAPHIC_DOB_SPOUSE"]
+DEMOGRAPHIC_ANNIVERSARY = REASON_BITS["DEMOGRAPHIC_ANNIVERSARY"]
+REPEATED_DIGITS = REASON_BITS["REPEATED_DIGITS"]
+SEQUENTIAL = REASON_BITS["SEQUENTIAL"]
+ARITHMETIC_PROGRESSION = REASON_BITS["ARITHMETIC_PROGRESSION"]
+PALINDROME = REASON_BITS["PALINDROME"]
+REPEATED_PATTERN = REASON_BITS["REPEATED_PATTERN"]
+KEYPAD_PATTERN = REASON_BITS["KEYPAD_PATTERN"]
+NEAR_COMMON = REASON_BITS["NEAR_COMMON"]
+NEAR_DEMOGRAPHIC = REASON_BITS["NEAR_DEMOGRAPHIC"]
+CONTAINS_COMMON = REASON_BITS["CONTAINS_COMMON"]
+CONTAINS_DEMOGRAPHIC = REASON_BITS["CONTAINS_DEMOGRAPHIC"]
+DEMOGRAPHIC_OTHER = REASON_BITS["DEMOGRAPHIC_OTHER"]
+
+# Reasons that are reported but do not make a PIN WEAK on their own. The
+# neighbourhood of the 4-digit list covers over 40% of that keyspace.
+ADVISORY = NEAR_COMMON
+
+# Strength codes used by the batch evaluator.
+STRENGTHS = ("STRONG", "WEAK")
+STRONG = 0
+WEAK = 1
+
+
+def mask_strength(mask):
+    """Return "WEAK" if ``mask`` has a reason bit other than the ADVISORY ones, else "STRONG"."""
+    return STRENGTHS[WEAK if mask & ~ADVISORY else STRONG]
+
+
+def reasons_to_mask(reasons):
+    mask = 0
+    for reason in reasons:
+        mask |= REASON_BITS[reason]
+    return mask
+
+
+def mask_to_reasons(mask):
+    return [name for bit, name in enumerate(REASONS) if mask >> bit & 1]
@@ -0,0 +1,376 @@
+import argparse
+import asyncio
+import datetime
+import json
+import logging
+import os
+import queue
+import threading
+
+from mpin import db, engine, frequency
+from mpin.blocklist import Blocklist
+from mpin.coalescer import Coalescer
+from mpin.date_index import get_date_index
+from mpin.demographics import parse_date
+from mpin.fuzzy import MAX_TOLERANCE_DAYS, fuzzy_date
+from mpin.profile import ProfileCache, UserProfile, labelled_dates
+
+logger = logging.getLogger(__name__)
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+BLOCKLIST_PATHS = {
+    4: os.path.join(ROOT_DIR, "4 digits pin", "common_pins.txt"),
+    6: os.path.join(ROOT_DIR, "6 digits pin", "common-pins.txt"),
+}
+DATE_FIELDS = ("dob_self", "dob_spouse", "anniversary")
+MAX_BODY_BYTES = 8 * 1024 * 1024
+MAX_BATCH_ITEMS = 10000
+MAX_OTHER_DATES = 100
+
+_REASON_PHRASES = {200: "OK", 400: "Bad Request", 404: "Not Found", 405: "Method Not Allowed",
+                   413: "Payload Too Large", 500: "Internal Server Error"}
+
+
+class RequestError(Exception):
+    def __init__(self, message, status=400):
+        super().__init__(message)
+        self.status = status
+
+
+def _request_date(item, field, fuzzy=False, tolerance_days=0):
+    value = item.get(field)
+    if not value:
+        return None
+    date = parse_date(value)
+    if date is None:
+        try:
+            date = datetime.date.fromisoformat(value)
+        except (TypeError, ValueError):
+            pass
+    if fuzzy:
+        # A date, or the (first, last) range of a partial or uncertain one.
+        date = fuzzy_date(date or value, tolerance_days)
+    if date is None:
+        formats = "DD-MM-YYYY, YYYY-MM-DD, MM-YYYY or YYYY date (ranges from 1950 to today)" if fuzzy \
+            else "DD-MM-YYYY or YYYY-MM-DD date"
+        raise RequestError(f"{field} must be a {formats}")
+    return date
+
+
+def _request_fuzzy(item):
+    tolerance_days = item.get("tolerance_days", 0)
+    if not isinstance(tolerance_days, int) or isinstance(tolerance_days, bool) or \
+            not 0 <= tolerance_days <= MAX_TOLERANCE_DAYS:
+        raise RequestError(f"tolerance_days must be a whole number of days from 0 to {MAX_TOLERANCE_DAYS}")
+    if not isinstance(item.get("fuzzy", False), bool):
+        raise RequestError("fuzzy must be true or false")
+    return item.get("fuzzy", False) or tolerance_days > 0, tolerance_days
+
+
+def _request_other_dates(item, fuzzy=False, tolerance_days=0):
+    other_dates = item.get("other_dates") or {}
+    if not isinstance(other_dates, dict):
+        raise RequestError("other_dates must be an object mapping labels to dates")
+    if len(other_dates) > MAX_OTHER_DATES:
+        raise RequestError(f"at most {MAX_OTHER_DATES} other_dates")
+    for label in other_dates:
+        if not label or len(label) > 64 or label in DATE_FIELDS:
+            raise RequestError(f"other_dates label {label!r} must be 1-64 characters and not one of {', '.join(DATE_FIELDS)}")
+    return tuple((label, date) for label in other_dates
+                 for date in [_request_date(other_dates, label, fuzzy, tolerance_days)] if date is not None)
+
+
+def parse_item(item, default_length=None):
+    """Validate one evaluation request; return ``(length, mpin, dates, user_id, other_dates)``.
+
+    ``other_dates`` holds ``(label, date)`` pairs for the request's
+    ``other_dates`` object, if any. With ``"fuzzy": true`` (or a
+    ``tolerance_days``), a date may be partial or uncertain and is then a
+    ``(first, last)`` range.
+    """
+    if not isinstance(item, dict):
+        raise RequestError("each evaluation must be a JSON object")
+    mpin = item.get("mpin")
+    if not isinstance(mpin, str) or not (mpin.isascii() and mpin.isdigit()):
+        raise RequestError("mpin must be a string of digits")
+    length = item.get("length", default_length) or len(mpin)
+    if not isinstance(length, int) or isinstance(length, bool) or length not in BLOCKLIST_PATHS:
+        raise RequestError("length must be 4 or 6")
+    if len(mpin) != length:
+        raise RequestError(f"MPIN must be exactly {length} digits.")
+    user_id = item.get("user_id")
+    if user_id is not None and not isinstance(user_id, str):
+        raise RequestError("user_id must be a string")
+    fuzzy, tolerance_days = _request_fuzzy(item)
+    dates = tuple(_request_date(item, field, fuzzy, tolerance_days) for field in DATE_FIELDS)
+    return length, mpin, dates, user_id, _request_other_dates(item, fuzzy, tolerance_days)
+
+
+class EvaluationService:
+    """Evaluates MPINs for the HTTP handlers.
+
+    The blocklists (hot-reloaded), demographic date indexes and any
+    compiled frequency tables are loaded once when the service starts. Concurrent ``/evaluate`` calls are
+    coalesced into batches (see ``Coalescer``) so the engine runs once per
+    batch rather than once per request; the dates of a user who tries several PINs
+    in a row are compiled once (see ``ProfileCache``). Evaluation runs on worker
+    threads, off the event loop. When ``env_path`` is given, evaluations
+    carrying a ``user_id`` are queued for mpin_logs on the write-behind
+    logger without waiting; if its queue is full the record is dropped and
+    counted rather than delaying the response.
+    """
+
+    def __init__(self, blocklists, env_path=None, max_batch_size=256, max_wait=0.0):
+        self.blocklists = blocklists
+        self.env_path = env_path
+        self.dropped_logs = 0
+        self._dropped_lock = threading.Lock()
+        self.coalescer = Coalescer(self.evaluate_items, max_batch_size, max_wait)
+        self.profiles = ProfileCache()
+        self.frequency_tables = {}
+        for length in blocklists:
+            get_date_index(length)
+            self.frequency_tables[length] = frequency.get_frequency_table(length)
+        if env_path:
+            db.get_writer(env_path)
+
+    def evaluate_items(self, items):
+        """Evaluate parsed requests with one vectorized engine call per length; results keep input order.
+
+        An item that fails gets its exception as its result, so a
+        coalesced batch fails only the caller whose item it was.
+        """
+        results = [None] * len(items)
+        by_length = {}
+        for i, item in enumerate(items):
+            by_length.setdefault(item[0], []).append(i)
+        for length, rows in by_length.items():
+            common_pins = self.blocklists[length].snapshot()
+            # 6-digit PINs are also searched for the 4-digit blocklist's PINs.
+            fragment_list = self.blocklists[4].snapshot() if length != 4 and 4 in self.blocklists else None
+            fragments = fragment_list.index if fragment_list is not None else None
+            profiles = []
+            for i in rows:
+                try:
+                    profiles.append(self._profile(items[i], len(rows)))
+                except Exception as e:
+                    logger.exception("Evaluation of one item failed")
+                    results[i] = e
+            rows = [i for i in rows if results[i] is None]
+            try:
+                evaluations = self._evaluate_rows(items, rows, length, common_pins, fragments, profiles)
+            except Exception:
+                # Find the rows that fail by evaluating them one by one.
+                evaluations = []
+                for i, profile in zip(rows, profiles):
+                    try:
+                        evaluations.extend(self._evaluate_rows(items, [i], length, common_pins, fragments, [profile]))
+                    except Exception as e:
+                        logger.exception("Evaluation of one item failed")
+                        evaluations.append(e)
+            for i, profile, evaluation in zip(rows, profiles, evaluations):
+                if isinstance(evaluation, Exception):
+                    results[i] = evaluation
+                    continue
+                try:
+                    results[i] = self._result(items[i], profile, evaluation, common_pins, fragment_list)
+                except Exception as e:
+                    logger.exception("Evaluation of one item failed")
+                    results[i] = e
+        return results
+
+    def _evaluate_rows(self, items, rows, length, common_pins, fragments, profiles):
+        mpins = [items[i][1] for i in rows]
+        # Date ranges (fuzzy mode) are left to the rows' profiles.
+        dates = [[date if not isinstance(date, tuple) else None for date in (items[i][2][column] for i in rows)]
+                 for column in range(len(DATE_FIELDS))]
+        return engine.evaluate_many(mpins, common_pins.index, *dates, length, fragments, profiles)
+
+    def _result(self, item, profile, evaluation, common_pins, fragment_list=None):
+        length, mpin, item_dates, user_id, other_dates = item
+        strength, reasons = evaluation
+        result = {"strength": strength, "reasons": reasons, "blocklist_version": common_pins.version}
+        fragment_version = fragment_list.version if fragment_list is not None else None
+        if fragment_version is not None:
+            result["fragment_blocklist_version"] = fragment_version
+        if other_dates or any(isinstance(date, tuple) for date in item_dates):
+            result["matched_dates"] = list(profile.matched_labels(mpin))
+        table = self.frequency_tables.get(length)
+        if table is not None:
+            rank = frequency.guess_rank(mpin, reasons, length, common_pins.index, table)
+            result["guess_rank"] = rank
+            result["score"] = frequency.score(rank, length)
+        if user_id is not None:
+            result["user_id"] = user_id
+            self._log(user_id, mpin, strength, reasons, item_dates, common_pins.version, other_dates, fragment_version)
+        return result
+
+    def _profile(self, item, batch_size):
+        """Return the UserProfile to evaluate ``item`` with, or ``None`` for the batch evaluator.
+
+        Users picking a new PIN try several in a row, so their compiled
+        dates are cached by user_id. Large batches skip profiles unless the
+        item has other dates or date ranges, which only a profile checks.
+        """
+        length, _, dates, user_id, other_dates = item
+        ranged = any(isinstance(date, tuple) for date in dates)
+        if not (other_dates or ranged) and (user_id is None or batch_size >= engine.VECTORIZE_MIN_ROWS):
+            return None
+        dates = labelled_dates(*dates, other_dates)
+        if user_id is None:
+            return UserProfile(dates, length)
+        return self.profiles.get(user_id, dates, length)
+
+    def _log(self, user_id, mpin, strength, reasons, dates, blocklist_version, other_dates=None,
+             fragment_blocklist_version=None):
+        if not self.env_path:
+            return
+        try:
+            db.log_evaluation(user_id, mpin, strength, reasons, *dates, blocklist_version,
+                              env_path=self.env_path, timeout=0, other_dates=other_dates,
+                              fragment_blocklist_version=fragment_blocklist_version)
+        except queue.Full:
+            with self._dropped_lock:
+                self.dropped_logs += 1
+            logger.warning("Log queue full; dropped the log record for user %s", user_id)
+
+    async def evaluate_one(self, body):
+        return await self.coalescer.submit(parse_item(body))
+
+    def evaluate_batch(self, body):
+        if not isinstance(body, dict) or not isinstance(body.get("items"), list):
+            raise RequestError("body must be an object with an 'items' list")
+        if len(body["items"]) > MAX_BATCH_ITEMS:
+            raise RequestError(f"at most {MAX_BATCH_ITEMS} items per batch", 413)
+        results, items, rows = [], [], []
+        for item in body["items"]:
+            try:
+                items.append(parse_item(item, body.get("length")))
+                rows.append(len(results))
+                results.append(None)
+            except RequestError as e:
+                results.append({"error": str(e)})
+        for i, result in zip(rows, self.evaluate_items(items)):
+            results[i] = {"error": "evaluation failed"} if isinstance(result, Exception) else result
+        return {"results": results}
+
+    def health(self):
+        return {
+            "status": "ok",
+            "blocklist_versions": {str(length): blocklist.version for length, blocklist in self.blocklists.items()},
+            "dropped_logs": self.dropped_logs,
+        }
+
+    def metrics(self):
+        return self.coalescer.metrics.snapshot()
+
+    async def dispatch(self, method, path, body):
+        if path == "/health":
+            if method != "GET":
+                raise RequestError("use GET", 405)
+            return self.health()
+        if path == "/metrics":
+            if method != "GET":
+                raise RequestError("use GET", 405)
+            return self.metrics()
+        if path in ("/evaluate", "/evaluate/batch"):
+            if method != "POST":
+                raise RequestError("use POST", 405)
+            try:
+                payload = json.loads(body or b"null")
+            except ValueError:
+                raise RequestError("body must be valid JSON")
+            if path == "/evaluate":
+                return await self.evaluate_one(payload)
+            # Compiling fuzzy dates can take a while; keep the event loop serving other connections.
+            return await asyncio.to_thread(self.evaluate_batch, payload)
+        raise RequestError("not found", 404)
+
+
+async def _read_request(reader):
+    head = await reader.readuntil(b"\r\n\r\n")
+    lines = head.decode("latin-1").split("\r\n")
+    method, target, version = lines[0].split(" ", 2)
+    headers = {}
+    for line in lines[1:]:
+        if line:
+            name, _, value = line.partition(":")
+            headers[name.strip().lower()] = value.strip()
+    length = int(headers.get("content-length", "0"))
+    if length > MAX_BODY_BYTES:
+        raise RequestError("request body too large", 413)
+    body = await reader.readexactly(length) if length else b""
+    keep_alive = headers.get("connection", "").lower() != "close" and version == "HTTP/1.1"
+    return method, target.split("?", 1)[0], body, keep_alive
+
+
+def _response(status, payload, keep_alive):
+    body = json.dumps(payload).encode("utf-8")
+    head = (f"HTTP/1.1 {status} {_REASON_PHRASES.get(status, '')}\r\n"
+            f"Content-Type: application/json\r\n"
+            f"Content-Length: {len(body)}\r\n"
+            f"Connection: {'keep-alive' if keep_alive else 'close'}\r\n\r\n")
+    return head.encode("latin-1") + body
+
+
+async def handle_connection(service, reader, writer):
+    """Serve HTTP/1.1 requests on one (keep-alive) connection."""
+    try:
+        while True:
+            try:
+                method, path, body, keep_alive = await _read_request(reader)
+            except (asyncio.IncompleteReadError, ConnectionError):
+                break
+            except (asyncio.LimitOverrunError, ValueError):
+                writer.write(_response(400, {"error": "malformed request"}, False))
+                break
+            except RequestError as e:
+                writer.write(_response(e.status, {"error": str(e)}, False))
+                break
+
+            try:
+                status, payload = 200, await service.dispatch(method, path, body)
+            except RequestError as e:
+                status, payload = e.status, {"error": str(e)}
+            except Exception:
+                logger.exception("Error handling %s %s", method, path)
+                status, payload = 500, {"error": "internal error"}
+            writer.write(_response(status, payload, keep_alive))
+            await writer.drain()
+            if not keep_alive:
+                break
+    finally:
+        writer.close()
+
+
+async def serve(service, host="127.0.0.1", port=8080):
+    server = await asyncio.start_server(lambda r, w: handle_connection(service, r, w), host, port)
+    logger.info("Serving MPIN evaluations on %s", ", ".join(str(s.getsockname()) for s in server.sockets))
+    async with server:
+        await server.serve_forever()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="HTTP service for 4- and 6-digit MPIN evaluation.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8080)
+    parser.add_argument("--env", help=".env file with DB_* settings; enables logging to mpin_logs")
+    parser.add_argument("--batch-window", type=float, default=0.0,
+                        help="milliseconds to hold a batch open for more /evaluate calls (0: batch only what is already waiting)")
+    parser.add_argument("--max-batch-size", type=int, default=256)
+    parser.add_argument("--poll-interval", type=float, default=5.0, help="seconds between blocklist file checks")
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(name)s: %(message)s")
+    blocklists = {length: Blocklist(path, length, args.poll_interval).start()
+                  for length, path in BLOCKLIST_PATHS.items()}
+    service = EvaluationService(blocklists, env_path=args.env, max_batch_size=args.max_batch_size,
+                                max_wait=args.batch_window / 1000)
+    try:
+        asyncio.run(serve(service, args.host, args.port))
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
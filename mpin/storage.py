@@ -0,0 +1,189 @@
+import datetime
+import json
+import sqlite3
+import threading
+
+from mpin.reasons import REASONS, STRENGTHS, mask_to_reasons
+
+# Columns of mpin_evaluations in the order of the db.log_params tuple,
+# which every store's upsert takes. strength is an index into STRENGTHS
+# and reasons a bitmask over REASONS (see migrations/002). other_dates is
+# a JSON object of any further labelled dates (see migrations/007), and
+# fragment_blocklist_version the version of the 4-digit list a 6-digit
+# PIN was searched for (see migrations/008).
+LOG_COLUMNS = ("user_id", "mpin", "length", "strength", "reasons",
+               "dob_self", "dob_spouse", "anniversary", "blocklist_version", "other_dates",
+               "fragment_blocklist_version")
+DATE_COLUMNS = ("dob_self", "dob_spouse", "anniversary")
+
+
+def _record(row, timestamp):
+    """Turn stored values into the dict ``get`` returns.
+
+    ``strength`` and ``reason_json`` are decoded to the text the mpin_logs
+    view shows; ``reasons`` keeps the bitmask. Dates come back as date
+    objects on every backend, ``other_dates`` as a dict of them by label
+    (a fuzzy-mode range as a ``(first, last)`` tuple).
+    """
+    record = dict(zip(LOG_COLUMNS, row))
+    record["mpin"] = record["mpin"].rstrip()
+    record["strength"] = STRENGTHS[record["strength"]]
+    record["reason_json"] = ', '.join(mask_to_reasons(record["reasons"]))
+    for column in DATE_COLUMNS:
+        if isinstance(record[column], str):
+            record[column] = datetime.date.fromisoformat(record[column])
+    other_dates = json.loads(record["other_dates"]) if record["other_dates"] else {}
+    record["other_dates"] = {label: tuple(map(datetime.date.fromisoformat, date.split("/"))) if "/" in date
+                             else datetime.date.fromisoformat(date) for label, date in other_dates.items()}
+    if isinstance(timestamp, str):
+        timestamp = datetime.datetime.fromisoformat(timestamp)
+    record["timestamp"] = timestamp
+    return record
+
+
+def compat_view_sql(dialect):
+    """Return the CREATE VIEW for ``mpin_logs``: mpin_evaluations with the old text columns."""
+    strength = " ".join(f"WHEN {code} THEN '{name}'" for code, name in enumerate(STRENGTHS))
+    parts = [f"CASE WHEN reasons & {1 << bit} THEN ', {name}' ELSE '' END" for bit, name in enumerate(REASONS)]
+    if dialect == "mysql":
+        reason_text = "CONCAT(\n        " + ",\n        ".join(parts) + "\n    )"
+    else:
+        reason_text = "(\n        " + "\n        || ".join(parts) + "\n    )"
+    create = "CREATE OR REPLACE VIEW" if dialect == "mysql" else "CREATE VIEW"
+    return f"""{create} mpin_logs AS
+SELECT
+    user_id,
+    mpin,
+    length,
+    CASE strength {strength} END AS strength,
+    SUBSTR({reason_text}, 3) AS reason_json,
+    dob_self,
+    dob_spouse,
+    anniversary,
+    timestamp,
+    blocklist_version,
+    other_dates,
+    fragment_blocklist_version
+FROM mpin_evaluations"""
+
+
+class MemoryStore:
+    """mpin_evaluations kept in a dict, for tests and local runs without a database.
+
+    Like the MySQL and SQLite stores, ``upsert`` returns 1 when it inserts
+    a row and 2 when it replaces the row for an existing ``user_id``.
+    """
+
+    def __init__(self):
+        self._rows = {}
+        self._lock = threading.Lock()
+
+    def upsert(self, params):
+        with self._lock:
+            existed = params[0] in self._rows
+            self._rows[params[0]] = (tuple(params), datetime.datetime.now().replace(microsecond=0))
+        return 2 if existed else 1
+
+    def upsert_many(self, params_list):
+        for params in params_list:
+            self.upsert(params)
+
+    def get(self, user_id):
+        with self._lock:
+            entry = self._rows.get(user_id)
+        return _record(*entry) if entry else None
+
+    def clear(self):
+        with self._lock:
+            self._rows.clear()
+
+    def close(self):
+        pass
+
+
+SQLITE_SCHEMA = """
+CREATE TABLE IF NOT EXISTS mpin_evaluations (
+    user_id TEXT NOT NULL PRIMARY KEY,
+    mpin TEXT NOT NULL,
+    length INTEGER NOT NULL,
+    strength INTEGER NOT NULL,
+    reasons INTEGER NOT NULL DEFAULT 0,
+    dob_self TEXT,
+    dob_spouse TEXT,
+    anniversary TEXT,
+    blocklist_version INTEGER,
+    timestamp TEXT NOT NULL DEFAULT CURRENT_TIMESTAMP,
+    other_dates TEXT,
+    fragment_blocklist_version INTEGER
+);
+CREATE INDEX IF NOT EXISTS idx_strength ON mpin_evaluations (strength);
+CREATE INDEX IF NOT EXISTS idx_reasons ON mpin_evaluations (reasons);
+CREATE INDEX IF NOT EXISTS idx_timestamp ON mpin_evaluations (timestamp);
+"""
+
+SQLITE_UPSERT_QUERY = """
+INSERT INTO mpin_evaluations
+(user_id, mpin, length, strength, reasons, dob_self, dob_spouse, anniversary, blocklist_version, other_dates,
+ fragment_blocklist_version)
+VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+ON CONFLICT(user_id) DO UPDATE SET
+    mpin = excluded.mpin,
+    length = excluded.length,
+    strength = excluded.strength,
+    reasons = excluded.reasons,
+    dob_self = excluded.dob_self,
+    dob_spouse = excluded.dob_spouse,
+    anniversary = excluded.anniversary,
+    blocklist_version = excluded.blocklist_version,
+    other_dates = excluded.other_dates,
+    fragment_blocklist_version = excluded.fragment_blocklist_version,
+    timestamp = CURRENT_TIMESTAMP
+"""
+
+
+class SQLiteStore:
+    """mpin_evaluations (and the mpin_logs view) in a SQLite file or ``:memory:``, created on first use.
+
+    One connection is shared behind a lock, so a store can be used from
+    the write-behind thread and request threads alike.
+    """
+
+    def __init__(self, path=":memory:"):
+        self.path = path
+        self._connection = sqlite3.connect(path, check_same_thread=False)
+        with self._connection:
+            self._connection.executescript(SQLITE_SCHEMA)
+            # Files created before other_dates (migrations/007) or
+            # fragment_blocklist_version (migrations/008) existed.
+            columns = [row[1] for row in self._connection.execute("PRAGMA table_info(mpin_evaluations)")]
+            for column, kind in (("other_dates", "TEXT"), ("fragment_blocklist_version", "INTEGER")):
+                if column not in columns:
+                    self._connection.execute(f"ALTER TABLE mpin_evaluations ADD COLUMN {column} {kind}")
+            self._connection.execute("DROP VIEW IF EXISTS mpin_logs")
+            self._connection.execute(compat_view_sql("sqlite"))
+        self._lock = threading.Lock()
+
+    def upsert(self, params):
+        with self._lock, self._connection:
+            existed = self._connection.execute(
+                "SELECT 1 FROM mpin_evaluations WHERE user_id = ?", (params[0],)).fetchone() is not None
+            self._connection.execute(SQLITE_UPSERT_QUERY, params)
+        return 2 if existed else 1
+
+    def upsert_many(self, params_list):
+        with self._lock, self._connection:
+            self._connection.executemany(SQLITE_UPSERT_QUERY, params_list)
+
+    def get(self, user_id):
+        with self._lock:
+            row = self._connection.execute(
+                f"SELECT {', '.join(LOG_COLUMNS)}, timestamp FROM mpin_evaluations WHERE user_id = ?",
+                (user_id,)).fetchone()
+        return _record(row[:-1], row[-1]) if row else None
+
+    def clear(self):
+        with self._lock, self._connection:
+            self._connection.execute("DELETE FROM mpin_evaluations")
+
+    def close(self):
+        self._connection.close()
@@ -0,0 +1,107 @@
+import functools
+import zlib
+from array import array
+
+from mpin import keypad, reasons
+from mpin.keypad import keypad_patterns
+
+# Structural rules, each a generator of the PINs (as digit tuples) it
+# flags. Every rule flags only a few hundred PINs per length, so the whole
+# table is built by enumerating them rather than by testing the keyspace.
+
+
+def _repeated_digits(length):
+    # 0000, 777777
+    for digit in range(10):
+        yield (digit,) * length
+
+
+def _progressions(length, steps):
+    for start in range(10):
+        for step in steps:
+            yield tuple((start + i * step) % 10 for i in range(length))
+
+
+def _sequential(length):
+    # Ascending or descending by one, wrapping past 9/0: 1234, 8901, 654321.
+    return _progressions(length, (1, 9))
+
+
+def _arithmetic_progression(length):
+    # A constant step of 2-8, modulo 10: 1357, 9630, 246802.
+    return _progressions(length, range(2, 9))
+
+
+def _palindrome(length):
+    # 1221, 123321. For even lengths this is also "mirrored halves".
+    half = length // 2
+    for n in range(10 ** half):
+        digits = tuple(int(c) for c in str(n).zfill(half))
+        yield digits + digits[::-1]
+
+
+def _repeated_pattern(length):
+    # A block repeated to fill the PIN (1212, 121212, 123123) or each digit
+    # repeated in place (1122, 112233, 111222).
+    for period in range(2, length):
+        if length % period == 0:
+            for n in range(10 ** period):
+                block = tuple(int(c) for c in str(n).zfill(period))
+                yield block * (length // period)
+                yield tuple(digit for digit in block for _ in range(length // period))
+
+
+STRUCTURAL_RULES = (
+    (reasons.REPEATED_DIGITS, _repeated_digits),
+    (reasons.SEQUENTIAL, _sequential),
+    (reasons.ARITHMETIC_PROGRESSION, _arithmetic_progression),
+    (reasons.PALINDROME, _palindrome),
+    (reasons.REPEATED_PATTERN, _repeated_pattern),
+    (reasons.KEYPAD_PATTERN, keypad_patterns),
+)
+
+
+def build_structure_table(length):
+    """Return an ``array('I')`` with the structural reason bits of every ``length``-digit PIN.
+
+    A PIN made of one repeated digit is only REPEATED_DIGITS, even though
+    it is trivially a palindrome and a repeated pattern as well.
+    """
+    table = array("I", [0]) * 10 ** length
+    for bit, rule in STRUCTURAL_RULES:
+        for digits in rule(length):
+            if bit != reasons.REPEATED_DIGITS and len(set(digits)) == 1:
+                continue
+            table[int("".join(map(str, digits)))] |= bit
+    return table
+
+
+@functools.lru_cache(maxsize=None)
+def rules_signature():
+    """Return a CRC32 of the rule code (this module and ``keypad``), to tell tables built by other rules apart."""
+    crc = 0
+    for path in (__file__, keypad.__file__):
+        with open(path, "rb") as file:
+            crc = zlib.crc32(file.read().replace(b"\r\n", b"\n"), crc)
+    return crc
+
+
+_tables = {}
+
+
+def structure_table(length):
+    table = _tables.get(length)
+    if table is None:
+        from mpin.bundle import get_bundle
+
+        bundle = get_bundle()
+        table = bundle.structure_table(length) if bundle is not None else None
+        _tables[length] = table = table if table is not None else build_structure_table(length)
+    return table
+
+
+def structural_mask(mpin, length):
+    """Return the structural reason bits for a ``length``-digit PIN string (0 if not a valid PIN)."""
+    if not (len(mpin) == length and mpin.isascii() and mpin.isdigit()):
+        return 0
+    return structure_table(length)[int(mpin)]